@@ -43,6 +43,11 @@
         'data/data.xml',
         'data/ir_sequence.xml',
         'data/stock_warehouse_cron.xml',
+        'data/access_token_cron.xml',
+        'data/picking_counter_cron.xml',
+        'data/barcode_index_cron.xml',
+        'data/sync_sequence_cron.xml',
+        'data/wms_job_cron.xml',
         'views/res_users.xml',
         'views/stock_picking.xml',
         'views/res_config_settings_view.xml',
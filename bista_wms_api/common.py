@@ -1,16 +1,46 @@
+import base64
+import contextlib
+import functools
+import hashlib
 import json
+import tempfile
+import threading
+import time
+import werkzeug.test
 import werkzeug.wrappers
 from odoo import fields, models, api
 
 import logging
 import datetime
 
-from odoo.tools import date_utils, DEFAULT_SERVER_DATETIME_FORMAT
+from odoo.tools import date_utils, split_every, DEFAULT_SERVER_DATETIME_FORMAT
 # from odoo.http import JsonRequest, Response
-from odoo.http import JsonRPCDispatcher, Response, request
+from odoo.http import JsonRPCDispatcher, Response, request, _request_stack
+
+from .tools.compression import CompressingWriter, compress, decompress, negotiate_encoding, DEFAULT_LEVEL, \
+    DEFAULT_THRESHOLD
+from .tools.metrics import MetricsBuffer
 
 _logger = logging.getLogger(__name__)
 
+# Records serialized per prefetch batch by the streaming helpers.
+STREAM_BATCH_SIZE = 500
+# Size kept in memory by a streamed response before it spills to a temporary file.
+STREAM_SPOOL_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+# Page size used by `keyset_search` when the client sends a cursor without a limit.
+DEFAULT_PAGE_SIZE = 80
+# Largest page served by `keyset_search`, bigger limits are lowered to it.
+MAX_PAGE_SIZE = 1000
+# Minimum delay in seconds between two progress reports of a job.
+JOB_PROGRESS_INTERVAL = 1
+# Calls of the routes of this worker, added to `bista.wms.metric` every `flush_interval` seconds.
+METRICS = MetricsBuffer(flush_interval=60)
+# Errors of the idempotent routes that a retry would get again, stored with their key as the successes.
+# NOTE: `bad_request` is also the catch-all of the routes (lock timeouts, serialization failures...).
+IDEMPOTENT_REJECTIONS = {'already_validated', 'batch_cancelled', 'batch_picking_not_exists', 'move_line_ids_empty',
+                         'picking_ids_empty', 'post_data_error', 'access_denied', 'not_enabled'}
+
 
 def default(o):
     if isinstance(o, (datetime.date, datetime.datetime)):
@@ -19,20 +49,301 @@ def default(o):
         return str(o)
 
 
-def valid_response(data, status=200):
+class FieldSelection:
+    """
+    Sparse fieldset requested by the client with the `fields` parameter,
+    e.g. `fields=id,name,move_line_ids.id,move_line_ids.quant_ids`.
+    An empty selection selects every key.
+    """
+
+    def __init__(self, tree=None):
+        self.tree = tree or {}
+
+    @classmethod
+    def parse(cls, value):
+        tree = {}
+        for path in (value or '').split(','):
+            node = tree
+            for name in path.split('.'):
+                if name.strip():
+                    node = node.setdefault(name.strip(), {})
+        return cls(tree)
+
+    def __contains__(self, key):
+        return not self.tree or key in self.tree
+
+    def __getitem__(self, key):
+        """Selection inside the sub-collection `key`, every key when none was given."""
+        return FieldSelection(self.tree.get(key))
+
+    def apply(self, data):
+        """Drop the keys that were not requested from `data`, recursively."""
+        if not self.tree:
+            return data
+        if isinstance(data, list):
+            return [self.apply(item) for item in data]
+        if isinstance(data, dict):
+            return {key: self[key].apply(value) for key, value in data.items() if key in self.tree}
+        return data
+
+
+def requested_fields():
+    """Field selection of the current request."""
+    return FieldSelection.parse(request.httprequest.args.get('fields') if request else None)
+
+
+def wms_settings():
+    """Settings snapshot of the WMS configuration parameters, see `bista.wms.settings`."""
+    return request.env['bista.wms.settings']._get_settings()
+
+
+def get_response_compression():
+    """
+    Compression negotiated with the client for the current request.
+
+    :return: tuple (encoding, threshold, level), encoding is None when the client does not accept
+             gzip/deflate or when the compression is disabled (negative threshold)
+    """
+    if not request:
+        return None, DEFAULT_THRESHOLD, DEFAULT_LEVEL
+    settings = wms_settings()
+    threshold, level = settings.compression_threshold, settings.compression_level
+    if threshold < 0:
+        return None, threshold, level
+    return negotiate_encoding(request.httprequest.headers.get('Accept-Encoding')), threshold, level
+
+
+def _compression_headers(encoding):
+    headers = [("Vary", "Accept-Encoding")]
+    if encoding:
+        headers.append(("Content-Encoding", encoding))
+    return headers
+
+
+def json_response(body, status=200, headers=None):
+    """JSON response with the `body` string compressed as negotiated with the client."""
+    encoding, threshold, level = get_response_compression()
+    body, encoding = compress(body.encode(), encoding, threshold, level)
+    return werkzeug.wrappers.Response(
+        status=status, content_type="application/json; charset=utf-8", response=body,
+        headers=(headers or []) + _compression_headers(encoding),
+    )
+
+
+def _etag_headers():
+    """ETag of the current request set by `etag_cache`, for the successful responses only."""
+    etag = request and request.httprequest.environ.get('bista_wms_api.etag')
+    return [("ETag", etag), ("Cache-Control", "private, no-cache")] if etag else []
+
+
+def get_etag(model_names):
+    """
+    Strong ETag of the response to the current request, from the number of records and the last
+    write_date of the tables of `model_names` (one aggregate query, no record is read). The user,
+    the query string and the negotiated encoding are part of it as the responses depend on them.
+    """
+    env = request.env
+    queries = ["SELECT count(*), max(write_date) FROM %s" % env[model_name]._table for model_name in model_names]
+    env.cr.execute(" UNION ALL ".join(queries))
+    encoding = get_response_compression()[0]
+    fingerprint = json.dumps([
+        request.httprequest.path,
+        sorted(request.httprequest.args.items(multi=True)),
+        env.uid,
+        env.user.write_date,
+        env.companies.ids,
+        encoding,
+        env.cr.fetchall(),
+    ], default=default)
+    return '"%s"' % hashlib.sha1(fingerprint.encode()).hexdigest()
+
+
+def etag_cache(*model_names):
+    """
+    Decorator of the routes whose data only changes with the records of `model_names`.
+
+    Requests whose `If-None-Match` matches the current ETag get a `304 Not Modified` before any
+    serialization, the other successful responses carry the ETag. Goes under `@http.route`, the
+    user is set by `validate_token` first.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrap(self, *args, **kwargs):
+            etag = get_etag(model_names)
+            if_none_match = request.httprequest.if_none_match
+            if if_none_match and (if_none_match.star_tag or etag.strip('"') in if_none_match):
+                return werkzeug.wrappers.Response(status=304, headers=[
+                    ("ETag", etag), ("Cache-Control", "private, no-cache"), ("Vary", "Accept-Encoding")])
+            request.httprequest.environ['bista_wms_api.etag'] = etag
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                request.httprequest.environ.pop('bista_wms_api.etag', None)
+        return wrap
+    return decorator
+
+
+def valid_response(data, status=200, **envelope):
     """Valid Response
-    This will be return when the http request was successfully processed."""
+    This will be return when the http request was successfully processed.
+    Extra keyword arguments (e.g. `next_cursor`) are added to the envelope."""
+    data = requested_fields().apply(data)
     data = {
         "count": len(data) if not isinstance(data, str) else 1,
         "status": True,
-        "data": data
+        "data": data,
+        **envelope
     }
+    return json_response(json.dumps(data, default=default), status=status,
+                         headers=[("X-Record-Count", str(data["count"]))] + _etag_headers())
+
+
+def is_stream_requested(payload_data):
+    """Whether the client asked for a streamed response with the `stream` parameter."""
+    return str(payload_data.get('stream') or '').lower() in ('1', 'true')
+
+
+def iter_by_batch(records, batch_serializer):
+    """
+    Yield the serialized records batch by batch.
+
+    :param records: recordset to serialize
+    :param batch_serializer: function returning the list of serialized records of a batch
+    """
+    for ids in split_every(STREAM_BATCH_SIZE, records.ids):
+        yield from batch_serializer(records.browse(ids))
+        # Release the values prefetched for the batch before reading the next one.
+        records.env.invalidate_all()
+
+
+def _iter_buffer(buffer):
+    try:
+        chunk = buffer.read(STREAM_CHUNK_SIZE)
+        while chunk:
+            yield chunk
+            chunk = buffer.read(STREAM_CHUNK_SIZE)
+    finally:
+        buffer.close()
+
+
+def stream_response(data, status=200, **envelope):
+    """Streamed Response
+    Same envelope as `valid_response`, for large payloads. The elements of `data` (any iterable,
+    generators included) are encoded one by one, so the whole list and its JSON string never sit
+    in memory together. The `count` and `status` keys are written after the data array.
+
+    NOTE: the ORM cursor is closed once the controller returns, so the JSON is spooled (in memory,
+    then on disk) while the request is processed and only the sending is chunked. The JSON is
+    compressed while it is spooled once it gets over the compression threshold."""
+    buffer = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE)
+    writer = CompressingWriter(buffer, *get_response_compression())
+    selection = requested_fields()
+    writer.write(b'{"data": [')
+    count = 0
+    for record in data:
+        if count:
+            writer.write(b', ')
+        writer.write(json.dumps(selection.apply(record), default=default).encode())
+        count += 1
+    writer.write(b'], "count": %d, "status": true' % count)
+    for key, value in envelope.items():
+        writer.write(b', %s: %s' % (json.dumps(key).encode(), json.dumps(value, default=default).encode()))
+    writer.write(b'}')
+    encoding = writer.close()
+    size = buffer.tell()
+    buffer.seek(0)
+    return werkzeug.wrappers.Response(
+        status=status, content_type="application/json; charset=utf-8", response=_iter_buffer(buffer),
+        headers=[("X-Record-Count", str(count)), ("Content-Length", str(size))] + _etag_headers() + _compression_headers(encoding),
+        direct_passthrough=True,
+    )
+
+
+def ndjson_response(lines, status=200):
+    """Streamed NDJSON Response
+    One JSON document per element of `lines` (any iterable, generators included), one per line.
+    Spooled and compressed as `stream_response`."""
+    buffer = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE)
+    writer = CompressingWriter(buffer, *get_response_compression())
+    count = 0
+    for line in lines:
+        writer.write(json.dumps(line, default=default).encode() + b'\n')
+        count += 1
+    encoding = writer.close()
+    size = buffer.tell()
+    buffer.seek(0)
     return werkzeug.wrappers.Response(
-        status=status, content_type="application/json; charset=utf-8", response=json.dumps(data, default=default),
+        status=status, content_type="application/x-ndjson; charset=utf-8", response=_iter_buffer(buffer),
+        headers=[("X-Record-Count", str(count)), ("Content-Length", str(size))] + _compression_headers(encoding),
+        direct_passthrough=True,
     )
 
 
-def invalid_response(typ, message=None, status=200):
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=default).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Invalid pagination cursor: %s" % cursor)
+
+
+def keyset_search(model, domain, payload_data, order_field='id', order=None):
+    """
+    Search one page of records when the client sends a `limit` and/or an `after` cursor.
+    The limit is kept between 1 and `MAX_PAGE_SIZE`, a limit or cursor that can't be decoded raises a
+    ValueError answered as a `bad_request` by the routes.
+
+    Records are ordered on (order_field, id) and the page starts right after the record encoded
+    in `after`, so the LIMIT is applied in SQL and pages stay stable while records are created or
+    updated. `order_field` must be a stored, non relational column without NULL values.
+
+    :param model: recordset to search on
+    :param domain: search domain
+    :param payload_data: request parameters
+    :param order_field: pagination key, the id breaks ties
+    :param order: order of the search when the client does not paginate
+    :return: tuple (records, page) where page holds the `next_cursor` envelope entry,
+             empty when the client did not ask for pagination
+    """
+    limit = payload_data.get('limit')
+    after = payload_data.get('after')
+    if not limit and not after:
+        return model.search(domain, order=order), {}
+
+    if limit:
+        try:
+            limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination limit, expected an integer: %s" % limit)
+    else:
+        limit = DEFAULT_PAGE_SIZE
+    domain = list(domain)
+    page_order = 'id' if order_field == 'id' else '%s, id' % order_field
+    if after:
+        value, record_id = decode_cursor(after)
+        if order_field == 'id':
+            domain += [('id', '>', record_id)]
+        else:
+            domain += ['|', (order_field, '>', value), '&', (order_field, '=', value), ('id', '>', record_id)]
+
+    records = model.search(domain, limit=limit + 1, order=page_order)
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        last_record = records[-1]
+        value = last_record[order_field]
+        if isinstance(value, datetime.datetime):
+            value = fields.Datetime.to_string(value)
+        elif isinstance(value, datetime.date):
+            value = fields.Date.to_string(value)
+        next_cursor = encode_cursor(value, last_record.id)
+    return records, {'next_cursor': next_cursor}
+
+
+def invalid_response(typ, message=None, status=200, **extra):
     """Invalid Response
 
     This will be the return value whenever the server runs into an error
@@ -41,30 +352,205 @@ def invalid_response(typ, message=None, status=200):
     :param str typ: type of error,
     :param str message: message that will be displayed to the user,
     :param int status: integer HTTP status code that will be sent in response body & header.
+    Extra keyword arguments (e.g. `errors`) are added to the response body.
     """
     # return json.dumps({})
     response_status = False
-    if eval(request.env.ref('bista_wms_api.http_status_code').sudo().value):
+    if wms_settings().http_status_code:
         status = status
         if typ == "not_found":
             response_status= True
     else:
         status = 200
-    return werkzeug.wrappers.Response(
-        status=status,
-        content_type="application/json; charset=utf-8",
-        response=json.dumps(
+    return json_response(
+        json.dumps(
             {
                 "code": status,
                 "type": typ,
                 "message": str(message) if str(message) else "wrong arguments (missing validation)",
-                "status": response_status
+                "status": response_status,
+                **extra
             },
             default=datetime.datetime.isoformat,
         ),
+        status=status,
     )
 
 
+def instrumented(func):
+    """
+    Decorator recording the wall time, the SQL queries and their time, the response size, the number
+    of records and the user of every call of a route in `METRICS`, see `/api/metrics`. Composed with
+    `validate_token`, so every authenticated route is instrumented.
+    """
+    @functools.wraps(func)
+    def wrap(self, *args, **kwargs):
+        # NOTE: Odoo counts the queries of the request thread, all cursors included.
+        thread = threading.current_thread()
+        start_time = time.perf_counter()
+        start_queries = getattr(thread, 'query_count', 0)
+        start_query_time = getattr(thread, 'query_time', 0.0)
+        result, error = None, True
+        try:
+            result = func(self, *args, **kwargs)
+            error = isinstance(result, werkzeug.wrappers.Response) and result.status_code >= 400
+            return result
+        finally:
+            is_response = isinstance(result, werkzeug.wrappers.Response)
+            record_count = result.headers.get('X-Record-Count') if is_response else None
+            METRICS.observe(func.__name__, request.env.uid, {
+                'request_duration_seconds': time.perf_counter() - start_time,
+                'request_sql_queries': getattr(thread, 'query_count', 0) - start_queries,
+                'request_sql_seconds': getattr(thread, 'query_time', 0.0) - start_query_time,
+                'response_bytes': result.content_length if is_response else None,
+                'response_records': int(record_count) if record_count else None,
+            }, error=error)
+            if METRICS.should_drain():
+                flush_metrics()
+    return wrap
+
+
+def flush_metrics():
+    """Add the calls recorded by this worker to `bista.wms.metric`, returns them."""
+    samples = METRICS.drain()
+    try:
+        request.env['bista.wms.metric'].sudo()._add_samples(samples)
+    except Exception:
+        _logger.warning("Could not store the WMS API metrics", exc_info=True)
+    return samples
+
+
+def _idempotent_result(result):
+    """(response_kind, response, status) stored for the return value of an idempotent route."""
+    if isinstance(result, werkzeug.wrappers.Response):
+        body = decompress(result.get_data(), result.headers.get('Content-Encoding'))
+        return 'response', body.decode(), result.status_code
+    return 'result', json.dumps(result, default=default), None
+
+
+def _is_idempotent_final(response, status):
+    """Whether the response of an idempotent route is replayed to the retries: successes and business rejections."""
+    if status and status >= 500:
+        return False
+    try:
+        data = json.loads(response)
+    except ValueError:
+        return False
+    if not isinstance(data, dict):
+        return False
+    if data.get('status') is True and 'type' not in data:
+        return True
+    return (data.get('type') or data.get('code')) in IDEMPOTENT_REJECTIONS
+
+
+def idempotent(func):
+    """
+    Decorator of the POST routes retried by the devices: a request sent again with the same
+    `Idempotency-Key` header gets the response of the first one instead of running again, while the
+    first one runs the retry waits for it. Goes under `@http.route`, the user is set by `validate_token`.
+
+    Keys are per user and kept `bista_wms_api.idempotency_ttl_hours`, reusing a key with another
+    request body is refused.
+    """
+    @functools.wraps(func)
+    def wrap(self, *args, **kwargs):
+        key = request.httprequest.headers.get('Idempotency-Key')
+        if not key or is_job_request():
+            return func(self, *args, **kwargs)
+        if len(key) > 255:
+            return invalid_response("idempotency_key", "Idempotency-Key is longer than 255 characters.", 400)
+        endpoint = request.httprequest.path
+        request_hash = hashlib.sha256(endpoint.encode() + b'\n' + request.httprequest.get_data()).hexdigest()
+        IdempotencyKey = request.env['bista.wms.idempotency.key'].sudo()
+        IdempotencyKey._lock(key)
+        stored = IdempotencyKey._get_stored(key)
+        if stored:
+            if stored['request_hash'] != request_hash:
+                return invalid_response("idempotency_key_reused",
+                                        "Idempotency-Key was already used for another request.", 422)
+            if stored['response_kind'] == 'response':
+                return json_response(stored['response'], stored['status'],
+                                     headers=[("Idempotent-Replayed", "true")])
+            return json.loads(stored['response'])
+
+        result = func(self, *args, **kwargs)
+        response_kind, response, status = _idempotent_result(result)
+        # NOTE: other errors are not stored, they may be transient and the device retries them.
+        if _is_idempotent_final(response, status):
+            IdempotencyKey._store(key, endpoint, request_hash, response_kind, response, status)
+        return result
+    return wrap
+
+
+class JobRequest:
+    """
+    Request replayed by a `bista.wms.job`: the endpoint runs as during the HTTP request, with the
+    same path and body, as the user who enqueued it and without access token.
+    """
+
+    def __init__(self, env, path, data, job):
+        self.env = env
+        self.wms_job = job
+        self.httprequest = werkzeug.test.EnvironBuilder(
+            path=path, method='POST', data=data, content_type='application/json').get_request()
+        self.params = {}
+        self.db = env.cr.dbname
+        self._progress_time = 0
+
+    def update_env(self, user=None, context=None, su=None):
+        self.env = self.env(user=user, context=context, su=su)
+
+    def report_progress(self, done, total):
+        now = time.monotonic()
+        if done >= total or now - self._progress_time >= JOB_PROGRESS_INTERVAL:
+            self._progress_time = now
+            self.env['bista.wms.job.progress'].sudo()._report(self.wms_job.id, done, total)
+
+
+@contextlib.contextmanager
+def job_request(env, path, data, job):
+    """Make `request` the `JobRequest` of `job` while it runs."""
+    req = JobRequest(env, path, data, job)
+    _request_stack.push(req)
+    try:
+        yield req
+    finally:
+        _request_stack.pop()
+
+
+def is_job_request():
+    return isinstance(_request_stack.top, JobRequest)
+
+
+def is_async_requested():
+    """Whether the client asked to run the POST request as a background job (`async` parameter or body key)."""
+    if not request or is_job_request():
+        return False
+    if str(request.httprequest.args.get('async') or '').lower() in ('1', 'true'):
+        return True
+    try:
+        body = json.loads(request.httprequest.data or b'{}')
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get('async') in (True, 1, '1', 'true')
+
+
+def enqueue_job_response():
+    """Enqueue the current request as a `bista.wms.job` and return its id right away."""
+    job = request.env['bista.wms.job']._enqueue(request.httprequest.path, request.httprequest.data.decode())
+    return valid_response({
+        'job_id': job.id,
+        'state': job.state,
+        'status_url': '/api/job_status?job_id=%s' % job.id,
+    })
+
+
+def report_job_progress(done, total):
+    """Progress of the job running the current request, if any, see `/api/job_status`."""
+    if is_job_request():
+        request.report_progress(done, total)
+
+
 def extract_arguments(limit="80", offset=0, order="id", domain="", fields=[]):
     """Parse additional data  sent along request."""
     limit = int(limit)
@@ -133,51 +619,27 @@ def convert_data_str(data):
     return data
 
 
-def filter_by_last_sync_time(model_name, payload_data):
+def get_last_sync_time(payload_data):
     """
-    Filter based on last_sync_time(unix time stamp and date time format).
+    Datetime string of last_sync_time(unix time stamp and date time format), None when not given.
     """
-    id_list = [] 
     if 'last_sync_timestamp' in payload_data and payload_data['last_sync_timestamp']:
         unix_timestamp = int(payload_data['last_sync_timestamp'])
-        datetime_string = datetime.datetime.fromtimestamp(unix_timestamp).strftime(DEFAULT_SERVER_DATETIME_FORMAT)
+        return datetime.datetime.fromtimestamp(unix_timestamp).strftime(DEFAULT_SERVER_DATETIME_FORMAT)
     elif 'last_sync_time' in payload_data and payload_data['last_sync_time']:
-        datetime_string = payload_data['last_sync_time']
-    domain = ['|', ("create_date", ">=", datetime_string),
-                ("write_date", ">=", datetime_string)]
-
-    if model_name == 'stock.picking.batch' or model_name == 'stock.picking':
-        model_obj = request.env[model_name].sudo().search([])
-        if model_name == 'stock.picking.batch':
-            for val in model_obj:
-                picking_ids = val.picking_ids.filtered(
-                    lambda x: x.write_date >= datetime.datetime.strptime(datetime_string,
-                                                            DEFAULT_SERVER_DATETIME_FORMAT) or x.create_date >= datetime.datetime.strptime(
-                        datetime_string, DEFAULT_SERVER_DATETIME_FORMAT))
-                if picking_ids and val.id not in id_list:
-                    id_list.append(val.id)
-
-        for val in model_obj:
-            move_ids = val.move_ids.filtered(
-                lambda x: x.write_date >= datetime.datetime.strptime(datetime_string,
-                                                            DEFAULT_SERVER_DATETIME_FORMAT) or x.create_date >= datetime.datetime.strptime(
-                    datetime_string, DEFAULT_SERVER_DATETIME_FORMAT))
-            if move_ids and val.id not in id_list:
-                id_list.append(val.id)
-
-        for val in model_obj:
-            move_line_ids = val.move_line_ids.filtered(
-                lambda x: x.write_date >= datetime.datetime.strptime(datetime_string,
-                                                            DEFAULT_SERVER_DATETIME_FORMAT) or x.create_date >= datetime.datetime.strptime(
-                    datetime_string, DEFAULT_SERVER_DATETIME_FORMAT))
-            if move_line_ids and val.id not in id_list:
-                id_list.append(val.id)
-
-    if id_list:
-        domain += [('id', 'in', id_list)]
-
-    return domain
-  
+        return payload_data['last_sync_time']
+    return None
+
+
+def filter_by_last_sync_time(model_name, payload_data):
+    """
+    Filter based on last_sync_time(unix time stamp and date time format).
+    Returns a domain on the records created or updated since then, see `bista.wms.delta.sync`.
+    """
+    datetime_string = get_last_sync_time(payload_data)
+    changed_ids = request.env['bista.wms.delta.sync'].sudo()._get_changed_ids(model_name, datetime_string)
+    return [('id', 'in', changed_ids)]
+
 # def filter_by_last_sync_time(model_name, payload_data):
 #     """
 #     Filter based on last_sync_time.
@@ -220,7 +682,7 @@ def filter_by_last_sync_time(model_name, payload_data):
 
 
 def prepare_config_settings(self, record_id, to_do):
-    IrConfigParameter = self.env['ir.config_parameter'].sudo()
+    settings = self.env['bista.wms.settings']._get_settings()
     user_id = self.env.user
     IrModule = self.env['ir.module.module']
     try:
@@ -235,7 +697,7 @@ def prepare_config_settings(self, record_id, to_do):
             'company_id': record_id.company_id.id,
             'product_packages': user_id.has_group('stock.group_tracking_lot'),
             'product_packaging': user_id.has_group('product.group_stock_packaging'),
-            'wms_licensing_key': IrConfigParameter.get_param('bista_wms_api.wms_licensing_key') or "",
+            'wms_licensing_key': settings.wms_licensing_key,
             'batch_transfer': True if batch_transfer and batch_transfer.state == 'installed' else False,
             'quality': True if quality and quality.state == 'installed' else False,
             'barcode_scanner': True if stock_barcode and stock_barcode.state == 'installed' else False,
@@ -249,12 +711,10 @@ def prepare_config_settings(self, record_id, to_do):
             'multi_step_routes': user_id.has_group('stock.group_adv_location'),
             'storage_categories': user_id.has_group('stock.group_stock_storage_categories'),
             'expiration_dates': True if product_expiry and product_expiry.state == 'installed' else False,
-            'use_qr_code': IrConfigParameter.get_param('bista_wms_reports.use_qr_code'),
-            'use_qr_code_print_label': IrConfigParameter.get_param('bista_wms_reports.use_qr_code_print_label'),
-            'use_qr_code_picking_operations': IrConfigParameter.get_param(
-                'bista_wms_reports.use_qr_code_picking_operations'),
-            'use_qr_code_batch_operations': IrConfigParameter.get_param(
-                'bista_wms_reports.use_qr_code_batch_operations'),
+            'use_qr_code': settings.use_qr_code,
+            'use_qr_code_print_label': settings.use_qr_code_print_label,
+            'use_qr_code_picking_operations': settings.use_qr_code_picking_operations,
+            'use_qr_code_batch_operations': settings.use_qr_code_batch_operations,
         }
         if to_do == 'create':
             self.env['bista.wms.config.settings'].create(settings_vals)
@@ -263,45 +723,104 @@ def prepare_config_settings(self, record_id, to_do):
     except Exception as e:
         _logger.exception("Error while creating or updating bista wms config settings: %s", e)
 
-def app_changed_create_write(stock_picking_obj, line_obj, new_vals, prev_move_line_obj=None):
-    if prev_move_line_obj:
-        html = ""
-        move_line_obj = line_obj
-        for item in new_vals:
-            model, field = 'stock.move.line', item
-            if isinstance(request.env[model]._fields[field], (fields.Many2one)):
-                model_id = request.env['ir.model'].sudo().search([('model', '=', model)]) # 480
-                related_model_name = request.env['ir.model.fields'].sudo().search([('ttype', '=', 'many2one'), ('model_id', '=', model_id.id), ('name', '=', item)], limit=1).relation
-                changed_m2o_f_name = request.env[related_model_name].sudo().search([('id', '=', new_vals[item])]).name
-                if str(getattr(move_line_obj, item).name) != str(changed_m2o_f_name):
-                    html += "<p style='margin: 0 !important;'>" + request.env['stock.move.line']._fields[item].string + ": " + str(getattr(move_line_obj, item).name) + "&rarr;" \
-                                                                                                                                + str(changed_m2o_f_name) + "</p>" + "</br>"
-            else:
-                if new_vals[item] != getattr(move_line_obj, item):
-                    html += "<p style='margin: 0 !important;'>" + request.env['stock.move.line']._fields[item].string + ": " + str(getattr(move_line_obj, item)) + "&rarr;" \
-                                                                                                                            + str(new_vals[item]) + "</p>" + "</br>"
-        if html:
-            obj = request.env['bista.app.change'].sudo().create({
-                                                'res_model': move_line_obj._name,
-                                                'app_created': False,
-                                                'app_changes': html,
-                                    })
-            obj.app_changed_id = move_line_obj
-            # stock_picking_obj.app_change_ids = [(4, obj.id)]
-            return obj
-    else:
-        html = ""
+# Comodel of the Many2one fields of a model, per registry: {db_name: (registry_sequence, {model: {field: comodel}})}
+_MANY2ONE_COMODELS = {}
+
+
+def _many2one_comodels(env, model_name):
+    registry = env.registry
+    sequence, comodels = _MANY2ONE_COMODELS.get(registry.db_name, (None, None))
+    if sequence != registry.registry_sequence:
+        comodels = {}
+        _MANY2ONE_COMODELS[registry.db_name] = (registry.registry_sequence, comodels)
+    if model_name not in comodels:
+        comodels[model_name] = {
+            name: field.comodel_name
+            for name, field in env[model_name]._fields.items()
+            if isinstance(field, fields.Many2one)
+        }
+    return comodels[model_name]
+
+
+def _app_change_html(label, old, new=None, changed=True):
+    if not changed:
+        return "<p style='margin: 0 !important;'>" + label + ": " + str(old) + "</p>" + "</br>"
+    return "<p style='margin: 0 !important;'>" + label + ": " + str(old) + "&rarr;" + str(new) + "</p>" + "</br>"
+
+
+class AppChangeRecorder:
+    """
+    Collect the changes made by the app to the move lines of a picking and create their
+    `bista.app.change` records at once in `flush`.
+
+    The values are captured by `record`, before the lines are written, the names of the Many2one
+    values are read once per comodel when flushing.
+    """
+
+    def __init__(self, stock_picking_obj):
+        self.stock_picking_obj = stock_picking_obj
+        self._entries = []
+
+    def record(self, line_obj, new_vals, prev_move_line_obj=None):
+        """Record the values `new_vals` written on (`prev_move_line_obj` given) or created with `line_obj`."""
+        comodels = _many2one_comodels(line_obj.env, line_obj._name)
+        items = []
         for item in new_vals:
-            model, field = 'stock.move.line', item
-            if isinstance(request.env[model]._fields[field], (fields.Many2one)):
-                html += "<p style='margin: 0 !important;'>" + request.env['stock.move.line']._fields[item].string + ": " + str(getattr(line_obj, item).name) + "</p>" + "</br>"
+            if item in comodels:
+                new_id = new_vals[item] if prev_move_line_obj else getattr(line_obj, item).id
+                if isinstance(new_id, models.BaseModel):
+                    new_id = new_id.id
+                items.append((item, comodels[item], getattr(line_obj, item).id, new_id or False))
+            elif prev_move_line_obj:
+                if new_vals[item] != getattr(line_obj, item):
+                    items.append((item, None, getattr(line_obj, item), new_vals[item]))
             else:
-                html += "<p style='margin: 0 !important;'>" + request.env['stock.move.line']._fields[item].string + ": " + str(getattr(line_obj, item)) + "</p>" + "</br>"
-        if html:
-            obj = request.env['bista.app.change'].sudo().create({
-                                                'res_model': line_obj._name,
-                                                'app_created': True,
-                                                'app_changes': html,
-                                    })
-            obj.app_changed_id = line_obj
-            stock_picking_obj.app_change_ids = [(4, obj.id)]
+                items.append((item, None, getattr(line_obj, item), None))
+        self._entries.append((line_obj, not prev_move_line_obj, items))
+
+    def _read_names(self):
+        ids_by_comodel = {}
+        for _line_obj, _created, items in self._entries:
+            for _item, comodel, old, new in items:
+                if comodel:
+                    ids_by_comodel.setdefault(comodel, set()).update(value for value in (old, new) if value)
+        names = {}
+        for comodel, ids in ids_by_comodel.items():
+            for row in request.env[comodel].sudo().browse(ids).read(['display_name']):
+                names[comodel, row['id']] = row['display_name']
+        return names
+
+    def flush(self):
+        """Create the pending change records, returns them."""
+        names = self._read_names()
+        vals_list = []
+        for line_obj, created, items in self._entries:
+            html = ""
+            for item, comodel, old, new in items:
+                label = line_obj._fields[item].string
+                if comodel:
+                    # NOTE: an empty Many2one is displayed as `False`, as its `name`.
+                    old, new = names.get((comodel, old), False), names.get((comodel, new), False)
+                    if created:
+                        html += _app_change_html(label, old, changed=False)
+                    elif str(old) != str(new):
+                        html += _app_change_html(label, old, new)
+                else:
+                    html += _app_change_html(label, old, new, changed=not created)
+            if html:
+                vals_list.append({
+                    'res_model': line_obj._name,
+                    'app_created': created,
+                    'app_changes': html,
+                    'app_changed_id': '%s,%s' % (line_obj._name, line_obj.id),
+                    'stock_picking_id': self.stock_picking_obj.id,
+                })
+        self._entries = []
+        return request.env['bista.app.change'].sudo().create(vals_list)
+
+
+def app_changed_create_write(stock_picking_obj, line_obj, new_vals, prev_move_line_obj=None):
+    """Record the changes of one move line, see `AppChangeRecorder` to record the lines of a picking at once."""
+    recorder = AppChangeRecorder(stock_picking_obj)
+    recorder.record(line_obj, new_vals, prev_move_line_obj)
+    return recorder.flush()
@@ -20,7 +20,7 @@ class AccessToken(http.Controller):
         token = request.env["api.access_token"]
         access_token = post.get("access_token")
 
-        access_token = token.search([("token", "=", access_token)], limit=1)
+        access_token = token._find_by_token(access_token) if access_token else token
         if not access_token:
             error = "Access token is missing in the request header or invalid token was provided"
             return invalid_response(status=200, message=error, typ="")
@@ -2,17 +2,24 @@
 import json
 import logging
 import functools
+import itertools
+import time as _time
 from collections import defaultdict
-from odoo.exceptions import UserError
-from odoo import _
+import psycopg2.errors
+from odoo.exceptions import UserError, ValidationError
+from odoo import _, fields
 
 from odoo import http
 from odoo.exceptions import AccessDenied, AccessError
 from odoo.http import request, content_disposition, serialize_exception as _serialize_exception
-from odoo.addons.bista_wms_api.common import invalid_response, valid_response, convert_data_str, filter_by_last_sync_time, app_changed_create_write
+from odoo.addons.bista_wms_api.common import invalid_response, valid_response, convert_data_str, filter_by_last_sync_time, AppChangeRecorder, \
+    get_last_sync_time, is_stream_requested, iter_by_batch, stream_response, keyset_search, requested_fields, etag_cache, \
+    wms_settings, is_job_request, is_async_requested, enqueue_job_response, report_job_progress, idempotent, ndjson_response, \
+    instrumented, flush_metrics
 from odoo.tools.safe_eval import safe_eval, time
 from odoo.tools import html_escape
 from odoo.addons.web.controllers.report import ReportController
+from odoo.addons.bista_wms_api.tools.metrics import format_prometheus
 from datetime import datetime
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT, DEFAULT_SERVER_DATE_FORMAT
 from odoo.tools.float_utils import float_compare, float_is_zero, float_round
@@ -21,10 +28,29 @@ import werkzeug.wrappers
 from werkzeug.urls import url_encode, url_decode, iri_to_uri
 
 import werkzeug.wrappers
-import ast
 
 _logger = logging.getLogger(__name__)
 
+# Sizes of the product images served by `/api/product_image`.
+PRODUCT_IMAGE_SIZES = (128, 256, 512, 1920)
+# Fields matching a posted quant with an existing one, see `_post_stock_quant_search_domain`.
+QUANT_MATCH_FIELDS = ('location_id', 'product_id', 'lot_id', 'package_id', 'owner_id', 'company_id')
+# Errors of a picking validation caused by a concurrent transaction, re-raised so that Odoo retries the request.
+CONCURRENCY_ERRORS = (
+    psycopg2.errors.SerializationFailure,
+    psycopg2.errors.DeadlockDetected,
+    psycopg2.errors.LockNotAvailable,
+)
+# Version of the `/api/bootstrap` document, bumped when a record type changes incompatibly.
+BOOTSTRAP_VERSION = 1
+
+
+class _PickingValidateError(Exception):
+    """Rolls back the savepoint of a picking whose validation returned an error."""
+
+    def __init__(self, res):
+        super().__init__(res.get('message'))
+        self.res = res
 
 
 def validate_token(func):
@@ -33,21 +59,22 @@ def validate_token(func):
     @functools.wraps(func)
     def wrap(self, *args, **kwargs):
         """."""
+        if is_job_request():
+            # NOTE: jobs run as the user who enqueued them, see `bista.wms.job`.
+            return func(self, *args, **kwargs)
         access_token = request.httprequest.headers.get("access_token")
         if not access_token:
             return invalid_response("access_token_not_found", "missing access token in request header", 200)
-        access_token_data = (
-            request.env["api.access_token"].sudo().search([("token", "=", access_token)], order="id DESC", limit=1)
-        )
-
-        if access_token_data.find_one_or_create_token(user_id=access_token_data.user_id.id) != access_token:
+        token_info = request.env["api.access_token"].sudo()._get_token_info(access_token)
+        if not token_info:
             return invalid_response("access_token", "token seems to have expired or invalid", 401)
 
-        request.session.update(user=access_token_data.user_id.id)
-        request.update_env(user=access_token_data.user_id.id)
+        user_id = token_info[0]
+        request.session.update(user=user_id)
+        request.update_env(user=user_id)
         return func(self, *args, **kwargs)
 
-    return wrap
+    return instrumented(wrap)
 
 
 class BistaWmsApi(http.Controller):
@@ -56,14 +83,16 @@ class BistaWmsApi(http.Controller):
     @staticmethod
     def _get_user_stock_group(self):
         access_token = request.httprequest.headers.get("access-token")
-        if access_token:
-            user_id = request.env['api.access_token'].sudo().search([('token', '=', access_token)], limit=1).user_id
+        if access_token or is_job_request():
+            if access_token:
+                token_info = request.env['api.access_token'].sudo()._get_token_info(access_token)
+                user_id = request.env['res.users'].browse(token_info[0] if token_info else [])
+            else:
+                user_id = request.env.user
             is_admin = 0
             if user_id.has_group('stock.group_stock_manager'):
                 is_admin = 1
-            res_config_settings = request.env['res.config.settings'].sudo().search([], order='id desc', limit=1)
-
-            if not res_config_settings.user_check_restriction:
+            if not wms_settings().user_check_restriction:
                 if is_admin == 0:
                     is_admin = 1
                 return user_id, is_admin
@@ -176,8 +205,7 @@ class BistaWmsApi(http.Controller):
             "contact_address": request.env.user.contact_address or "",
             # "customer_rank": request.env.user.customer_rank,
             "session_info": session_info,
-            "wms_licensing_key": request.env['ir.config_parameter'].sudo().get_param(
-                'bista_wms_api.wms_licensing_key') or "",
+            "wms_licensing_key": wms_settings().wms_licensing_key,
         }
 
         response_data = self.auth_login_response_data(data)
@@ -249,7 +277,7 @@ class BistaWmsApi(http.Controller):
 
     @staticmethod
     def _get_picking_fields(self):
-        stock_picking_type_obj = request.env['stock.picking.type'].search([])
+        stock_picking_type_obj = request.env['stock.picking.type']
         user_id, is_admin = self._get_user_stock_group(self)
         res = []
         picking_type_color_code = ['a2a2a2','ee2d2d','dc8534','e8bb1d','5794dd','9f628f','db8865',
@@ -296,44 +324,35 @@ class BistaWmsApi(http.Controller):
             #                                             order='sequence'):
             domain = []
             domain += self._prepare_inventory_warehouse_domain([('warehouse_id', '=', user_id.warehouse_id.id)])
-            for record in stock_picking_type_obj.with_context(user_id_filtering=True).search(domain, order='sequence'):
-                res.append({
-                    "id": record.id,
-                    "name": record.name,
-                    "code": record.code,
-                    "sequence": record.sequence,
-                    "count_picking_draft": record.count_picking_draft,
-                    "count_picking_waiting": record.count_picking_waiting,
-                    "count_picking_ready": record.count_picking_ready,
-                    "count_picking_late": record.count_picking_late,
-                    "count_picking": record.count_picking,
-                    "count_picking_backorders": record.count_picking_backorders,
-                    "color": record.color,
-                    "picking_type_color_code": picking_type_color_code,
-                    "warehouse_id": [str(record.warehouse_id.id),
-                                     record.warehouse_id.name] if record.warehouse_id else []
-                })
+            picking_type_objs = stock_picking_type_obj.search(domain, order='sequence')
         else:
             #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
             # for record in stock_picking_type_obj.search([('company_id', '=', request.env.user.company_id.id)],
             #                                             order='sequence'):
-            for record in stock_picking_type_obj.search([],order='sequence'):
-                res.append({
-                    "id": record.id,
-                    "name": record.name,
-                    "code": record.code,
-                    "sequence": record.sequence,
-                    "count_picking_draft": record.count_picking_draft,
-                    "count_picking_waiting": record.count_picking_waiting,
-                    "count_picking_ready": record.count_picking_ready,
-                    "count_picking_late": record.count_picking_late,
-                    "count_picking": record.count_picking,
-                    "count_picking_backorders": record.count_picking_backorders,
-                    "color": record.color,
-                    "picking_type_color_code": picking_type_color_code,
-                    "warehouse_id": [str(record.warehouse_id.id),
-                                     record.warehouse_id.name] if record.warehouse_id else []
-                })
+            picking_type_objs = stock_picking_type_obj.search([], order='sequence')
+
+        # NOTE: the counters are read from `bista.wms.picking.counter` in one query instead of the computed
+        # count_picking_* fields of the picking types, restricted to the pickings of the user if not an admin.
+        counters = request.env['bista.wms.picking.counter'].sudo()._get_counters(
+            picking_type_objs.ids, user_id.id if is_admin == 0 else None)
+        for record in picking_type_objs:
+            counter = counters[record.id]
+            res.append({
+                "id": record.id,
+                "name": record.name,
+                "code": record.code,
+                "sequence": record.sequence,
+                "count_picking_draft": counter['draft'],
+                "count_picking_waiting": counter['waiting'],
+                "count_picking_ready": counter['ready'],
+                "count_picking_late": counter['late'],
+                "count_picking": counter['waiting'] + counter['ready'],
+                "count_picking_backorders": counter['backorder'],
+                "color": record.color,
+                "picking_type_color_code": picking_type_color_code,
+                "warehouse_id": [str(record.warehouse_id.id),
+                                 record.warehouse_id.name] if record.warehouse_id else []
+            })
         # batch_transfer = request.env['ir.module.module'].search([('name', '=', 'stock_picking_batch')])
         # is_batch_transfer = True if batch_transfer and batch_transfer.state == 'installed' else False,
 
@@ -342,8 +361,9 @@ class BistaWmsApi(http.Controller):
         # batch_picking_count = stock_picking_batch_obj.search_count(
         #     [('state', '=', 'in_progress'), ('company_id', '=', request.env.user.company_id.id),
         #      ('is_wave', '=', False)]) 
-        batch_picking_count = stock_picking_batch_obj.search_count(
-            [('state', '=', 'in_progress'),('is_wave', '=', False)])
+        batch_counts = dict(stock_picking_batch_obj._read_group(
+            [('state', '=', 'in_progress')], ['is_wave'], ['__count']))
+        batch_picking_count = batch_counts.get(False, 0)
         # if is_batch_transfer else 0
         res.append({
             "id": 0,
@@ -364,8 +384,7 @@ class BistaWmsApi(http.Controller):
         #     [('state', '=', 'in_progress'), ('company_id', '=', request.env.user.company_id.id),
         #      ('is_wave', '=', True)]) if wave_transfer else 0
         if wave_transfer:
-            wave_picking_count = stock_picking_batch_obj.search_count(
-                [('state', '=', 'in_progress'),('is_wave', '=', True)]) if wave_transfer else 0
+            wave_picking_count = batch_counts.get(True, 0)
             res.append({
                 "id": 0,
                 "name": "Wave Transfers",
@@ -382,70 +401,44 @@ class BistaWmsApi(http.Controller):
 
     @staticmethod
     def _get_dashboard_values(self):
-        product_template_obj = request.env['product.template'].search([('type', 'in', ['consu', 'product'])])
         user_id, is_admin = self._get_user_stock_group(self)
 
         res = {}
 
-        sum_qty_available = 0
-        # sum_virtual_available = 0
-        sum_incoming_qty = 0
-        sum_outgoing_qty = 0
-        sum_batch_picking_qty = 0
-        sum_wave_picking_qty = 0
-
-        domain = [
-            ('date', '>=', datetime.now().strftime('%Y-%m-%d 00:00:00')),
-            ('date', '<=', datetime.now().strftime('%Y-%m-%d 23:59:59'))
-        ]
-
-        # stock_move_line_obj = request.env['stock.move.line']
-        stock_move_line_objs = request.env['stock.move.line'].search(domain)
-
-        # sum_incoming_qty = stock_move_line_obj.search_count(
-        #     domain + [('picking_id.picking_type_id.code', '=', 'incoming')]
-        # )
-        # sum_outgoing_qty = stock_move_line_obj.search_count(
-        #     domain + [('picking_id.picking_type_id.code', '=', 'outgoing')]
-        # )
-
-        for stock_move_line_obj in stock_move_line_objs:
-            # Transfers calculation
-            if is_admin == 0:
-                if stock_move_line_obj.sudo().picking_id.user_id.id == user_id.id:
-                    if stock_move_line_obj.picking_id.picking_type_id.code == "incoming":
-                        # NOTE: qty_done in v16 is quantity in v17
-                        sum_incoming_qty += stock_move_line_obj.quantity
-                    elif stock_move_line_obj.picking_id.picking_type_id.code == "outgoing":
-                        sum_outgoing_qty += stock_move_line_obj.quantity
-            else:
-                if stock_move_line_obj.picking_id.picking_type_id.code == "incoming":
-                    sum_incoming_qty += stock_move_line_obj.quantity
-                elif stock_move_line_obj.picking_id.picking_type_id.code == "outgoing":
-                    sum_outgoing_qty += stock_move_line_obj.quantity
-
-            # Batch & Wave Pickings calculation
-            if stock_move_line_obj.batch_id:
-                if is_admin == 0:
-                    if stock_move_line_obj.sudo().batch_id.user_id.id == user_id.id:
-                        if not stock_move_line_obj.batch_id.is_wave:
-                            sum_batch_picking_qty += stock_move_line_obj.quantity
-                        elif stock_move_line_obj.batch_id.is_wave:
-                            sum_wave_picking_qty += stock_move_line_obj.quantity
-                else:
-                    if not stock_move_line_obj.batch_id.is_wave:
-                        sum_batch_picking_qty += stock_move_line_obj.quantity
-                    elif stock_move_line_obj.batch_id.is_wave:
-                        sum_wave_picking_qty += stock_move_line_obj.quantity
+        # NOTE: the move lines of the day are summed in a single query, by picking type code and batch wave flag.
+        # The pickings and batches of other users are left out in SQL when the user is not a stock manager.
+        for model_name in ('stock.move.line', 'stock.picking', 'stock.picking.batch'):
+            request.env[model_name].flush_model()
+        request.env.cr.execute("""
+            SELECT COALESCE(SUM(line.quantity) FILTER (
+                       WHERE picking_type.code = 'incoming' AND (%(user_id)s::integer IS NULL OR picking.user_id = %(user_id)s)), 0),
+                   COALESCE(SUM(line.quantity) FILTER (
+                       WHERE picking_type.code = 'outgoing' AND (%(user_id)s::integer IS NULL OR picking.user_id = %(user_id)s)), 0),
+                   COALESCE(SUM(line.quantity) FILTER (
+                       WHERE NOT batch.is_wave AND (%(user_id)s::integer IS NULL OR batch.user_id = %(user_id)s)), 0),
+                   COALESCE(SUM(line.quantity) FILTER (
+                       WHERE batch.is_wave AND (%(user_id)s::integer IS NULL OR batch.user_id = %(user_id)s)), 0)
+              FROM stock_move_line line
+         LEFT JOIN stock_picking picking ON picking.id = line.picking_id
+         LEFT JOIN stock_picking_type picking_type ON picking_type.id = picking.picking_type_id
+         LEFT JOIN stock_picking_batch batch ON batch.id = line.batch_id
+             WHERE line.date >= %(date_from)s AND line.date <= %(date_to)s
+               AND line.company_id = ANY(%(company_ids)s)
+        """, {
+            'user_id': None if is_admin else user_id.id,
+            'date_from': datetime.now().strftime('%Y-%m-%d 00:00:00'),
+            'date_to': datetime.now().strftime('%Y-%m-%d 23:59:59'),
+            'company_ids': request.env.companies.ids,
+        })
+        sum_incoming_qty, sum_outgoing_qty, sum_batch_picking_qty, sum_wave_picking_qty = request.env.cr.fetchone()
 
-        for prod_temp in product_template_obj:
-            sum_qty_available += prod_temp.qty_available
-            # sum_virtual_available += prod_temp.virtual_available
-            # sum_incoming_qty += prod_temp.incoming_qty
-            # sum_outgoing_qty += prod_temp.outgoing_qty
+        # On hand quantity of the storable products, i.e. the internal quants of the user's companies.
+        [(sum_qty_available,)] = request.env['stock.quant']._read_group([
+            ('location_id.usage', '=', 'internal'), ('company_id', 'in', request.env.companies.ids)
+        ], aggregates=['quantity:sum'])
 
         res.update({
-            'sum_qty_available': sum_qty_available,
+            'sum_qty_available': sum_qty_available or 0,
             # 'sum_virtual_available': sum_virtual_available,
             'sum_incoming_qty': sum_incoming_qty,
             'sum_outgoing_qty': sum_outgoing_qty,
@@ -456,8 +449,7 @@ class BistaWmsApi(http.Controller):
         res.update({"to_process_count": self._get_picking_fields(self)})
         res.update({"warehouse_id": [str(user_id.warehouse_id.id),
                                      user_id.warehouse_id.name] if user_id.warehouse_id else []})
-        res.update({"wms_licensing_key": request.env['ir.config_parameter'].sudo().get_param(
-            'bista_wms_api.wms_licensing_key') or ""})
+        res.update({"wms_licensing_key": wms_settings().wms_licensing_key})
 
         # Pass 'quality_modules_installed' as False by default to be changed in inherited function later.
         res.update({'quality_modules_installed': False})
@@ -515,8 +507,34 @@ class BistaWmsApi(http.Controller):
             # ToDo: return all data in Ready state instead of invalid_response()
             return invalid_response('not_found', 'No barcode was provided.', 200)
 
+    @staticmethod
+    def _get_internal_quants_data(self, product_ids):
+        """
+            Returns the internal quants of the products grouped by product id, fetched with a single search.
+        """
+        quants_data = defaultdict(list)
+        stock_quants = request.env['stock.quant'].search([
+            ('product_id', 'in', product_ids.ids), ('quantity', '>=', 0),
+            ('company_id', 'in', request.env.companies.ids), ('location_id.usage', '=', 'internal')
+        ])
+        for quant_id in stock_quants:
+            rfid = quant_id.lot_id.rfid_tag.name if 'rfid_tag' in quant_id.lot_id._fields else ""
+            quants_data[quant_id.product_id.id].append({
+                'id': quant_id.id,
+                'location': quant_id.location_id.complete_name,
+                'lot_serial': quant_id.lot_id.name if quant_id.lot_id else "",
+                'rfid_tag': rfid or "",
+                'on_hand_quantity': quant_id.quantity,
+            })
+        return quants_data
+
     @staticmethod
     def get_picking_detail_response_data(self, response_data, stock_picking_objs):
+        selection = requested_fields()
+        quants_data = {}
+        if 'move_line_ids' in selection and 'quant_ids' in selection['move_line_ids'] and \
+                not wms_settings().restrict_stock_quants_in_location:
+            quants_data = self._get_internal_quants_data(self, stock_picking_objs.move_line_ids.product_id)
         for stock_picking_obj in stock_picking_objs:
             move = []
             move_line = []
@@ -525,68 +543,52 @@ class BistaWmsApi(http.Controller):
             # NOTE: transfered to bista_wms_api_purchase_extension
             # purchase_id = stock_picking_obj.purchase_id.id if stock_picking_obj.purchase_id else 0
             rfid_tag = stock_picking_obj.rfid_tag.name if 'rfid_tag' in stock_picking_obj._fields else ""
-            for move_id in stock_picking_obj.move_ids_without_package:
-                move.append({
-                    'id': move_id.id,
-                    'product_id': move_id.product_id.id,
-                    'product': move_id.product_id.display_name,
-                    'location_id': [str(move_id.location_id.id),
-                                    move_id.location_id.complete_name] if move_id.location_id else [],
-                    'move_line_ids': move_id.move_line_ids.ids,
-                    "product_packaging": [str(move_id.product_packaging_id.id),
-                                          move_id.product_packaging_id.name] if move_id.product_packaging_id else [],
-                    'product_code': move_id.product_id.default_code or "",
-                    'description_picking': move_id.description_picking or "",
-                    'product_uom_qty': move_id.product_uom_qty,
-                    'state': dict(move_id._fields['state'].selection).get(move_id.state),
-                })
+            if 'move_ids' in selection:
+                for move_id in stock_picking_obj.move_ids_without_package:
+                    move.append({
+                        'id': move_id.id,
+                        'product_id': move_id.product_id.id,
+                        'product': move_id.product_id.display_name,
+                        'location_id': [str(move_id.location_id.id),
+                                        move_id.location_id.complete_name] if move_id.location_id else [],
+                        'move_line_ids': move_id.move_line_ids.ids,
+                        "product_packaging": [str(move_id.product_packaging_id.id),
+                                              move_id.product_packaging_id.name] if move_id.product_packaging_id else [],
+                        'product_code': move_id.product_id.default_code or "",
+                        'description_picking': move_id.description_picking or "",
+                        'product_uom_qty': move_id.product_uom_qty,
+                        'state': dict(move_id._fields['state'].selection).get(move_id.state),
+                    })
 
             # move_ids = stock_picking_obj.move_ids_without_package.read([
             #     'name', 'description_picking', 'product_uom_qty', 'state'
             # ])
             # for move_id in move_ids:
             #     move_id['state'] = dict(stock_picking_obj.move_ids_without_package._fields['state'].selection).get(move_id['state'])
-            for line_id in stock_picking_obj.move_line_ids:
-                quant_line = []
-
-                if not ast.literal_eval(request.env['ir.config_parameter'].sudo().get_param('bista_wms_api.restrict_stock_quants_in_location', 'False')):
-                    stock_quants = request.env['stock.quant'].search([
-                        ('product_id', '=', line_id.product_id.id), ('quantity', '>=', 0)
-                    ])
-                    product_stock_quant_ids = stock_quants.filtered(
-                        lambda q: q.company_id in request.env.companies and q.location_id.usage == 'internal'
-                    )
-
-                    for quant_id in product_stock_quant_ids:
-                        rfid = quant_id.lot_id.rfid_tag.name if 'rfid_tag' in quant_id.lot_id._fields else ""
-                        quant_line.append({
-                            'id': quant_id.id,
-                            'location': quant_id.location_id.complete_name,
-                            'lot_serial': quant_id.lot_id.name if quant_id.lot_id else "",
-                            'rfid_tag': rfid or "",
-                            'on_hand_quantity': quant_id.quantity,
-                        })
-                
-                move_line.append({
-                    'id': line_id.id,
-                    'product_id': line_id.product_id.id,
-                    'product': line_id.product_id.name,
-                    'lot_id': [str(line_id.lot_id.id), line_id.lot_id.name] if line_id.lot_id else [],
-                    'tracking': line_id.product_id.tracking,
-                    'location_id': [str(line_id.location_id.id),
-                                    line_id.location_id.complete_name] if line_id.location_id else [],
-                    'location_dest_id': [str(line_id.location_dest_id.id),
-                                            line_id.location_dest_id.complete_name] if line_id.location_dest_id else [],
-                    'move_id': line_id.move_id.id,
-                    'product_packages': [str(line_id.result_package_id.id),
-                                         line_id.result_package_id.name] if line_id.result_package_id else [],
-                    'product_code': line_id.product_id.default_code or "",
-                    # 'product_uom_qty': line_id.reserved_uom_qty,  #NOTE:reserved_uom_qty not available in v17
-                    'product_uom_qty': line_id.move_id.product_uom_qty,
-                    # 'quantity_done': line_id.qty_done, # NOTE: qty_done is quantity in v17
-                    'quantity_done': line_id.quantity,
-                    'quant_ids': quant_line,
-                })
+            if 'move_line_ids' in selection:
+                for line_id in stock_picking_obj.move_line_ids:
+                    quant_line = list(quants_data.get(line_id.product_id.id, []))
+
+                    move_line.append({
+                        'id': line_id.id,
+                        'product_id': line_id.product_id.id,
+                        'product': line_id.product_id.name,
+                        'lot_id': [str(line_id.lot_id.id), line_id.lot_id.name] if line_id.lot_id else [],
+                        'tracking': line_id.product_id.tracking,
+                        'location_id': [str(line_id.location_id.id),
+                                        line_id.location_id.complete_name] if line_id.location_id else [],
+                        'location_dest_id': [str(line_id.location_dest_id.id),
+                                                line_id.location_dest_id.complete_name] if line_id.location_dest_id else [],
+                        'move_id': line_id.move_id.id,
+                        'product_packages': [str(line_id.result_package_id.id),
+                                             line_id.result_package_id.name] if line_id.result_package_id else [],
+                        'product_code': line_id.product_id.default_code or "",
+                        # 'product_uom_qty': line_id.reserved_uom_qty,  #NOTE:reserved_uom_qty not available in v17
+                        'product_uom_qty': line_id.move_id.product_uom_qty,
+                        # 'quantity_done': line_id.qty_done, # NOTE: qty_done is quantity in v17
+                        'quantity_done': line_id.quantity,
+                        'quant_ids': quant_line,
+                    })
 
             response_data.append({
                 'id': stock_picking_obj.id,
@@ -642,6 +644,14 @@ class BistaWmsApi(http.Controller):
         # response_data = sorted(response_data, key=lambda i: i['group_id'][0], reverse= True)
         return response_data
 
+    @staticmethod
+    def iter_picking_detail_response_data(self, stock_picking_objs):
+        """
+            Generator variant of get_picking_detail_response_data, serializing the pickings batch by batch.
+        """
+        return iter_by_batch(
+            stock_picking_objs, lambda pickings: self.get_picking_detail_response_data(self, [], pickings))
+
     @validate_token
     @http.route("/api/get_picking_detail", type="http", auth="none", methods=["GET"], csrf=False)
     def get_picking_detail(self, **payload):
@@ -663,6 +673,7 @@ class BistaWmsApi(http.Controller):
 
             stock_picking = request.env['stock.picking'].search(domain)
             stock_picking_objs = False
+            page = {}
             multi_steps_routing = request.env.user.has_group('stock.group_adv_location')
 
             user_id, is_admin = self._get_user_stock_group(self)
@@ -677,7 +688,7 @@ class BistaWmsApi(http.Controller):
                                                     ('rfid_tag.name', '=', payload_data.get('barcode'))]
                         if is_admin == 0:
                             stock_picking_domain = stock_picking_domain + [('user_id', '=', user_id.id)]
-                        stock_picking_objs = stock_picking.sudo().search(stock_picking_domain)
+                        stock_picking_objs, page = keyset_search(stock_picking.sudo(), stock_picking_domain, payload_data)
                 elif 'picking_id' in payload_data:
                     if payload_data['picking_id']:
                         stock_picking_domain = [
@@ -685,7 +696,7 @@ class BistaWmsApi(http.Controller):
                         ]
                         if is_admin == 0:
                             stock_picking_domain = stock_picking_domain + [('user_id', '=', user_id.id)]
-                        stock_picking_objs = stock_picking.sudo().search(stock_picking_domain)
+                        stock_picking_objs, page = keyset_search(stock_picking.sudo(), stock_picking_domain, payload_data)
                 elif 'picking_type_id' in payload_data:
                     if payload_data['picking_type_id']:
                         stock_picking_domain = [
@@ -694,7 +705,7 @@ class BistaWmsApi(http.Controller):
                         ]
                         if is_admin == 0:
                             stock_picking_domain = stock_picking_domain + [('user_id', '=', user_id.id)]
-                        stock_picking_objs = stock_picking.sudo().search(stock_picking_domain)
+                        stock_picking_objs, page = keyset_search(stock_picking.sudo(), stock_picking_domain, payload_data)
             else:
                 if not multi_steps_routing: 
                     #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
@@ -719,12 +730,14 @@ class BistaWmsApi(http.Controller):
                 if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
                     stock_picking_domain += filter_by_last_sync_time('stock.picking', payload_data)
 
-                stock_picking_objs = stock_picking.sudo().search(stock_picking_domain, order='id')
+                stock_picking_objs, page = keyset_search(stock_picking.sudo(), stock_picking_domain, payload_data, order='id')
 
             if stock_picking_objs:
+                if is_stream_requested(payload_data):
+                    return stream_response(self.iter_picking_detail_response_data(self, stock_picking_objs), **page)
                 response_data = self.get_picking_detail_response_data(self, response_data, stock_picking_objs)
 
-                return valid_response(response_data)
+                return valid_response(response_data, **page)
             else:
                 return invalid_response('not_found', 'No Picking record found.')
         except Exception as e:
@@ -948,7 +961,8 @@ class BistaWmsApi(http.Controller):
 
         try:
             access_token = request.httprequest.headers.get("access-token")
-            user_id = request.env['api.access_token'].sudo().search([('token', '=', access_token)], limit=1).user_id
+            token_info = request.env['api.access_token'].sudo()._get_token_info(access_token)
+            user_id = request.env['res.users'].browse(token_info[0] if token_info else [])
             if user_id and request.httprequest.method == 'GET':
                 user_details = {
                     'name': user_id.name or "",
@@ -970,8 +984,10 @@ class BistaWmsApi(http.Controller):
     @staticmethod
     def get_product_detail_response_data(self, domain, payload_data):
 
-        product_product = request.env['product.product'].search(domain)
-        stock_lot = request.env['stock.lot'].search(domain)
+        page = {}
+        # NOTE: `domain` is on product.template, these are only used to search by barcode.
+        product_product = request.env['product.product']
+        stock_lot = request.env['stock.lot']
 
         if 'barcode' in payload_data:
             if payload_data['barcode']:
@@ -983,8 +999,6 @@ class BistaWmsApi(http.Controller):
                 product_product_objs = product_product.search(product_product_domain, limit=1)
                 if product_product_objs:
                     product_template_objs = product_product_objs.product_tmpl_id
-                    product_template_img = product_template_objs.image_1920.decode(
-                        "utf-8") if product_template_objs.image_1920 else ""
                 elif not product_product_objs:
                     # get product.product object from stock.lot
                     stock_lot_domain = [('name', '=', payload_data.get('barcode'))]
@@ -994,8 +1008,6 @@ class BistaWmsApi(http.Controller):
                     product_product_objs = stock_lot.sudo().search(stock_lot_domain, limit=1).product_id
                     if product_product_objs:
                         product_template_objs = product_product_objs.product_tmpl_id
-                        product_template_img = product_template_objs.image_1920.decode(
-                            "utf-8") if product_template_objs.image_1920 else ""
                     else:
                         # return invalid_response('not_found', 'No product found for this barcode.')
                         return {"status": False, 'code': "not_found", 'message': "No product found for this barcode"}
@@ -1004,58 +1016,114 @@ class BistaWmsApi(http.Controller):
                 return {"status": False, 'code': "not_found", 'message': "No product found for this barcode"}
         else:
             domain.append(('type', 'in', ['consu', 'product']))
-            product_template_objs = request.env['product.template'].search(domain)
-            product_template_img = ""
+            product_template_objs, page = keyset_search(request.env['product.template'], domain, payload_data)
 
         if product_template_objs:
-            response_data = []
-            stock_putaway = request.env['stock.putaway.rule']
-            stock_storage_capacity = request.env['stock.storage.category.capacity']
-
-            for product in product_template_objs:
-                barcode = []
-                rfid_tags = []
-                packaging_line = []
-                product_variants = []
-                for product_variant in product.product_variant_ids:
-                    variant_values = []
-                    rfid_tag_variant = []
-                    barcode_variant = []
-                    if product_variant.barcode:
-                        barcode.append(product_variant.barcode)
-                        barcode_variant.append(product_variant.barcode)
-                    if 'rfid_tag' in product_variant._fields:
-                        if product_variant.rfid_tag:
-                            rfid_tags.append(product_variant.rfid_tag.name)
-                            rfid_tag_variant.append(product_variant.rfid_tag.name)
-                    stock_lot_variant_obj = request.env['stock.lot'].search(
-                        [('product_id', '=', product_variant.id), ('product_id.barcode', '=', product_variant.barcode)])
-                    lot_serial_variant = stock_lot_variant_obj.mapped('name')
-                    if product_variant.product_variant_count >= 1:
-                        for variant_value in product_variant.product_template_variant_value_ids:
-                            variant_values.append(f'{variant_value.attribute_id.name}:{variant_value.name}')
-                    product_variants.append({'id': product_variant.id,
-                                             'name': product.display_name,
-                                             'barcode': barcode_variant + lot_serial_variant + rfid_tag_variant,
-                                             'variant_values': variant_values})
-                #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-                # stock_quants = request.env['stock.quant'].search([
-                #     ('product_id.product_tmpl_id', '=', product.id), ('quantity', '>=', 0),
-                #     ('location_id.usage', '=', 'internal'),
-                #     ('company_id', '=', request.env.user.company_id.id)
-                # ])
-                stock_quants = request.env['stock.quant'].search([
-                    ('product_id.product_tmpl_id', '=', product.id), ('quantity', '>=', 0),
-                    ('location_id.usage', '=', 'internal')])
+            response_data = self._prepare_product_detail_data(self, product_template_objs)
+            # return valid_response(response_data)
+            return {"status": True, 'data': response_data, 'page': page}
+
+        else:
+            # return invalid_response('not_found', 'No product found.')
+            return {"status": False, 'code': "not_found", 'message': "No product found"}
+
+    @staticmethod
+    def _prepare_product_detail_data(self, product_template_objs):
+        """Product details of `product_template_objs`, as returned by `/api/get_product_detail`."""
+        selection = requested_fields()
+        stock_lot = request.env['stock.lot']
+        response_data = []
+        stock_putaway = request.env['stock.putaway.rule']
+        stock_storage_capacity = request.env['stock.storage.category.capacity']
+        with_variants = 'product_variants' in selection
+        with_quants = any(key in selection for key in ('on_hand', 'available_quantity', 'on_hand_details'))
+        with_lots = any(key in selection for key in ('barcode', 'lot_serial_number', 'rfid_tags'))
+        image_checksums = self._get_product_image_checksums(self, product_template_objs)
+
+        # NOTE: the lots, quants, putaway rules and storage capacities of all the templates are searched
+        # once and grouped here, in the order the searches of each template returned them.
+        product_variant_objs = product_template_objs.product_variant_ids
+        lot_ids_by_variant = defaultdict(list)
+        lot_ids_by_template = defaultdict(list)
+        if with_variants or with_lots:
+            for lot in stock_lot.search([('product_id', 'in', product_variant_objs.ids)]):
+                lot_ids_by_variant[lot.product_id.id].append(lot.id)
+                lot_ids_by_template[lot.product_id.product_tmpl_id.id].append(lot.id)
+        quant_ids_by_template = defaultdict(list)
+        quant_details_by_id = {}
+        if with_quants:
+            all_stock_quants = request.env['stock.quant'].search([
+                ('product_id.product_tmpl_id', 'in', product_template_objs.ids), ('quantity', '>=', 0),
+                ('location_id.usage', '=', 'internal')])
+            for quant in all_stock_quants:
+                quant_ids_by_template[quant.product_id.product_tmpl_id.id].append(quant.id)
+            quant_details_by_id = {quant['id']: quant for quant in all_stock_quants.sudo().read([
+                'location_id', 'product_id', 'lot_id', 'package_id', 'owner_id', 'product_categ_id',
+                'quantity', 'reserved_quantity', 'available_quantity',
+                'inventory_quantity', 'inventory_quantity_auto_apply', 'inventory_diff_quantity',
+                'inventory_date'
+            ])}
+        putaway_ids_by_template = defaultdict(set)
+        putaway_ids_by_category = defaultdict(set)
+        if 'putaway' in selection:
+            for rule in stock_putaway.sudo().search([
+                '|', ('product_id.product_tmpl_id', 'in', product_template_objs.ids),
+                ('category_id', 'in', product_template_objs.categ_id.ids)
+            ]):
+                if rule.product_id:
+                    putaway_ids_by_template[rule.product_id.product_tmpl_id.id].add(rule.id)
+                if rule.category_id:
+                    putaway_ids_by_category[rule.category_id.id].add(rule.id)
+        storage_capacity_counts = {}
+        if 'storage_capacity' in selection:
+            storage_capacity_counts = {
+                product_variant.id: count for product_variant, count in stock_storage_capacity.sudo()._read_group(
+                    [('product_id', 'in', product_variant_objs.ids)], ['product_id'], ['__count'])
+            }
+        packaging_enabled = bool(product_template_objs) and \
+            self._get_user_stock_group(self)[0].has_group('product.group_stock_packaging')
+
+        for product in product_template_objs:
+            barcode = []
+            rfid_tags = []
+            packaging_line = []
+            product_variants = []
+            for product_variant in product.product_variant_ids:
+                variant_values = []
+                rfid_tag_variant = []
+                barcode_variant = []
+                if product_variant.barcode:
+                    barcode.append(product_variant.barcode)
+                    barcode_variant.append(product_variant.barcode)
+                if 'rfid_tag' in product_variant._fields:
+                    if product_variant.rfid_tag:
+                        rfid_tags.append(product_variant.rfid_tag.name)
+                        rfid_tag_variant.append(product_variant.rfid_tag.name)
+                if not with_variants:
+                    continue
+                stock_lot_variant_obj = stock_lot.browse(lot_ids_by_variant[product_variant.id])
+                lot_serial_variant = stock_lot_variant_obj.mapped('name')
+                if product_variant.product_variant_count >= 1:
+                    for variant_value in product_variant.product_template_variant_value_ids:
+                        variant_values.append(f'{variant_value.attribute_id.name}:{variant_value.name}')
+                product_variants.append({'id': product_variant.id,
+                                         'name': product.display_name,
+                                         'barcode': barcode_variant + lot_serial_variant + rfid_tag_variant,
+                                         'variant_values': variant_values})
+            #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
+            # stock_quants = request.env['stock.quant'].search([
+            #     ('product_id.product_tmpl_id', '=', product.id), ('quantity', '>=', 0),
+            #     ('location_id.usage', '=', 'internal'),
+            #     ('company_id', '=', request.env.user.company_id.id)
+            # ])
+            stock_quants = request.env['stock.quant']
+            stock_quants_on_hand_qty = stock_quants_available_quantity_qty = quant_detail = []
+            if with_quants:
+                stock_quants = request.env['stock.quant'].browse(quant_ids_by_template[product.id])
                 stock_quants_on_hand_qty = stock_quants.mapped('quantity')
                 stock_quants_available_quantity_qty = stock_quants.mapped('available_quantity')
 
-                quant_detail = stock_quants.sudo().read([
-                    'location_id', 'product_id', 'lot_id', 'package_id', 'owner_id', 'product_categ_id',
-                    'quantity', 'reserved_quantity', 'available_quantity',
-                    'inventory_quantity', 'inventory_quantity_auto_apply', 'inventory_diff_quantity',
-                    'inventory_date'
-                ])
+                quant_detail = [quant_details_by_id[quant_id] for quant_id in stock_quants.ids]
                 for quant in quant_detail:
                     if not quant['location_id']:
                         quant['location_id'] = []
@@ -1088,83 +1156,128 @@ class BistaWmsApi(http.Controller):
                         quant['product_categ_id'] = list(quant['product_categ_id'])
                         quant['product_categ_id'][0] = str(quant['product_categ_id'][0])
 
-                #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-                # putaway_count = stock_putaway.sudo().search_count([
-                #     ('company_id', '=', request.env.user.company_id.id),
-                #     '|', ('product_id.product_tmpl_id', '=', product.id),
-                #     ('category_id', '=', product.categ_id.id)
-                # ])
-                putaway_count = stock_putaway.sudo().search_count([
-                    '|', ('product_id.product_tmpl_id', '=', product.id),
-                    ('category_id', '=', product.categ_id.id)
-                ])
-                # storage_capacity_count = stock_storage_capacity.sudo().search_count([
-                #     ('product_id', 'in', product.product_variant_ids.ids),
-                #     ('company_id', '=', request.env.user.company_id.id)
-                # ])
-                storage_capacity_count = stock_storage_capacity.sudo().search_count([
-                    ('product_id', 'in', product.product_variant_ids.ids)
-                ])
-                stock_lot_obj = stock_lot.search([('product_id', 'in', product.product_variant_ids.ids)])
-                lot_serial = stock_lot_obj.mapped('name')
-                if 'rfid_tag' in stock_lot._fields:
-                    for lot_obj in stock_lot_obj:
-                        if lot_obj.rfid_tag:
-                            rfid_tags.append(lot_obj.rfid_tag.name)
-                # packaging_type details:
-                user_id, is_admin = self._get_user_stock_group(self)
-                packaging_enabled = user_id.has_group('product.group_stock_packaging')
-                if packaging_enabled:
-                    for packaging in product.packaging_ids:
-                        packaging_line.append({
-                            'name': packaging.name,
-                            'package_type_id': [str(packaging.package_type_id.id),
-                                                str(packaging.package_type_id.name)] if packaging.package_type_id else [],
-                            'qty': packaging.qty,   
-                            # NOTE: transferred to bista_wms_sales_extensions
-                            # 'sales': str(packaging.sales or ""),
-                            # NOTE: transfered to bista_wms_api_purchase_extension
-                            # 'purchase': str(packaging.purchase or ""),
-                        })
+            #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
+            # putaway_count = stock_putaway.sudo().search_count([
+            #     ('company_id', '=', request.env.user.company_id.id),
+            #     '|', ('product_id.product_tmpl_id', '=', product.id),
+            #     ('category_id', '=', product.categ_id.id)
+            # ])
+            putaway_count = len(
+                putaway_ids_by_template[product.id] | putaway_ids_by_category[product.categ_id.id]
+            ) if 'putaway' in selection else 0
+            # storage_capacity_count = stock_storage_capacity.sudo().search_count([
+            #     ('product_id', 'in', product.product_variant_ids.ids),
+            #     ('company_id', '=', request.env.user.company_id.id)
+            # ])
+            storage_capacity_count = sum(
+                storage_capacity_counts.get(variant_id, 0) for variant_id in product.product_variant_ids.ids
+            ) if 'storage_capacity' in selection else 0
+            stock_lot_obj = stock_lot.browse(lot_ids_by_template[product.id]) if with_lots else stock_lot.browse()
+            lot_serial = stock_lot_obj.mapped('name')
+            if 'rfid_tag' in stock_lot._fields:
+                for lot_obj in stock_lot_obj:
+                    if lot_obj.rfid_tag:
+                        rfid_tags.append(lot_obj.rfid_tag.name)
+            # packaging_type details:
+            if packaging_enabled and 'packaging_line' in selection:
+                for packaging in product.packaging_ids:
+                    packaging_line.append({
+                        'name': packaging.name,
+                        'package_type_id': [str(packaging.package_type_id.id),
+                                            str(packaging.package_type_id.name)] if packaging.package_type_id else [],
+                        'qty': packaging.qty,   
+                        # NOTE: transferred to bista_wms_sales_extensions
+                        # 'sales': str(packaging.sales or ""),
+                        # NOTE: transfered to bista_wms_api_purchase_extension
+                        # 'purchase': str(packaging.purchase or ""),
+                    })
 
-                response_data.append({
-                    'id': product.id,
-                    'product_name': product.name,
-                    'tracking': product.tracking,
-                    'product_code': product.default_code or "",
-                    'barcode': barcode + lot_serial + rfid_tags,
-                    'prod_barcode': barcode,
-                    'lot_serial_number': lot_serial,
-                    'rfid_tags': rfid_tags,
-                    'expiration_date': product.use_expiration_date if 'use_expiration_date' in product._fields else False,
-                    'inventory_location': product.property_stock_inventory.complete_name or "",
-                    'variant': product.product_variant_count,
-                    'product_variants': product_variants,
-                    'on_hand': sum(stock_quants_on_hand_qty) if stock_quants else 0,
-                    'available_quantity': sum(stock_quants_available_quantity_qty) if stock_quants else 0,
-                    'on_hand_details': quant_detail,
-                    # NOTE: transfered to bista_wms_api_purchase_extension
-                    # 'purchase_unit': product.purchased_product_qty,
-                    # NOTE: transferred to bista_wms_sales_extensions
-                    # 'sold_unit': product.sales_count,
-                    'putaway': putaway_count,
-                    'storage_capacity': storage_capacity_count,
-                    'product_in': product.nbr_moves_in,
-                    'product_out': product.nbr_moves_out,
-                    'packaging_line': packaging_line,
-                    'image': product_template_img or "",
-                    'image_url':'/web/image?model=product.template&id={}&field=image_128'.format(product.id),
-                    'list_price': product.list_price,
-                    'company_id': [str(product.company_id.id), product.company_id.name] if product.company_id else [],
-                    'categ_id': [str(product.categ_id.id), product.categ_id.name] if product.categ_id else [],
-                })
+            response_data.append({
+                'id': product.id,
+                'product_name': product.name,
+                'tracking': product.tracking,
+                'product_code': product.default_code or "",
+                'barcode': barcode + lot_serial + rfid_tags,
+                'prod_barcode': barcode,
+                'lot_serial_number': lot_serial,
+                'rfid_tags': rfid_tags,
+                'expiration_date': product.use_expiration_date if 'use_expiration_date' in product._fields else False,
+                'inventory_location': product.property_stock_inventory.complete_name or "",
+                'variant': product.product_variant_count,
+                'product_variants': product_variants,
+                'on_hand': sum(stock_quants_on_hand_qty) if stock_quants else 0,
+                'available_quantity': sum(stock_quants_available_quantity_qty) if stock_quants else 0,
+                'on_hand_details': quant_detail,
+                # NOTE: transfered to bista_wms_api_purchase_extension
+                # 'purchase_unit': product.purchased_product_qty,
+                # NOTE: transferred to bista_wms_sales_extensions
+                # 'sold_unit': product.sales_count,
+                'putaway': putaway_count,
+                'storage_capacity': storage_capacity_count,
+                'product_in': product.nbr_moves_in if 'product_in' in selection else 0,
+                'product_out': product.nbr_moves_out if 'product_out' in selection else 0,
+                'packaging_line': packaging_line,
+                # NOTE: images are not inlined anymore, devices download and cache them from `image_urls`.
+                'image': "",
+                'image_url': self._get_product_image_url(product.id, 128, image_checksums.get(product.id)),
+                'image_urls': {
+                    str(size): self._get_product_image_url(product.id, size, image_checksums.get(product.id))
+                    for size in PRODUCT_IMAGE_SIZES
+                },
+                'image_checksum': image_checksums.get(product.id) or "",
+                'list_price': product.list_price,
+                'company_id': [str(product.company_id.id), product.company_id.name] if product.company_id else [],
+                'categ_id': [str(product.categ_id.id), product.categ_id.name] if product.categ_id else [],
+            })
+        return response_data
 
-            # return valid_response(response_data)
-            return {"status": True, 'data': response_data}
+    @staticmethod
+    def _get_product_image_checksums(self, product_templates):
+        """Checksum of the image of the templates having one, from their attachments."""
+        attachments = request.env['ir.attachment'].sudo().search_read([
+            ('res_model', '=', 'product.template'),
+            ('res_field', '=', 'image_1920'),
+            ('res_id', 'in', product_templates.ids),
+        ], ['res_id', 'checksum'])
+        return {attachment['res_id']: attachment['checksum'] for attachment in attachments}
 
-        else:
-            # return invalid_response('not_found', 'No product found.')
-            return {"status": False, 'code': "not_found", 'message': "No product found"}
+    @staticmethod
+    def _get_product_image_url(product_tmpl_id, size, checksum=None):
+        url = '/api/product_image/%s/%s' % (product_tmpl_id, size)
+        # The checksum changes the URL of a changed image, so the devices can cache the images forever.
+        return '%s?unique=%s' % (url, checksum) if checksum else url
+
+    @validate_token
+    @http.route("/api/product_image/<int:product_tmpl_id>/<int:size>", type="http", auth="none", methods=["GET"],
+                csrf=False)
+    def get_product_image(self, product_tmpl_id, size, **payload):
+        """
+            Returns the image of a product template in 128, 256, 512 or 1920 pixels.
+            Supports If-None-Match (the ETag is the image checksum) and Range requests.
+        """
+        try:
+            if size not in PRODUCT_IMAGE_SIZES:
+                return invalid_response('bad_request', 'Image size must be one of %s.' % (PRODUCT_IMAGE_SIZES,), 400)
+            product_template = request.env['product.template'].browse(product_tmpl_id).exists()
+            if not product_template:
+                return invalid_response('not_found', 'No product found.', 404)
+            stream = request.env['ir.binary']._get_image_stream_from(product_template, 'image_%s' % size)
+            # NOTE: URLs with the image checksum never change, the others are revalidated with the ETag.
+            immutable = bool(payload.get('unique'))
+            response = stream.get_response(immutable=immutable)
+            # Served to authenticated devices only, shared caches must not keep it.
+            response.cache_control.public = False
+            response.cache_control.private = True
+            if not immutable:
+                response.cache_control.max_age = 0
+                response.cache_control.no_cache = True
+            return response
+        except AccessError:
+            return invalid_response('access_denied', 'Access denied for this product.', 403)
+        except Exception as e:
+            _logger.exception("Error while getting product image for product template: %s", product_tmpl_id)
+            error_msg = 'Error while getting product image.'
+            return invalid_response('bad_request', error_msg, 200)
 
     @validate_token
     @http.route("/api/get_product_detail", type="http", auth="none", methods=["GET"], csrf=False)
@@ -1180,13 +1293,13 @@ class BistaWmsApi(http.Controller):
             payload_data = payload
             domain = []
             if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                domain += filter_by_last_sync_time('product.product', payload_data)
+                domain += filter_by_last_sync_time('product.template', payload_data)
 
             # TODO
             res = self.get_product_detail_response_data(self, domain, payload_data)
 
             if res['status']:
-                return valid_response(res['data'])
+                return valid_response(res['data'], **res.get('page', {}))
             else:
                 return invalid_response(res['code'], res['message'], 200)
 
@@ -1197,96 +1310,86 @@ class BistaWmsApi(http.Controller):
 
     @staticmethod
     def get_batch_detail_response_data(self, stock_picking_batch_objs, response_data):
+        selection = requested_fields()
+        quants_data = {}
+        if 'move_line' in selection and 'quant_ids' in selection['move_line']:
+            quants_data = self._get_internal_quants_data(self, stock_picking_batch_objs.move_line_ids.product_id)
         for stock_picking_batch_obj in stock_picking_batch_objs:
             picking = []
             move = []
             move_line = []
-            for picking_id in stock_picking_batch_obj.picking_ids:
-                rfid = picking_id.rfid_tag.name if 'rfid_tag' in picking_id._fields else ""
-                picking.append({
-                    'id': picking_id.id,
-                    'name': picking_id.name,
-                    'rfid_tag': rfid or "",
-                    'source_doc': picking_id.origin if picking_id.origin else "",
-                    'schedule_date': picking_id.scheduled_date or "",
-                    'deadline': picking_id.date_deadline or "",
-                    'done_date': picking_id.date_done or "",
-                    'partner_id': [str(picking_id.partner_id.id),
-                                   picking_id.partner_id.name] if picking_id.partner_id else [],
-                    'location_id': [str(picking_id.location_id.id),
-                                    picking_id.location_id.display_name] if picking_id.location_id else [],
-                    'location_dest_id': [str(picking_id.location_dest_id.id),
-                                         picking_id.location_dest_id.display_name] if picking_id.location_dest_id else [],
-                    'operation_type_id': [str(picking_id.picking_type_id.id),
-                                          picking_id.picking_type_id.name] if picking_id.picking_type_id else [],
-                    'operation_type': picking_id.operation_type if picking_id.operation_type else "",
-                    'restrict_scan_source_location': picking_id.picking_type_id.restrict_scan_source_location if 'restrict_scan_source_location' in picking_id.picking_type_id._fields else "",
-                    'restrict_scan_tracking_number': picking_id.picking_type_id.restrict_scan_tracking_number if 'restrict_scan_tracking_number' in picking_id.picking_type_id._fields else "",
-                    'priority': dict(picking_id._fields['priority'].selection).get(picking_id.priority),
-                    'company': picking_id.company_id.name,
-                    # NOTE: transferred to bista_wms_sales_extension
-                    # 'sale_id': picking_id.sale_id.id if picking_id.sale_id else 0,
-                    # NOTE: transfered to bista_wms_api_purchase_extension
-                    # 'purchase_id': picking_id.purchase_id.id if picking_id.purchase_id else 0,
-                    'state': dict(picking_id._fields['state'].selection).get(picking_id.state),
-                    'shipping_policy': picking_id.move_type,
-                    'create_uid': [str(picking_id.create_uid.id),
-                                   picking_id.create_uid.name] if picking_id.create_uid else [],
-                    'create_date': picking_id.create_date,
-                    'write_uid': [str(picking_id.write_uid.id),
-                                  picking_id.write_uid.name] if picking_id.write_uid else [],
-                    'write_date': picking_id.write_date,
-                })
-
-            for move_id in stock_picking_batch_obj.move_ids:
-                move.append({
-                    'id': move_id.id,
-                    'picking_id': move_id.picking_id.id,
-                    'product_id': move_id.product_id.id,
-                    'product': move_id.product_id.display_name,
-                    'product_packaging': [str(move_id.product_packaging_id.id),
-                                          move_id.product_packaging_id.name] if move_id.product_packaging_id else [],
-                    'product_code': move_id.product_id.default_code or "",
-                    'description_picking': move_id.description_picking or "",
-                    'product_uom_qty': move_id.product_uom_qty,
-                    'state': dict(move_id._fields['state'].selection).get(move_id.state),
-                })
-
-            for line_id in stock_picking_batch_obj.move_line_ids:
-                quant_line = []
+            if 'picking' in selection:
+                for picking_id in stock_picking_batch_obj.picking_ids:
+                    rfid = picking_id.rfid_tag.name if 'rfid_tag' in picking_id._fields else ""
+                    picking.append({
+                        'id': picking_id.id,
+                        'name': picking_id.name,
+                        'rfid_tag': rfid or "",
+                        'source_doc': picking_id.origin if picking_id.origin else "",
+                        'schedule_date': picking_id.scheduled_date or "",
+                        'deadline': picking_id.date_deadline or "",
+                        'done_date': picking_id.date_done or "",
+                        'partner_id': [str(picking_id.partner_id.id),
+                                       picking_id.partner_id.name] if picking_id.partner_id else [],
+                        'location_id': [str(picking_id.location_id.id),
+                                        picking_id.location_id.display_name] if picking_id.location_id else [],
+                        'location_dest_id': [str(picking_id.location_dest_id.id),
+                                             picking_id.location_dest_id.display_name] if picking_id.location_dest_id else [],
+                        'operation_type_id': [str(picking_id.picking_type_id.id),
+                                              picking_id.picking_type_id.name] if picking_id.picking_type_id else [],
+                        'operation_type': picking_id.operation_type if picking_id.operation_type else "",
+                        'restrict_scan_source_location': picking_id.picking_type_id.restrict_scan_source_location if 'restrict_scan_source_location' in picking_id.picking_type_id._fields else "",
+                        'restrict_scan_tracking_number': picking_id.picking_type_id.restrict_scan_tracking_number if 'restrict_scan_tracking_number' in picking_id.picking_type_id._fields else "",
+                        'priority': dict(picking_id._fields['priority'].selection).get(picking_id.priority),
+                        'company': picking_id.company_id.name,
+                        # NOTE: transferred to bista_wms_sales_extension
+                        # 'sale_id': picking_id.sale_id.id if picking_id.sale_id else 0,
+                        # NOTE: transfered to bista_wms_api_purchase_extension
+                        # 'purchase_id': picking_id.purchase_id.id if picking_id.purchase_id else 0,
+                        'state': dict(picking_id._fields['state'].selection).get(picking_id.state),
+                        'shipping_policy': picking_id.move_type,
+                        'create_uid': [str(picking_id.create_uid.id),
+                                       picking_id.create_uid.name] if picking_id.create_uid else [],
+                        'create_date': picking_id.create_date,
+                        'write_uid': [str(picking_id.write_uid.id),
+                                      picking_id.write_uid.name] if picking_id.write_uid else [],
+                        'write_date': picking_id.write_date,
+                    })
 
-                stock_quants = request.env['stock.quant'].search([
-                    ('product_id', '=', line_id.product_id.id), ('quantity', '>=', 0)
-                ])
-                product_stock_quant_ids = stock_quants.filtered(
-                    lambda q: q.company_id in request.env.companies and q.location_id.usage == 'internal'
-                )
+            if 'move' in selection:
+                for move_id in stock_picking_batch_obj.move_ids:
+                    move.append({
+                        'id': move_id.id,
+                        'picking_id': move_id.picking_id.id,
+                        'product_id': move_id.product_id.id,
+                        'product': move_id.product_id.display_name,
+                        'product_packaging': [str(move_id.product_packaging_id.id),
+                                              move_id.product_packaging_id.name] if move_id.product_packaging_id else [],
+                        'product_code': move_id.product_id.default_code or "",
+                        'description_picking': move_id.description_picking or "",
+                        'product_uom_qty': move_id.product_uom_qty,
+                        'state': dict(move_id._fields['state'].selection).get(move_id.state),
+                    })
 
-                for quant_id in product_stock_quant_ids:
-                    rfid = quant_id.lot_id.rfid_tag.name if 'rfid_tag' in quant_id.lot_id._fields else ""
-                    quant_line.append({
-                        'id': quant_id.id,
-                        'location': quant_id.location_id.complete_name,
-                        'lot_serial': quant_id.lot_id.name if quant_id.lot_id else "",
-                        'rfid_tag': rfid or "",
-                        'on_hand_quantity': quant_id.quantity,
+            if 'move_line' in selection:
+                for line_id in stock_picking_batch_obj.move_line_ids:
+                    quant_line = list(quants_data.get(line_id.product_id.id, []))
+                    move_line.append({
+                        'id': line_id.id,
+                        'picking_id': line_id.picking_id.id,
+                        'picking_name': line_id.picking_id.name,
+                        'product_id': line_id.product_id.id,
+                        'product': line_id.product_id.name,
+                        'lot_id': line_id.lot_id.name if line_id.lot_id else [],
+                        'product_packages': [str(line_id.result_package_id.id),
+                                             line_id.result_package_id.name] if line_id.result_package_id else [],
+                        'product_code': line_id.product_id.default_code or "",
+                        # 'product_uom_qty': line_id.reserved_uom_qty, #NOTE: reserved_uom_qty is not available in v17
+                        'product_uom_qty': line_id.move_id.product_uom_qty,
+                        # 'quantity_done': line_id.qty_done, # NOTE: qty_done is quantity in v17
+                        'quantity_done': line_id.quantity,
+                        'quant_ids': quant_line,
                     })
-                move_line.append({
-                    'id': line_id.id,
-                    'picking_id': line_id.picking_id.id,
-                    'picking_name': line_id.picking_id.name,
-                    'product_id': line_id.product_id.id,
-                    'product': line_id.product_id.name,
-                    'lot_id': line_id.lot_id.name if line_id.lot_id else [],
-                    'product_packages': [str(line_id.result_package_id.id),
-                                         line_id.result_package_id.name] if line_id.result_package_id else [],
-                    'product_code': line_id.product_id.default_code or "",
-                    # 'product_uom_qty': line_id.reserved_uom_qty, #NOTE: reserved_uom_qty is not available in v17
-                    'product_uom_qty': line_id.move_id.product_uom_qty,
-                    # 'quantity_done': line_id.qty_done, # NOTE: qty_done is quantity in v17
-                    'quantity_done': line_id.quantity,
-                    'quant_ids': quant_line,
-                })
 
             response_data.append({
                 'id': stock_picking_batch_obj.id,
@@ -1393,25 +1496,31 @@ class BistaWmsApi(http.Controller):
 
         stock_lot = request.env['stock.lot'].sudo().search(domain)
 
+        page = {}
         if 'barcode' in payload_data and payload_data.get('barcode'):
             stock_lot_objs = stock_lot.sudo().search([('name', '=', payload_data.get('barcode'))], limit=1)            
         else:
-            stock_lot_objs = stock_lot.sudo().search(domain)
+            stock_lot_objs, page = keyset_search(stock_lot.sudo(), domain, payload_data)
 
         if stock_lot_objs:
-            response_data = []
-            for lot in stock_lot_objs:         
-                response_data.append({
-                    'id': str(lot.id),
-                    'name': lot.name,
-                    'product_id': [str(lot.product_id.id), lot.product_id.name] if lot.product_id else [],
-                    'company_id': [str(lot.company_id.id), lot.company_id.name] if lot.company_id else [],
-                    'location_id': [str(lot.location_id.id), lot.location_id.name] if lot.location_id else [],
-                })
-            return {"status": True, 'data': response_data}
+            response_data = self._prepare_stock_lot_detail_data(stock_lot_objs)
+            return {"status": True, 'data': response_data, 'page': page}
         else:
             return {"status": False, 'code': "not_found", 'message': "No lot found"}
 
+    @staticmethod
+    def _prepare_stock_lot_detail_data(stock_lot_objs):
+        response_data = []
+        for lot in stock_lot_objs:
+            response_data.append({
+                'id': str(lot.id),
+                'name': lot.name,
+                'product_id': [str(lot.product_id.id), lot.product_id.name] if lot.product_id else [],
+                'company_id': [str(lot.company_id.id), lot.company_id.name] if lot.company_id else [],
+                'location_id': [str(lot.location_id.id), lot.location_id.name] if lot.location_id else [],
+            })
+        return response_data
+
 
     @validate_token
     @http.route("/api/get_stock_lot_detail", type="http", auth="none", methods=["GET"], csrf=False)
@@ -1429,7 +1538,7 @@ class BistaWmsApi(http.Controller):
             res = self.get_stock_lot_detail_response_data(self, domain, payload_data)
 
             if res.get('status'):
-                return valid_response(res.get('data'))
+                return valid_response(res.get('data'), **res.get('page', {}))
             else:
                 return invalid_response(res.get('code'), res.get('message'), 200)
         except Exception as e:
@@ -1448,7 +1557,7 @@ class BistaWmsApi(http.Controller):
     @staticmethod
     def get_putaway_rule_response_data(self, payload_data):
 
-        putaway_rules = request.env['stock.putaway.rule'].sudo().search([])
+        putaway_rules, page = keyset_search(request.env['stock.putaway.rule'].sudo(), [], payload_data)
 
         if putaway_rules:
             response_data = []
@@ -1482,12 +1591,14 @@ class BistaWmsApi(http.Controller):
                     'product_id': [str(rule.product_id.id), rule.product_id.name] if rule.product_id else [],
                     'storage_category_id': [str(rule.storage_category_id.id), rule.storage_category_id.name] if rule.storage_category_id else []
                 })
-            return {"status": True, 'data': response_data}
+            return {"status": True, 'data': response_data, 'page': page}
         else:
             return {"status": False, 'code': "not_found", 'message': "No lot found"}
 
     @validate_token
     @http.route("/api/get_putaway_rule", type="http", auth="none", methods=["GET"], csrf=False)
+    @etag_cache('stock.putaway.rule', 'stock.package.type', 'product.category', 'product.template', 'product.product',
+                'stock.location', 'stock.storage.category', 'res.company')
     def get_putaway_rule(self, **payload):
         """
             Gets putaway rules(stock.putaway.rule) of a lot from request and
@@ -1501,7 +1612,7 @@ class BistaWmsApi(http.Controller):
             res = self.get_putaway_rule_response_data(self, payload_data)
 
             if res.get('status'):
-                return valid_response(res.get('data'))
+                return valid_response(res.get('data'), **res.get('page', {}))
             else:
                 return invalid_response(res.get('code'), res.get('message'), 200)
         except Exception as e:
@@ -1513,24 +1624,28 @@ class BistaWmsApi(http.Controller):
     def get_location_detail_response_data(stock_location_objs):
 
         response_data = []
+        with_stock = 'current_stock' in requested_fields() and not wms_settings().restrict_stock_quants_in_location
+        # NOTE: the quants of all the locations and their children are searched once, a quant belongs to each
+        # location of its parent path.
+        current_stock_by_location = defaultdict(list)
+        if with_stock and stock_location_objs:
+            location_ids = set(stock_location_objs.ids)
+            for quant_id in request.env['stock.quant'].search([('location_id', 'child_of', stock_location_objs.ids)]):
+                quant_data = {
+                    'id': quant_id.id,
+                    'product_id': quant_id.product_id.id,
+                    'product': quant_id.product_id.name,
+                    'product_code': quant_id.product_id.default_code or "",
+                    'barcode': quant_id.product_id.barcode or "",
+                    'location': quant_id.location_id.complete_name,
+                    'lot_serial': quant_id.lot_id.name if quant_id.lot_id else "",
+                    'on_hand_quantity': quant_id.quantity,
+                }
+                for parent_id in quant_id.location_id.parent_path.split('/')[:-1]:
+                    if int(parent_id) in location_ids:
+                        current_stock_by_location[int(parent_id)].append(dict(quant_data))
         for location in stock_location_objs:
-            current_stock = []
-            if not ast.literal_eval(request.env['ir.config_parameter'].sudo().get_param('bista_wms_api.restrict_stock_quants_in_location', 'False')):
-                stock_quants = request.env['stock.quant'].search([
-                    ('location_id', 'child_of', location.id)
-                ])
-                if stock_quants:
-                    for quant_id in stock_quants:
-                        current_stock.append({
-                            'id': quant_id.id,
-                            'product_id': quant_id.product_id.id,
-                            'product': quant_id.product_id.name,
-                            'product_code': quant_id.product_id.default_code or "",
-                            'barcode': quant_id.product_id.barcode or "",
-                            'location': quant_id.location_id.complete_name,
-                            'lot_serial': quant_id.lot_id.name if quant_id.lot_id else "",
-                            'on_hand_quantity': quant_id.quantity,
-                        })
+            current_stock = current_stock_by_location[location.id]
             response_data.append({
                 'id': location.id,
                 'location_name': location.name,
@@ -1570,6 +1685,7 @@ class BistaWmsApi(http.Controller):
                 domain += filter_by_last_sync_time('stock.location', payload_data)
 
             stock_location = request.env['stock.location'].search(domain)
+            page = {}
 
             if 'barcode' in payload_data and payload_data['barcode']:
                 # get stock.location object search by barcode
@@ -1579,11 +1695,11 @@ class BistaWmsApi(http.Controller):
                 domain.append(('usage', 'in', ['internal']))
                 #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
                 # domain.append(('company_id', '=', request.env.user.company_id.id))
-                stock_location_objs = stock_location.sudo().search(domain)
+                stock_location_objs, page = keyset_search(stock_location.sudo(), domain, payload_data)
 
             if stock_location_objs:
                 response_data = self.get_location_detail_response_data(stock_location_objs)
-                return valid_response(response_data)
+                return valid_response(response_data, **page)
             else:
                 return invalid_response('not_found', 'No location found.')
         except Exception as e:
@@ -1750,6 +1866,31 @@ class BistaWmsApi(http.Controller):
     #     else:
     #         product_template_obj = request.env['product.template'].search([])
 
+    @staticmethod
+    def _iter_sync_barcode_data(self, payload_data, last_sequence=None):
+        """
+            Yields product, picking, batch/wave, location, package type, packaging, package and lot/serial
+            barcode and route from `bista.wms.barcode.index`, in one query ordered by sequence.
+            With `after_sequence` only the barcodes changed since then are yielded, removed ones included.
+        """
+        user_id, is_admin = self._get_user_stock_group(self)
+
+        # NOTE: We don't require barcode field from product.template model.
+        # `barcode` field from product.template model automatically propagated to product.product if variant count < 1.
+        # If variant count > 1, barcode field is hidden in product.template view.
+
+        # NOTE: pickings and batches are restricted to the allowed companies as their searches went through the
+        # record rules, users without the stock manager group only get their own ones and the locations and
+        # packages of their warehouse.
+        return request.env['bista.wms.barcode.index'].sudo()._iter_barcodes(
+            after_sequence=int(payload_data.get('after_sequence') or 0),
+            last_sequence=last_sequence,
+            since=get_last_sync_time(payload_data),
+            user_id=user_id.id if is_admin == 0 else None,
+            warehouse_id=user_id.warehouse_id.id or None,
+            company_ids=request.env.companies.ids,
+        )
+
     @validate_token
     @http.route("/api/sync_barcode_data", type="http", auth="none", methods=["GET"], csrf=False)
     def sync_barcode_data(self, **payload):
@@ -1759,156 +1900,19 @@ class BistaWmsApi(http.Controller):
 
         _logger.info("/api/sync_barcode_data GET payload: %s", payload)
         try:
-            response_data = []
-            user_id, is_admin = self._get_user_stock_group(self)
-            warehouse_id = user_id.warehouse_id
-
-            # NOTE: We don't require barcode field from product.template model.
-            # `barcode` field from product.template model automatically propagated to product.product if variant count < 1.
-            # If variant count > 1, barcode field is hidden in product.template view.
-
-            # Product Variant (product.product) barcode
-
             payload_data = payload
-            product_product_domain = []
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                product_product_domain += filter_by_last_sync_time('product.product', payload_data)
-
-            # product_product_objs = request.env['product.product'].search(
-                # [('active', '=', True), ('barcode', '!=', False)])
-            product_product_domain += [('active', '=', True), ('barcode', '!=', False)]
-            product_product_objs = request.env['product.product'].sudo().search(product_product_domain)
-
-            if product_product_objs:
-                for product in product_product_objs:
-                    response_data.append({
-                        "barcode": product.barcode,
-                        "route": "product"
-                    })
-
-            # Transfer (stock.picking) barcode
-            #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-            # stock_picking_domain = [('state', '=', 'assigned'), ('company_id', '=', request.env.user.company_id.id)]
-            stock_picking_domain = [('state', '=', 'assigned')]
-            if is_admin == 0:
-                stock_picking_domain = stock_picking_domain + [('user_id', '=', user_id.id)]
-
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                stock_picking_domain += filter_by_last_sync_time('stock.picking', payload_data)
-            
-            stock_picking_objs = request.env['stock.picking'].search(stock_picking_domain)
-            if stock_picking_objs:
-                for picking in stock_picking_objs:
-                    response_data.append({
-                        "barcode": picking.name,
-                        "route": "picking"
-                    })
-
-            # Batch Transfer (stock.picking.batch) barcode
-            #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-            # stock_picking_batch_domain = [('state', '=', 'in_progress'),
-            #                               ('company_id', '=', request.env.user.company_id.id)]
-            stock_picking_batch_domain = [('state', '=', 'in_progress')]
-            if is_admin == 0:
-                stock_picking_batch_domain = stock_picking_batch_domain + [('user_id', '=', user_id.id)]
-            
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                stock_picking_batch_domain += filter_by_last_sync_time('stock.picking.batch', payload_data)
-            
-            stock_picking_batch_objs = request.env['stock.picking.batch'].search(stock_picking_batch_domain)
-            if stock_picking_batch_objs:
-                for batch in stock_picking_batch_objs:
-                    response_data.append({
-                        "barcode": batch.name,
-                        "route": "batch_wave"
-                    })
-
-            # Location (stock.location) barcode
-            #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-            # stock_location_objs = request.env['stock.location'].sudo().search(
-            #     [('usage', 'in', ['internal']), ('barcode', '!=', False),
-            #      ('company_id', '=', request.env.user.company_id.id)])
-
-            stock_location_domain = []
-            if is_admin == 0:
-                stock_location_domain += self._prepare_inventory_warehouse_domain([('warehouse_id', '=', warehouse_id.id)])
-
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                stock_location_domain += filter_by_last_sync_time('stock.location', payload_data)
-            stock_location_domain += [('usage', 'in', ['internal']), ('barcode', '!=', False)]
-
-            stock_location_objs = request.env['stock.location'].sudo().search(stock_location_domain)
-            if stock_location_objs:
-                for location in stock_location_objs:
-                    response_data.append({
-                        "barcode": location.barcode,
-                        "route": "location"
-                    })
-
-            # Stock package type (stock.package.type) barcode 
-            stock_package_type_domain = []
-
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                stock_package_type_domain += filter_by_last_sync_time('stock.package.type', payload_data)
-            
-            product_package_type_objs = request.env['stock.package.type'].sudo().search(stock_package_type_domain)
-            if product_package_type_objs:
-                for package_type in product_package_type_objs:
-                    if package_type.barcode:
-                        response_data.append({
-                            "barcode": package_type.barcode,
-                            "route": "product_package_type"
-                        })
-
-            # Product packaging (product.packaging) barcode
-            product_packaging_domain = []
-
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                product_packaging_domain += filter_by_last_sync_time('product.packaging', payload_data)
-            
-            product_packaging_objs = request.env['product.packaging'].sudo().search(product_packaging_domain)
-            if product_packaging_objs:
-                for packaging in product_packaging_objs:
-                    if packaging.barcode:
-                        response_data.append({
-                            "barcode": packaging.barcode,
-                            "route": "product_packaging"
-                        })
-
-            # Product packages (stock.quant.package) barcode
-            product_packages_domain = [('location_id.usage', '!=', 'customer')]
-            if is_admin == 0:
-                product_packages_domain = product_packages_domain + \
-                                          [('location_id.warehouse_id', '=', warehouse_id.id)]
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                product_packages_domain += filter_by_last_sync_time('stock.quant.package', payload_data)
-            
-            product_packages_objs = request.env['stock.quant.package'].sudo().search(
-                product_packages_domain)
-            if product_packages_objs:
-                for package in product_packages_objs:
-                    if package.name:
-                        response_data.append({
-                            "barcode": package.name,
-                            "route": "product_packages"
-                        })
-
-            # Lot/Serial (stock.lot) barcode
-            stock_lot_domain = []
-            if 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
-                stock_lot_domain += filter_by_last_sync_time('stock.lot', payload_data)
-            
-            stock_lot_objs = request.env['stock.lot'].sudo().search(stock_lot_domain)
-            if stock_lot_objs:
-                for lot_id in stock_lot_objs:
-                    if lot_id.name:
-                        response_data.append({
-                            "barcode": lot_id.name,
-                            "route": "lot_serial"
-                        })
-
+            # `last_sequence` is the index watermark, the next delta sync starts after it.
+            last_sequence = request.env['bista.wms.barcode.index'].sudo()._get_last_sequence()
+            barcode_data = self._iter_sync_barcode_data(self, payload_data, last_sequence)
+            if is_stream_requested(payload_data):
+                first_record = next(barcode_data, None)
+                if first_record is None:
+                    return invalid_response('not_found', 'No Data Found.')
+                return stream_response(itertools.chain([first_record], barcode_data), last_sequence=last_sequence)
+
+            response_data = list(barcode_data)
             if response_data:
-                return valid_response(response_data)
+                return valid_response(response_data, last_sequence=last_sequence)
             else:
                 return invalid_response('not_found', 'No Data Found.')
 
@@ -1917,6 +1921,102 @@ class BistaWmsApi(http.Controller):
             error_msg = 'Error while syncing barcode data.'
             return invalid_response('bad_request', error_msg, 200)
 
+    @validate_token
+    @http.route("/api/change_journal", type="http", auth="none", methods=["GET"], csrf=False)
+    def change_journal(self, **payload):
+        """
+            Streams the changes (deletions and archiving included) recorded after `after_sequence`.
+            `last_sequence` is the journal watermark, clients keep paging until they reach it.
+        """
+        _logger.info("/api/change_journal GET payload: %s", payload)
+        try:
+            payload_data = payload
+            journal = request.env['bista.wms.change.journal'].sudo()
+            after_sequence = int(payload_data.get('after_sequence') or 0)
+            limit = int(payload_data.get('limit') or 10000)
+            model_names = [name.strip() for name in (payload_data.get('models') or '').split(',') if name.strip()]
+            last_sequence = journal._get_last_sequence()
+            changes = journal._iter_changes(
+                after_sequence, last_sequence, limit, request.env.companies.ids, model_names)
+            return stream_response(
+                changes, last_sequence=last_sequence,
+                resync_required=after_sequence < journal._get_purged_sequence())
+        except Exception as e:
+            _logger.exception("Error while getting change journal")
+            error_msg = 'Error while getting change journal.'
+            return invalid_response('bad_request', error_msg, 200)
+
+    @staticmethod
+    def _iter_bootstrap_data(self):
+        """
+            Yields the `/api/bootstrap` document: a `header` line with the watermarks, a line per record typed
+            `config`, `barcode`, `product`, `location`, `lot`, `package` or `partner`, then a `footer` line
+            with the number of records of each type.
+        """
+        user_id, is_admin = self._get_user_stock_group(self)
+        warehouse_id = user_id.warehouse_id
+        # NOTE: the watermarks are read first, in the snapshot of the transaction the records are read from,
+        # so a delta sync starting after them gets every change the document misses.
+        journal_sequence = request.env['bista.wms.change.journal'].sudo()._get_last_sequence()
+        barcode_sequence = request.env['bista.wms.barcode.index'].sudo()._get_last_sequence()
+        yield {
+            'type': 'header',
+            'version': BOOTSTRAP_VERSION,
+            'generated_at': fields.Datetime.now(),
+            'user_id': user_id.id,
+            'warehouse_id': warehouse_id.id or False,
+            'company_ids': request.env.companies.ids,
+            'last_sequence': journal_sequence,
+            'barcode_last_sequence': barcode_sequence,
+        }
+
+        warehouse_domain = [('warehouse_id', '=', warehouse_id.id)] if is_admin == 0 else []
+        sections = []
+        config_data = self._get_wms_config_data(
+            self, {'warehouse_id': warehouse_id.id} if warehouse_id else {})
+        sections.append(('config', config_data if isinstance(config_data, list) else []))
+        sections.append(('barcode', self._iter_sync_barcode_data(self, {}, barcode_sequence)))
+        sections.append(('product', iter_by_batch(
+            request.env['product.template'].search([('type', 'in', ['consu', 'product'])]),
+            lambda batch: self._prepare_product_detail_data(self, batch))))
+        sections.append(('location', iter_by_batch(
+            request.env['stock.location'].sudo().search([('usage', '=', 'internal')] + warehouse_domain),
+            self.get_location_detail_response_data)))
+        sections.append(('lot', iter_by_batch(
+            request.env['stock.lot'].sudo().search([]), self._prepare_stock_lot_detail_data)))
+        if request.env.user.has_group('stock.group_tracking_lot'):
+            package_domain = [('location_id.warehouse_id', '=', warehouse_id.id)] if is_admin == 0 else []
+            sections.append(('package', iter_by_batch(
+                request.env['stock.quant.package'].sudo().search(package_domain),
+                lambda batch: self._get_product_packages(self, batch))))
+        sections.append(('partner', iter_by_batch(
+            request.env['res.partner'].sudo().search([]),
+            lambda batch: self._get_res_partner(self, batch, {}, []))))
+
+        counts = {}
+        for record_type, records in sections:
+            counts[record_type] = 0
+            for record in records:
+                counts[record_type] += 1
+                yield {'type': record_type, 'data': record}
+        yield {'type': 'footer', 'counts': counts}
+
+    @validate_token
+    @http.route("/api/bootstrap", type="http", auth="none", methods=["GET"], csrf=False)
+    def bootstrap(self, **payload):
+        """
+            Streams, in one NDJSON document, the master data a new device needs for the warehouse of the user.
+            The next delta syncs start after `last_sequence` (`/api/change_journal`) and
+            `barcode_last_sequence` (`/api/sync_barcode_data`) of the header line.
+        """
+        _logger.info("/api/bootstrap GET payload: %s", payload)
+        try:
+            return ndjson_response(self._iter_bootstrap_data(self))
+        except Exception as e:
+            _logger.exception("Error while getting bootstrap data")
+            error_msg = 'Error while getting bootstrap data.'
+            return invalid_response('bad_request', error_msg, 200)
+
     @staticmethod
     def _get_product_package_type(self, payload_data):
 
@@ -1994,6 +2094,8 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/get_product_package_type", type="http", auth="none", methods=["GET"], csrf=False)
+    @etag_cache('stock.package.type', 'stock.storage.category.capacity', 'stock.storage.category',
+                'product.template', 'product.product', 'uom.uom', 'res.company')
     def get_product_package_type(self, **payload):
         """
             Returns product_package_type info.
@@ -2023,11 +2125,21 @@ class BistaWmsApi(http.Controller):
         response_data = []
         stock_picking = request.env['stock.picking']
         if stock_quant_package_objs:
+            # NOTE: the transfers of `action_view_picking` (the ones of the move lines from or into the
+            # package), searched once for all the packages.
+            picking_ids_by_package = defaultdict(set)
+            for move_line in request.env['stock.move.line'].search([
+                '|', ('result_package_id', 'in', stock_quant_package_objs.ids),
+                ('package_id', 'in', stock_quant_package_objs.ids)
+            ]):
+                for line_package in move_line.result_package_id | move_line.package_id:
+                    if move_line.picking_id:
+                        picking_ids_by_package[line_package.id].add(move_line.picking_id.id)
+            stock_picking.sudo().browse(set().union(*picking_ids_by_package.values())).fetch(['name'])
             for package in stock_quant_package_objs:
                 package_content = []
                 stock_picking_data = []
-                transfer_values = package.action_view_picking()
-                stock_picking_objs = stock_picking.sudo().search(transfer_values['domain'], order='id')
+                stock_picking_objs = stock_picking.sudo().browse(sorted(picking_ids_by_package[package.id]))
                 for stock_picking in stock_picking_objs:
                     stock_picking_data.append(
                         {
@@ -2272,6 +2384,8 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/get_packaging_type_detail", type="http", auth="none", methods=["GET"], csrf=False)
+    @etag_cache('product.packaging', 'stock.package.type', 'product.template', 'product.product', 'uom.uom',
+                'stock.route', 'res.company')
     def get_packaging_type_detail(self, **payload):
         """
             Gets name or barcode from the request and return packaging type information.
@@ -2298,14 +2412,12 @@ class BistaWmsApi(http.Controller):
             return invalid_response('bad_request', error_msg, 200)
 
     @staticmethod
-    def _get_stock_quants(self, payload_data):
-        
-        """  
-            Get stock quants data according to different domain value
+    def _search_stock_quants(self, payload_data):
+        """
+            Search stock quants according to different domain value.
+            Returns the quants and the pagination envelope entry.
         """
-        response_data = []
         stock_quant_domain = []
-        stock_quant_objs = False
         stock_quant = request.env['stock.quant']
         user_id, is_admin = self._get_user_stock_group(self)
         warehouse_id = user_id.warehouse_id
@@ -2365,46 +2477,56 @@ class BistaWmsApi(http.Controller):
                 # stock_quant_domain = stock_quant_domain + \
                 #     [('warehouse_id', '=', warehouse_id.id)]
                 stock_quant_domain += self._prepare_inventory_warehouse_domain([('warehouse_id', '=', warehouse_id.id)])
-            stock_quant_objs = stock_quant.sudo().search(
-                stock_quant_domain, order="location_id")
         else:
             if is_admin == 0:
                 # NOTE: shifted warehouse domain in _prepare_inventory_warehouse_domain function to inherit and modify
                 # stock_quant_domain = stock_quant_domain + \
                 #     [('warehouse_id', '=', warehouse_id.id)]
                 stock_quant_domain += self._prepare_inventory_warehouse_domain([('warehouse_id', '=', warehouse_id.id)])
-            stock_quant_objs = stock_quant.sudo().search(
-                stock_quant_domain, order="location_id")
+        # NOTE: pages are ordered by id, the location ordering can't be used as a stable pagination key.
+        return keyset_search(stock_quant.sudo(), stock_quant_domain, payload_data, order="location_id")
+
+    @staticmethod
+    def _prepare_stock_quants_data(self, stock_quant_objs):
+        response_data = []
+        for quant_id in stock_quant_objs:
+            response_data.append({
+                'id': quant_id.id,
+                'location_barcode': quant_id.location_id.barcode or "",
+                'location_adjustment': quant_id.location_id.location_adjustment,
+                'product_id': [str(quant_id.product_id.id),
+                               quant_id.product_id.display_name] if quant_id.product_id else [],
+                'lot_id': [str(quant_id.lot_id.id),
+                           quant_id.lot_id.name] if quant_id.lot_id else [],
+                'package_id': [str(quant_id.package_id.id),
+                               quant_id.package_id.name] if quant_id.package_id else [],
+                'owner_id': [str(quant_id.owner_id.id),
+                             quant_id.owner_id.name] if quant_id.owner_id else [],
+                'location_id': [str(quant_id.location_id.id),
+                                quant_id.location_id.display_name] if quant_id.location_id else [],
+                'quantity': quant_id.quantity,
+                'available_quantity': quant_id.available_quantity,
+                'reserved_quantity': quant_id.reserved_quantity,
+                'product_uom_id': [str(quant_id.product_uom_id.id),
+                                   quant_id.product_uom_id.name] if quant_id.product_uom_id else [],
+                'inventory_quantity': quant_id.inventory_quantity,
+                'inventory_diff_quantity': quant_id.inventory_diff_quantity,
+                'inventory_date': quant_id.inventory_date,
+                'user_id': [str(quant_id.user_id.id),
+                            quant_id.user_id.name] if quant_id.user_id else [],
+                'company_id':[str(quant_id.company_id.id),
+                            quant_id.company_id.name] if quant_id.company_id else [],
+            })
+        return response_data
+
+    @staticmethod
+    def _get_stock_quants(self, payload_data):
+        """  
+            Get stock quants data according to different domain value
+        """
+        stock_quant_objs, page = self._search_stock_quants(self, payload_data)
         if stock_quant_objs:
-            for quant_id in stock_quant_objs:
-                response_data.append({
-                    'id': quant_id.id,
-                    'location_barcode': quant_id.location_id.barcode or "",
-                    'location_adjustment': quant_id.location_id.location_adjustment,
-                    'product_id': [str(quant_id.product_id.id),
-                                   quant_id.product_id.display_name] if quant_id.product_id else [],
-                    'lot_id': [str(quant_id.lot_id.id),
-                               quant_id.lot_id.name] if quant_id.lot_id else [],
-                    'package_id': [str(quant_id.package_id.id),
-                                   quant_id.package_id.name] if quant_id.package_id else [],
-                    'owner_id': [str(quant_id.owner_id.id),
-                                 quant_id.owner_id.name] if quant_id.owner_id else [],
-                    'location_id': [str(quant_id.location_id.id),
-                                    quant_id.location_id.display_name] if quant_id.location_id else [],
-                    'quantity': quant_id.quantity,
-                    'available_quantity': quant_id.available_quantity,
-                    'reserved_quantity': quant_id.reserved_quantity,
-                    'product_uom_id': [str(quant_id.product_uom_id.id),
-                                       quant_id.product_uom_id.name] if quant_id.product_uom_id else [],
-                    'inventory_quantity': quant_id.inventory_quantity,
-                    'inventory_diff_quantity': quant_id.inventory_diff_quantity,
-                    'inventory_date': quant_id.inventory_date,
-                    'user_id': [str(quant_id.user_id.id),
-                                quant_id.user_id.name] if quant_id.user_id else [],
-                    'company_id':[str(quant_id.company_id.id),
-                                quant_id.company_id.name] if quant_id.company_id else [],
-                })
-            return response_data
+            return self._prepare_stock_quants_data(self, stock_quant_objs)
         else:
             return {"status": False, "response": 'not_found', "message": 'No stock quant data found.'}
 
@@ -2417,6 +2539,14 @@ class BistaWmsApi(http.Controller):
         _logger.info("/api/get_stock_quants GET payload: %s", payload)
         try:
             payload_data = payload
+            if is_stream_requested(payload_data) or payload_data.get('limit') or payload_data.get('after'):
+                stock_quant_objs, page = self._search_stock_quants(self, payload_data)
+                if not stock_quant_objs:
+                    return invalid_response('not_found', 'No stock quant data found.')
+                if not is_stream_requested(payload_data):
+                    return valid_response(self._prepare_stock_quants_data(self, stock_quant_objs), **page)
+                return stream_response(iter_by_batch(
+                    stock_quant_objs, lambda quants: self._prepare_stock_quants_data(self, quants)), **page)
             response_data = self._get_stock_quants(self, payload_data)
             if isinstance(response_data, list):
                 return valid_response(response_data)
@@ -2472,6 +2602,7 @@ class BistaWmsApi(http.Controller):
             response_data = []
             partner_domain = []
             partner_objs = False
+            page = {}
             partner = request.env['res.partner']
             user_id, is_admin = self._get_user_stock_group(self)
             if 'partner_id' in payload_data:
@@ -2480,12 +2611,12 @@ class BistaWmsApi(http.Controller):
                     partner_objs = partner.sudo().search(partner_domain, limit=1)
             elif 'last_sync_time' in payload_data and payload_data['last_sync_time'] or 'last_sync_timestamp' in payload_data  and payload_data['last_sync_timestamp']:
                 partner_domain += filter_by_last_sync_time('res.partner', payload_data)
-                partner_objs = partner.sudo().search(partner_domain)
+                partner_objs, page = keyset_search(partner.sudo(), partner_domain, payload_data)
             else:
-                partner_objs = partner.sudo().search(partner_domain)
+                partner_objs, page = keyset_search(partner.sudo(), partner_domain, payload_data)
             response_data = self._get_res_partner(self, partner_objs, payload_data, partner_domain)
             if isinstance(response_data, list):
-                return valid_response(response_data)
+                return valid_response(response_data, **page)
             elif isinstance(response_data, dict):
                 return invalid_response(response_data['response'], response_data['message'])
         except Exception as e:
@@ -2546,6 +2677,7 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/get_wms_config_settings", type="http", auth="none", methods=["GET"], csrf=False)
+    @etag_cache('bista.wms.config.settings', 'ir.config_parameter', 'stock.warehouse', 'res.company')
     def get_wms_config_settings(self, **payload):
         """
             Returns configuration settings for users.
@@ -2591,6 +2723,7 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/get_wms_settings", type="http", auth="none", methods=["GET"], csrf=False)
+    @etag_cache('res.company')
     def get_wms_settings(self, **payload):
         """
             Returns  settings data for users.
@@ -2664,8 +2797,9 @@ class BistaWmsApi(http.Controller):
         def_search_limit = None
         def_search_limit = payload_data.get('limit')
         if not def_search_limit:
-            if request.env['ir.config_parameter'].sudo().get_param('bista_wms_api.enable_search_limit'):
-                def_search_limit = request.env['ir.config_parameter'].sudo().get_param('bista_wms_api.def_search_limit')
+            settings = wms_settings()
+            if settings.enable_search_limit:
+                def_search_limit = settings.def_search_limit
 
         if payload_data.get('value') and payload_data.get('type') :
             type_model_arr = self._type_model_struct()
@@ -2731,6 +2865,63 @@ class BistaWmsApi(http.Controller):
         """ Update stock_picking_obj with picking attributes in post_picking_validate"""        
         return True
 
+    @staticmethod
+    def _get_picking_data_index(self, stock_picking_obj, move_line_ids):
+        """
+        Load once what `_prepare_picking_data` matches the posted move lines with: the move lines and moves
+        of the picking by product, the posted lots by (name, product) and id and the products of new lines.
+        `consumed` holds the ids of the move lines already taken by a posted line.
+        """
+        product_ids = {int(line['product_id']) for line in move_line_ids if line.get('product_id')}
+        lot_names = {str(line['lot_id']) for line in move_line_ids if line.get('lot_id')}
+        lot_ids = {int(line['stock_lot_id']) for line in move_line_ids if line.get('stock_lot_id')}
+
+        index = {
+            'lines': defaultdict(list),
+            'moves': defaultdict(lambda: request.env['stock.move'].sudo()),
+            'lots_by_name': {},
+            'lots_by_id': {},
+            'products': {},
+            'consumed': {int(line['id']) for line in move_line_ids if line.get('id')},
+        }
+        for line in request.env['stock.move.line'].search([('picking_id', '=', stock_picking_obj.id)]):
+            index['lines'][line.product_id.id].append(line)
+        for move in request.env['stock.move'].sudo().search([('picking_id', '=', stock_picking_obj.id)]):
+            index['moves'][move.product_id.id] |= move
+        if lot_names or lot_ids:
+            for lot in request.env['stock.lot'].sudo().search([
+                ('product_id', 'in', list(product_ids)),
+                '|', ('name', 'in', list(lot_names)), ('id', 'in', list(lot_ids)),
+            ]):
+                index['lots_by_name'].setdefault((lot.name, lot.product_id.id), lot)
+                index['lots_by_id'][lot.id] = lot
+        for product in request.env['product.product'].sudo().search(
+                [('id', 'in', list(product_ids)), ('company_id', '=', stock_picking_obj.company_id.id)]):
+            index['products'][product.id] = product
+        return index
+
+    @staticmethod
+    def _match_picking_move_line(self, index, move_line):
+        """First move line of the picking not consumed yet with the quantity, product and lot of `move_line`."""
+        quantity = move_line.get('quantity_done')
+        if quantity is None or quantity is False:
+            return None
+        product_id = int(move_line.get('product_id') or 0)
+        lines = index['lines'][product_id]
+        if move_line.get('lot_id') or move_line.get('stock_lot_id'):
+            if move_line.get('lot_id'):
+                lot = index['lots_by_name'].get((str(move_line['lot_id']), product_id))
+            else:
+                lot = index['lots_by_id'].get(int(move_line['stock_lot_id']))
+                lot = lot if lot and lot.product_id.id == product_id else None
+            lot_id = lot.id if lot else False
+            lines = [line for line in lines if line.lot_id.id == lot_id]
+        for line in lines:
+            if line.id not in index['consumed'] and float_compare(
+                    line.quantity, float(quantity), precision_rounding=line.product_uom_id.rounding) == 0:
+                return line
+        return None
+
     @staticmethod
     def _prepare_picking_data(self, stock_picking_obj, move_line_ids, line_pack_dict):
 
@@ -2739,48 +2930,19 @@ class BistaWmsApi(http.Controller):
         stock_prod_lot = request.env['stock.lot']
         pack_obj_list = []
 
-        created_move_line_ids = []
-        for move_line in move_line_ids:
-            if move_line.get('id'):
-                created_move_line_ids.append(move_line['id'])
+        # NOTE: lines are matched in memory, with a constant number of queries whatever the number of lines.
+        index = self._get_picking_data_index(self, stock_picking_obj, move_line_ids)
+        app_changes = AppChangeRecorder(stock_picking_obj)
         for move_line in move_line_ids:
             lot_id = False
             lot_name = False
             package_id = False
             # if not request.env.context.get('skip_line_matching'):
             if not move_line.get('id') and not move_line.get('skip_line_matching'):
-                if not move_line.get('id'):  # if no move line id passes
-                    #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-                    # line_domain = [
-                    #     ('picking_id', '=', stock_picking_obj.id),
-                    #     ('id','not in',created_move_line_ids),
-
-                    #     # comented form odoo 16
-                    #     # ('reserved_uom_qty', '=', move_line.get('quantity_done')),
-                    #     ('quantity', '=', move_line.get('quantity_done')),
-                    #     ('product_id', '=', move_line.get('product_id')),
-                    #     ('company_id', '=', request.env.user.company_id.id)
-                    # ]
-                    line_domain = [
-                        ('picking_id', '=', stock_picking_obj.id),
-                        ('id','not in',created_move_line_ids),
-
-                        # comented form odoo 16
-                        # ('reserved_uom_qty', '=', move_line.get('quantity_done')),
-                        ('quantity', '=', move_line.get('quantity_done')),
-                        ('product_id', '=', move_line.get('product_id')),
-                    ]
-                    if move_line.get('lot_id') or move_line.get('stock_lot_id'):
-                        lot_domain = [('product_id', '=', move_line.get('product_id'))]
-                        if move_line.get('lot_id'):
-                            lot_domain.insert(0, ('name', '=', move_line.get('lot_id')))
-                        elif move_line.get('stock_lot_id'):
-                            lot_domain.insert(0, ('id', '=', move_line.get('stock_lot_id')))
-                        line_domain.append(
-                            ('lot_id', '=', stock_prod_lot.search(lot_domain, limit=1).id))
-                    line_id = request.env['stock.move.line'].search(line_domain, limit=1)
-                    if line_id:
-                        move_line['id'] = line_id.id
+                line_id = self._match_picking_move_line(self, index, move_line)
+                if line_id:
+                    index['consumed'].add(line_id.id)
+                    move_line['id'] = line_id.id
             if move_line.get('skip_line_matching'):
                 move_line.pop('skip_line_matching')
                 
@@ -2795,10 +2957,8 @@ class BistaWmsApi(http.Controller):
                 #     ('product_id', '=', move_line.get('product_id')),
                 #     ('company_id', '=', request.env.user.company_id.id)
                 # ], limit=1)
-                lot_detail = stock_prod_lot.sudo().search([
-                    ('name', '=', move_line.get('lot_id')),
-                    ('product_id', '=', move_line.get('product_id')),
-                ], limit=1)
+                lot_key = (move_line.get('lot_id'), int(move_line.get('product_id') or 0))
+                lot_detail = index['lots_by_name'].get(lot_key)
 
                 if not lot_detail:
                     lot_detail = stock_prod_lot.create({
@@ -2806,6 +2966,7 @@ class BistaWmsApi(http.Controller):
                         'product_id': move_line.get('product_id'),
                         'company_id': stock_picking_obj.company_id.id,
                     })
+                    index['lots_by_name'][lot_key] = lot_detail
 
                 if stock_picking_obj.picking_type_id.code in ['outgoing', 'internal']:
                     # for Delivery Orders and Internal transfer
@@ -2846,11 +3007,9 @@ class BistaWmsApi(http.Controller):
 
                 # ............Suprodip Sarkar................#
                 prev_move_line_obj = move_line_obj._origin
-                obj = app_changed_create_write(stock_picking_obj, move_line_obj, new_vals, prev_move_line_obj)
+                app_changes.record(move_line_obj, new_vals, prev_move_line_obj)
                 move_line_obj.with_context(skip_custom_write=True).write(new_vals)
                 # move_line_obj.write(new_vals)
-                if obj:
-                    stock_picking_obj.app_change_ids = [(4, obj.id)]
                 # ............Suprodip Sarkar................#
 
                 if len(move_line.get('product_package', "")) > 0:
@@ -2862,12 +3021,10 @@ class BistaWmsApi(http.Controller):
 
             else:  # if move.line id does not exist, create new record.
                 move_line_product = False
-                move_obj = stock_move.sudo().search([
-                    ('picking_id', '=', stock_picking_obj.id),
-                    ('product_id', '=', move_line.get('product_id'))])
+                move_obj = index['moves'][int(move_line.get('product_id') or 0)]
                 if not move_obj:
-                    move_line_product = request.env['product.product'].sudo().search(
-                        [('id', '=', move_line.get('product_id')), ('company_id', '=', stock_picking_obj.company_id.id)])
+                    move_line_product = index['products'].get(
+                        int(move_line.get('product_id') or 0), request.env['product.product'].sudo())
 
                 if isinstance(move_line.get('product_packages_id'), int):
                     if not move_line.get('product_package'):
@@ -2895,14 +3052,18 @@ class BistaWmsApi(http.Controller):
 
                 # ............Suprodip Sarkar................#
                 line_obj = stock_move_line.create(new_vals)
+                index['consumed'].add(line_obj.id)
+                if line_obj.move_id:
+                    index['moves'][line_obj.product_id.id] |= line_obj.move_id
                 # if line_obj and line_obj.move_id.product_uom_qty == 0:
                 #     line_obj.move_id.write({'product_uom_qty':1})
-                app_changed_create_write(stock_picking_obj, line_obj, new_vals)
+                app_changes.record(line_obj, new_vals)
                 # ............Suprodip Sarkar................#
                 
                 if len(move_line.get('product_package', "")) > 0:
                     line_pack_dict[move_line.get('product_package')].append(line_obj.id)
 
+        app_changes.flush()
         if line_pack_dict:
             for pack, move_line_ids in line_pack_dict.items():
                 if move_line_ids:
@@ -3141,6 +3302,7 @@ class BistaWmsApi(http.Controller):
         
     @validate_token
     @http.route("/api/post_picking_validate", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def post_picking_validate(self, **payload):
         _logger.info("/api/post_picking_validate payload: %s", payload)
 
@@ -3175,19 +3337,67 @@ class BistaWmsApi(http.Controller):
                 raise Exception(error_msg)
             return invalid_response('bad_request', error_msg, 200)
 
+    @staticmethod
+    def _batch_post_picking_validate_item(self, data):
+        """
+        Validate one picking of a batch upload in its own savepoint, a picking failing on a business or
+        validation error is rolled back alone, a concurrency error aborts the upload.
+        Returns the result of the picking with its `status`, error `code` and `duration_ms`.
+        """
+        start = _time.perf_counter()
+        try:
+            with request.env.cr.savepoint():
+                res = self.post_picking_validate_response_data(self, data)
+                if res.get('code'):
+                    # Roll back what was written before the error was detected.
+                    raise _PickingValidateError(res)
+            res.update(status=True, code="")
+        except _PickingValidateError as e:
+            res = dict(e.res, status=False)
+        except CONCURRENCY_ERRORS:
+            # NOTE: the snapshot of the transaction is stale, the whole upload is rolled back and retried.
+            raise
+        except Exception as e:
+            _logger.exception("Error while validating picking of batch for data: %s", data)
+            if isinstance(e, AccessError):
+                code = 'access_denied'
+            elif isinstance(e, (UserError, ValidationError)):
+                code = 'user_error'
+            else:
+                code = 'bad_request'
+            res = {'status': False, 'code': code, 'picking_id': data.get('picking_id'), "batch_validate": True,
+                   'message': _serialize_exception(e).get('message') or 'Error while Validating Picking.'}
+        res['duration_ms'] = round((_time.perf_counter() - start) * 1000, 1)
+        return res
+
     @validate_token
     @http.route("/api/batch_post_picking_validate", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def batch_post_picking_validate(self, **payload):
         _logger.info("/api/batch_post_picking_validate payload: %s", payload)
 
         try:
+            if is_async_requested():
+                return enqueue_job_response()
             # convert the bytes format to `list of dict` format
             req_data = json.loads(request.httprequest.data.decode())
-            batch_res = []
-            for data in req_data['data']:
+            items = req_data['data']
+            # NOTE: the pickings are locked and validated by id, so concurrent uploads sharing pickings
+            # wait for each other instead of deadlocking.
+            picking_ids = sorted({int(data['picking_id']) for data in items if data.get('picking_id')})
+            if picking_ids:
+                request.env.cr.execute(
+                    "SELECT id FROM stock_picking WHERE id = ANY(%s) ORDER BY id FOR UPDATE", [picking_ids])
+            batch_res = [None] * len(items)
+            order = sorted(range(len(items)), key=lambda i: int(items[i].get('picking_id') or 0))
+            for done, index in enumerate(order, 1):
+                data = items[index]
                 data['batch_validate'] = True
-                batch_res.append(self.post_picking_validate(**data))
+                batch_res[index] = self._batch_post_picking_validate_item(self, data)
+                report_job_progress(done, len(items))
             return valid_response(batch_res)
+        except CONCURRENCY_ERRORS:
+            raise
         except Exception as e:
             _logger.exception("Error while validating batch picking for payload: %s", payload)
             err = _serialize_exception(e)
@@ -3201,12 +3411,14 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/user_detail", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def post_user_detail(self, **payload):
         _logger.info("/api/user_detail POST payload: %s", payload)
 
         try:
             access_token = request.httprequest.headers.get("access-token")
-            user_id = request.env['api.access_token'].sudo().search([('token', '=', access_token)], limit=1).user_id
+            token_info = request.env['api.access_token'].sudo()._get_token_info(access_token)
+            user_id = request.env['res.users'].browse(token_info[0] if token_info else [])
             if user_id and request.httprequest.method == 'POST':
                 # convert the bytes format to `list of dict` format
                 req_data = json.loads(request.httprequest.data.decode())
@@ -3438,6 +3650,7 @@ class BistaWmsApi(http.Controller):
         
     @validate_token
     @http.route("/api/post_batch_validate", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def post_batch_validate(self, **payload):
         _logger.info("/api/post_batch_validate payload: %s", payload)
 
@@ -3473,18 +3686,25 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/sync_batch_post_picking_validate", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def sync_batch_post_picking_validate(self, **payload):
         _logger.info("/api/sync_batch_post_picking_validate payload: %s", payload)
 
         try:
+            if is_async_requested():
+                return enqueue_job_response()
             req_data = json.loads(
                 request.httprequest.data.decode())  # convert the bytes format to `list of dict` format
             batch_res = []
             for data in req_data['data']:
                 data['sync_batch_pickings'] = True
-                response = self.post_batch_validate(**data)
-                response.pop('sync_batch_pickings')
+                # NOTE: the helper and not the route, the route would run `@idempotent` again with the
+                # Idempotency-Key of this request.
+                response = self.post_batch_validate_data(data)
+                if isinstance(response, dict):
+                    response.pop('sync_batch_pickings', None)
                 batch_res.append(response)
+                report_job_progress(len(batch_res), len(req_data['data']))
             return valid_response(batch_res)
         except Exception as e:
             _logger.exception("Error while validating batch picking for payload: %s", payload)
@@ -3506,6 +3726,137 @@ class BistaWmsApi(http.Controller):
         
         return domain
 
+    @staticmethod
+    def _stock_quant_row_error(index, quant, message):
+        return {'index': index, 'product_id': quant.get('product_id'), 'location_id': quant.get('location_id'),
+                'message': message}
+
+    @staticmethod
+    def _resolve_stock_quant_rows(self, rows):
+        """
+        Prepare the quant values of the posted rows: products, packages and lots are searched with one
+        query per model and the missing packages and lots are created with one `create` per model.
+
+        :param rows: list of (index, quant data)
+        :return: tuple (list of (index, quant data, vals), list of row errors)
+        """
+        stock_prod_lot = request.env['stock.lot']
+        stock_quant_package = request.env['stock.quant.package']
+        errors = []
+
+        product_ids = {int(quant['product_id']) for index, quant in rows if quant.get('product_id')}
+        products = {
+            product.id: product for product in request.env['product.product'].search([('id', 'in', list(product_ids))])
+        }
+        resolved = []
+        for index, quant in rows:
+            product_obj = products.get(int(quant.get('product_id') or 0))
+            if not product_obj:
+                errors.append(self._stock_quant_row_error(index, quant, "Product not found."))
+                continue
+            resolved.append((index, quant, product_obj))
+
+        # Packages given by name, per (name, company of the product)
+        package_keys = list(dict.fromkeys(
+            (quant['package_id'], product_obj.company_id.id) for index, quant, product_obj in resolved
+            if quant.get('package_id') and not isinstance(quant['package_id'], int)))
+        packages = {}
+        if package_keys:
+            for package in stock_quant_package.sudo().search([('name', 'in', [name for name, company in package_keys])]):
+                packages.setdefault((package.name, package.company_id.id), package.id)
+            missing = [key for key in package_keys if key not in packages]
+            if missing:
+                new_packages = stock_quant_package.create([
+                    {'name': name, 'package_use': 'disposable'} for name, company_id in missing])
+                packages.update(zip(missing, new_packages.ids))
+
+        # Lots, per (name, product, company of the product)
+        lot_keys = list(dict.fromkeys(
+            (quant['lot_id'], product_obj.id, product_obj.company_id.id) for index, quant, product_obj in resolved
+            if quant.get('lot_id')))
+        lots = {}
+        if lot_keys:
+            for lot in stock_prod_lot.sudo().search([
+                ('name', 'in', [name for name, product_id, company_id in lot_keys]),
+                ('product_id', 'in', [product_id for name, product_id, company_id in lot_keys]),
+            ]):
+                lots.setdefault((lot.name, lot.product_id.id, lot.company_id.id), lot.id)
+            missing = [key for key in lot_keys if key not in lots]
+            if missing:
+                new_lots = stock_prod_lot.create([
+                    {'name': name, 'product_id': product_id, 'company_id': company_id}
+                    for name, product_id, company_id in missing])
+                lots.update(zip(missing, new_lots.ids))
+
+        result = []
+        for index, quant, product_obj in resolved:
+            if isinstance(quant.get('package_id'), int):
+                product_package = quant['package_id']
+            elif quant.get('package_id'):
+                product_package = packages[(quant['package_id'], product_obj.company_id.id)]
+            else:
+                product_package = False
+            lot_id = lots[(quant['lot_id'], product_obj.id, product_obj.company_id.id)] if quant.get('lot_id') else False
+            result.append((index, quant, {
+                'location_id': quant.get('location_id'),
+                'product_id': product_obj.id,
+                'lot_id': lot_id,
+                'package_id': product_package,
+                'owner_id': quant.get('owner_id') or False,
+                'inventory_quantity': quant.get('inventory_quantity'),
+                'inventory_date': quant.get('inventory_date'),
+                'company_id': product_obj.company_id.id
+            }))
+        return result, errors
+
+    @staticmethod
+    def _apply_stock_quant_rows(self, rows):
+        """
+        Upsert the quants of the posted rows and apply their inventory at once.
+
+        NOTE: the existing quants are matched in memory on the fields of `_post_stock_quant_search_domain`,
+        from one search on the locations and products of the rows. When a row is posted twice, the last one wins.
+
+        :param rows: list of (index, quant data)
+        :return: list of row errors
+        """
+        stock_quant = request.env['stock.quant']
+        rows, errors = self._resolve_stock_quant_rows(self, rows)
+        if not rows:
+            return errors
+
+        def quant_key(values):
+            return tuple(int(values[field]) if values[field] else False for field in QUANT_MATCH_FIELDS)
+
+        vals_by_key = {quant_key(vals): vals for index, quant, vals in rows}
+        existing_quants = {}
+        for quant in stock_quant.sudo().search([
+            ('location_id.usage', 'in', ['internal', 'transit']),
+            ('location_id', 'in', list({key[0] for key in vals_by_key})),
+            ('product_id', 'in', list({key[1] for key in vals_by_key})),
+        ]):
+            existing_quants.setdefault(tuple(quant[field].id for field in QUANT_MATCH_FIELDS), quant)
+
+        updated_quants = stock_quant.sudo()
+        vals_to_create = []
+        for key, vals in vals_by_key.items():
+            quant = existing_quants.get(key)
+            if quant:
+                quant.write(vals)
+                updated_quants |= quant
+            else:
+                vals_to_create.append(vals)
+        created_quants = stock_quant.create(vals_to_create) if vals_to_create else stock_quant
+        quants = updated_quants | created_quants.sudo()
+        if isinstance(quants.action_apply_inventory(), dict):
+            # Some quants need a wizard (conflicts, tracked products without lot) and nothing was applied,
+            # apply the others one by one as the wizards can't be answered here.
+            for quant in quants:
+                quant.action_apply_inventory()
+        if created_quants and not request.env['ir.config_parameter'].sudo().get_param('stock.skip_quant_tasks'):
+            stock_quant._quant_tasks()
+        return errors
+
     @staticmethod
     def post_stock_quants_data(self, payload):
 
@@ -3521,130 +3872,50 @@ class BistaWmsApi(http.Controller):
                     'picking_id': req_data['stock_quant']}
         else:
             _logger.info("Updating Stock Quant Data")
-            stock_count = 0
-            product_package = False
-            stock_quant_obj = False
-            lot_id = False
-            owner_id = False
-            stock_prod_lot = request.env['stock.lot']
-            stock_quant = request.env['stock.quant']
-            stock_quant_package = request.env['stock.quant.package']
-
-            if stock_quant_data:
-                for quant in stock_quant_data:
+            rows = list(enumerate(stock_quant_data))
+            try:
+                with request.env.cr.savepoint():
+                    errors = self._apply_stock_quant_rows(self, rows)
+            except Exception:
+                # Find the failing rows: apply the rows one by one, each one in its own savepoint.
+                _logger.exception("Error while creating stock quants data in bulk, retrying row by row.")
+                errors = []
+                for done, row in enumerate(rows):
+                    report_job_progress(done, len(rows))
                     try:
-                        if quant.get('product_id'):
-                            product_obj = request.env['product.product'].search([('id','=',quant.get('product_id'))])
-                        if isinstance(quant.get('package_id'), int):
-                            product_package = quant.get('package_id')
-                        elif not quant.get('package_id'):
-                            product_package = False
-                        else:
-                            package_obj = stock_quant_package.sudo().search(
-                                [('name', '=', quant.get('package_id')),('company_id','=', product_obj.company_id.id)], limit=1)
-                            if not package_obj:
-                                package_obj = stock_quant_package.create(
-                                    {
-                                        'name': quant.get('package_id'),
-                                        'package_use': 'disposable'
-                                    })
-                            product_package = package_obj.id
-
-                        if quant.get('lot_id'):
-                            #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-                            # lot_detail = stock_prod_lot.sudo().search([
-                            #     ('name', '=', quant.get('lot_id')),
-                            #     ('product_id', '=', quant.get('product_id')),
-                            #     ('company_id', '=', request.env.user.company_id.id)], limit=1)
-                            lot_detail = stock_prod_lot.sudo().search([
-                                ('name', '=', quant.get('lot_id')),
-                                ('product_id', '=', quant.get('product_id')),
-                                ('company_id','=',product_obj.company_id.id)], limit=1)
-
-                            if not lot_detail:
-                                lot_detail = stock_prod_lot.create({
-                                    'name': quant.get('lot_id'),
-                                    'product_id': quant.get('product_id'),
-                                    'company_id': product_obj.company_id.id,
-                                })
-                            lot_id = lot_detail.id
-
-                        if quant.get('owner_id'):
-                            owner_id = quant.get('owner_id')
-
-                        vals = {
-                            'location_id': quant.get('location_id'),
-                            'product_id': quant.get('product_id'),
-                            'lot_id': lot_id,
-                            'package_id': product_package,
-                            'owner_id': owner_id,
-                            'inventory_quantity': quant.get('inventory_quantity'),
-                            'inventory_date': quant.get('inventory_date'),
-                            'company_id': product_obj.company_id.id
-                        }
-                        # product_obj = product.sudo().search([('id','=',int(quant.get('product_id')))], limit = 1)
-                        # if product_obj:
-                        #     product_categ_id = product_obj.categ_id.id
-                        #NOTE:('company_id', '=', request.env.user.company_id.id) is being removed from the domain to show records irrespective of user's default company
-                        # domain = [('location_id.usage', 'in', ['internal', 'transit']),
-                        #         ('location_id', '=', quant.get('location_id')),
-                        #         ('product_id', '=', quant.get('product_id')),
-                        #         #   ('product_categ_id','=',product_categ_id),
-                        #         ('lot_id', '=', lot_id), ('package_id', '=', product_package),
-                        #         #   ('product_uom_id','=',product_obj.uom_id.id),
-                        #         ('owner_id', '=', owner_id), ('company_id', '=', request.env.user.company_id.id)]
-                        # domain = [('location_id.usage', 'in', ['internal', 'transit']),
-                        #         ('location_id', '=', quant.get('location_id')),
-                        #         ('product_id', '=', quant.get('product_id')),
-                        #         #   ('product_categ_id','=',product_categ_id),
-                        #         ('lot_id', '=', lot_id), ('package_id', '=', product_package),
-                        #         #   ('product_uom_id','=',product_obj.uom_id.id),
-                        #         ('owner_id', '=', owner_id),
-                        #         ('company_id','=',product_obj.company_id.id)]
-                        
-                        domain = self._post_stock_quant_search_domain(self,quant, lot_id, product_package, owner_id, product_obj)
-
-                        stock_quant_available = stock_quant.sudo().search(domain, limit=1)
-                        if stock_quant_available:
-                            stock_quant_available.write(vals)
-                            stock_quant_available.action_apply_inventory()
-                            stock_count = stock_count + 1
-                        else:
-                            stock_quant_obj = stock_quant.create(vals)
-                            if stock_quant_obj:
-                                stock_quant_obj.action_apply_inventory()
-                                stock_count = stock_count + 1
-                                if not request.env['ir.config_parameter'].sudo().get_param('stock.skip_quant_tasks'):
-                                    stock_quant_obj._quant_tasks()
-                                # return {"status": True, 'message': "Stock quant is created", 'quant_id': stock_quant_obj.id}
-                            else:
-                                return {"status": False, 'code': "not_stock_quant_created",
-                                        'message': "Stock quant is not created",
-                                        'product_id': quant.get('product_id'), 'location_id': quant.get('location_id')}
+                        with request.env.cr.savepoint():
+                            errors += self._apply_stock_quant_rows(self, [row])
                     except Exception as e:
-                        _logger.exception("Error while creating stock quants data.", e)
-                        return {"status": False, 'type': "bad_request",
-                                        'message': "Error while creating stock quants data.",
-                                        'product_id': quant.get('product_id'), 'location_id': quant.get('location_id')}
-                if stock_count == len(stock_quant_data):
-                    return {"status": True, 'message': "Stock quant is created and updated with quantity"}
-            else:
-                return {"status": False, 'code': "stock_quant_data", 'message': "Stock quant datas are empty."}
+                        _logger.exception("Error while creating stock quants data.")
+                        errors.append(self._stock_quant_row_error(
+                            row[0], row[1], _serialize_exception(e).get('message') or
+                            "Error while creating stock quants data."))
+            report_job_progress(len(rows), len(rows))
+
+            if errors:
+                return {"status": False, 'code': "bad_request", 'message': "Error while creating stock quants data.",
+                        'errors': errors, 'count': len(rows) - len(errors)}
+            return {"status": True, 'message': "Stock quant is created and updated with quantity",
+                    'count': len(rows)}
 
     @validate_token
     @http.route("/api/post_stock_quants", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def post_stock_quants(self, **payload):
         """
             create stock quant info.
         """
         _logger.info("/api/post_stock_quants POST payload: %s", payload)
         try:
+            if is_async_requested():
+                return enqueue_job_response()
             response_data = self.post_stock_quants_data(self, payload)
             if isinstance(response_data, dict):
                 if response_data['status']:
                     return valid_response(response_data)
                 else:
-                    return invalid_response(response_data.get('code'), response_data.get('message'))
+                    return invalid_response(response_data.get('code'), response_data.get('message'),
+                                            errors=response_data.get('errors', []))
         except Exception as e:
             _logger.exception("Error while creating stock quants data: %s", payload)
             err = _serialize_exception(e)
@@ -3716,6 +3987,7 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/post_put_in_pack", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def post_put_in_pack(self, **payload):
         _logger.info("/api/post_put_in_pack payload: %s", payload)
         try:
@@ -3788,6 +4060,7 @@ class BistaWmsApi(http.Controller):
                 if picking_response:
                     response_data.append({"status": True, "message": f'Transfer {picking_obj.name} is updated',
                                         "picking_id": picking_id})
+                    report_job_progress(len(response_data), len(req_data.get("data")))
                 else:
                     return {"status": False, 'code': "package_obj",
                             'message': f'Transfer {picking_obj.name} is not updated',
@@ -3799,9 +4072,12 @@ class BistaWmsApi(http.Controller):
 
     @validate_token
     @http.route("/api/post_sync_move_line", type="json", auth="none", methods=["POST"], csrf=False)
+    @idempotent
     def post_sync_move_line(self, **payload):
         _logger.info("/api/post_put_in_pack payload: %s", payload)
         try:
+            if is_async_requested():
+                return enqueue_job_response()
             res = self.post_sync_move_line_data(self, payload)
             if res:
                 if isinstance(res, list):
@@ -3818,6 +4094,48 @@ class BistaWmsApi(http.Controller):
                 error_msg = 'Error in sync move line data.'
             return invalid_response('bad_request', error_msg, 200)
 
+    @validate_token
+    @http.route("/api/job_status", type="http", auth="none", methods=["GET"], csrf=False)
+    def job_status(self, **payload):
+        """
+            Returns the state, progress and result of a job enqueued with `async`.
+        """
+        _logger.info("/api/job_status payload: %s", payload)
+        try:
+            job = request.env['bista.wms.job'].sudo().search([
+                ('id', '=', int(payload.get('job_id') or 0)),
+                ('user_id', '=', request.env.uid),
+            ])
+            if not job:
+                return invalid_response('not_found', 'No job found.')
+            return valid_response(job._get_status())
+        except Exception as e:
+            _logger.exception("Error while getting job status for payload: %s", payload)
+            error_msg = 'Error while getting job status.'
+            return invalid_response('bad_request', error_msg, 200)
+
+    @validate_token
+    @http.route("/api/metrics", type="http", auth="none", methods=["GET"], csrf=False)
+    def metrics(self, **payload):
+        """
+            Returns the latency, SQL, response size and record count histograms of the routes, summed over
+            all the workers, in the Prometheus text format. Restricted to the administrators.
+        """
+        try:
+            if not request.env.user.has_group('base.group_system'):
+                return invalid_response('access_denied', 'Only administrators can read the metrics.', 403)
+            # NOTE: the samples of this worker are stored in another transaction, they are added to the
+            # stored ones read here instead of being read back.
+            samples = request.env['bista.wms.metric'].sudo()._get_samples()
+            for key, value in flush_metrics().items():
+                samples[key] = samples.get(key, 0) + value
+            return werkzeug.wrappers.Response(
+                format_prometheus(samples), status=200, content_type="text/plain; version=0.0.4; charset=utf-8")
+        except Exception as e:
+            _logger.exception("Error while getting metrics")
+            error_msg = 'Error while getting metrics.'
+            return invalid_response('bad_request', error_msg, 200)
+
 
 
 
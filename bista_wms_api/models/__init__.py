@@ -6,3 +6,11 @@ from . import stock_location
 from . import bista_settings
 from . import bista_app_changes
 from . import stock_picking
+from . import delta_sync
+from . import change_journal
+from . import picking_counter
+from . import barcode_index
+from . import wms_settings
+from . import wms_job
+from . import wms_idempotency
+from . import wms_metrics
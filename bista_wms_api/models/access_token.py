@@ -3,13 +3,20 @@ import logging
 import os
 from datetime import datetime, timedelta
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT
 
 _logger = logging.getLogger(__name__)
 
 expires_in = "bista_wms_api.access_token_expires_in"
 
+# Per-worker counters of the token resolution cache, see `_get_token_info`.
+TOKEN_CACHE_STATS = {"lookup": 0, "miss": 0}
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
 
 def nonce(length=40, prefix="access_token"):
     rbytes = os.urandom(length)
@@ -21,10 +28,123 @@ class APIAccessToken(models.Model):
     _description = "API Access Token"
 
     token = fields.Char("Access Token", required=True)
-    user_id = fields.Many2one("res.users", string="User", required=True)
-    expires = fields.Datetime(string="Expires", required=True)
+    # NOTE: every lookup goes through the digest, see the unique covering index created in `init`.
+    token_digest = fields.Char("Access Token Digest", readonly=True, copy=False)
+    user_id = fields.Many2one("res.users", string="User", required=True, index=True)
+    expires = fields.Datetime(string="Expires", required=True, index=True)
     scope = fields.Char(string="Scope")
 
+    def init(self):
+        # Fill the digest of the tokens created before the column existed.
+        self.env.cr.execute("""
+            UPDATE api_access_token
+               SET token_digest = encode(sha256(convert_to(token, 'UTF8')), 'hex')
+             WHERE token_digest IS NULL
+        """)
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS api_access_token_token_digest_uniq
+                ON api_access_token (token_digest) INCLUDE (user_id, expires)
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get("token"):
+                vals["token_digest"] = token_digest(vals["token"])
+        access_tokens = super(APIAccessToken, self).create(vals_list)
+        # NOTE: a new token supersedes the previous token of the user, drop the cached resolutions in every worker.
+        self.env.registry.clear_cache()
+        return access_tokens
+
+    def write(self, vals):
+        if vals.get("token"):
+            vals["token_digest"] = token_digest(vals["token"])
+        res = super(APIAccessToken, self).write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super(APIAccessToken, self).unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    def _get_token_info(self, access_token):
+        """
+        Resolve an access token sent by the mobile app.
+
+        The resolution is kept in the registry LRU cache, keyed by the token digest, and is
+        invalidated in all workers whenever a token is created, updated or deleted.
+
+        :param str access_token: token from the request header
+        :returns: ``(user_id, expires)`` of a valid token, ``None`` otherwise.
+        """
+        TOKEN_CACHE_STATS["lookup"] += 1
+        token_info = self._get_token_info_cached(token_digest(access_token))
+        if token_info and datetime.now() > token_info[1]:
+            return None
+        return token_info
+
+    @api.model
+    @tools.ormcache("digest")
+    def _get_token_info_cached(self, digest):
+        TOKEN_CACHE_STATS["miss"] += 1
+        self.flush_model(["token_digest", "user_id", "expires"])
+        # NOTE: only the latest token of a user is valid, same rule as in `find_one_or_create_token`.
+        self.env.cr.execute("""
+            SELECT token.user_id, token.expires
+              FROM api_access_token token
+             WHERE token.token_digest = %s
+               AND NOT EXISTS (SELECT 1
+                                 FROM api_access_token newer
+                                WHERE newer.user_id = token.user_id
+                                  AND newer.id > token.id)
+        """, [digest])
+        row = self.env.cr.fetchone()
+        return tuple(row) if row else None
+
+    @api.model
+    def _find_by_token(self, access_token):
+        """Return the api.access_token record of the given token through its digest."""
+        return self.sudo().search([("token_digest", "=", token_digest(access_token))], limit=1)
+
+    @api.model
+    def _gc_expired_tokens(self, batch_size=10000):
+        """
+        Delete expired tokens by batches of `batch_size` rows, committing between batches so
+        a large backlog never holds a long lock on the table.
+        """
+        deleted = 0
+        while True:
+            self.env.cr.execute("""
+                DELETE FROM api_access_token
+                 WHERE id IN (SELECT id
+                                FROM api_access_token
+                               WHERE expires < %s
+                               ORDER BY id
+                               LIMIT %s
+                                 FOR UPDATE SKIP LOCKED)
+            """, [fields.Datetime.now(), batch_size])
+            count = self.env.cr.rowcount
+            deleted += count
+            if count:
+                self.env.cr.commit()
+            if count < batch_size:
+                break
+        if deleted:
+            self.invalidate_model()
+            self.env.registry.clear_cache()
+            _logger.info("Purged %s expired API access tokens", deleted)
+        return deleted
+
+    @api.model
+    def _get_token_cache_stats(self):
+        """Hit/miss counters of the token resolution cache of the current worker."""
+        return {
+            "hit": TOKEN_CACHE_STATS["lookup"] - TOKEN_CACHE_STATS["miss"],
+            "miss": TOKEN_CACHE_STATS["miss"],
+        }
+
     def find_one_or_create_token(self, user_id=None, create=False):
         if not user_id:
             user_id = self.env.user.id
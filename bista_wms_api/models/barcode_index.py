@@ -0,0 +1,299 @@
+import logging
+
+import psycopg2.errors
+
+from odoo import api, fields, models
+
+from .change_journal import assign_sequences, init_sequence
+
+_logger = logging.getLogger(__name__)
+
+# Advisory lock serializing the sequence assignments of the index, see `assign_sequences`.
+BARCODE_INDEX_LOCK = 0x574d5342
+
+# Barcode of each indexed model, as a query returning
+# (res_id, barcode, company_id, warehouse_id, user_id, active) filtered with `{where}` on the record ids.
+BARCODE_INDEX_SOURCES = {
+    'product.product': ('product', """
+        SELECT product.id, product.barcode, template.company_id, NULL::integer, NULL::integer,
+               product.active AND product.barcode IS NOT NULL
+          FROM product_product product
+          JOIN product_template template ON template.id = product.product_tmpl_id
+         WHERE {where}
+    """, 'product.id'),
+    'stock.picking': ('picking', """
+        SELECT picking.id, picking.name, picking.company_id, picking_type.warehouse_id, picking.user_id,
+               picking.state = 'assigned'
+          FROM stock_picking picking
+          LEFT JOIN stock_picking_type picking_type ON picking_type.id = picking.picking_type_id
+         WHERE {where}
+    """, 'picking.id'),
+    'stock.picking.batch': ('batch_wave', """
+        SELECT batch.id, batch.name, batch.company_id, picking_type.warehouse_id, batch.user_id,
+               batch.state = 'in_progress'
+          FROM stock_picking_batch batch
+          LEFT JOIN stock_picking_type picking_type ON picking_type.id = batch.picking_type_id
+         WHERE {where}
+    """, 'batch.id'),
+    'stock.location': ('location', """
+        SELECT location.id, location.barcode, location.company_id, location.warehouse_id, NULL::integer,
+               location.active AND location.usage = 'internal' AND location.barcode IS NOT NULL
+          FROM stock_location location
+         WHERE {where}
+    """, 'location.id'),
+    'stock.package.type': ('product_package_type', """
+        SELECT package_type.id, package_type.barcode, package_type.company_id, NULL::integer, NULL::integer,
+               package_type.barcode IS NOT NULL
+          FROM stock_package_type package_type
+         WHERE {where}
+    """, 'package_type.id'),
+    'product.packaging': ('product_packaging', """
+        SELECT packaging.id, packaging.barcode, packaging.company_id, NULL::integer, NULL::integer,
+               packaging.barcode IS NOT NULL
+          FROM product_packaging packaging
+         WHERE {where}
+    """, 'packaging.id'),
+    'stock.quant.package': ('product_packages', """
+        SELECT package.id, package.name, package.company_id, location.warehouse_id, NULL::integer,
+               package.name IS NOT NULL AND COALESCE(location.usage, '') != 'customer'
+          FROM stock_quant_package package
+          LEFT JOIN stock_location location ON location.id = package.location_id
+         WHERE {where}
+    """, 'package.id'),
+    'stock.lot': ('lot_serial', """
+        SELECT lot.id, lot.name, lot.company_id, NULL::integer, NULL::integer, lot.name IS NOT NULL
+          FROM stock_lot lot
+         WHERE {where}
+    """, 'lot.id'),
+}
+
+
+class BistaWmsBarcodeIndex(models.Model):
+    _name = "bista.wms.barcode.index"
+    _description = "WMS API Barcode Index"
+    _order = "sequence"
+    _log_access = False
+
+    # NOTE: rows are never deleted, a record losing its barcode or deleted gets an inactive row with a new
+    # sequence so that the delta sync of the app removes it as well. A changed row is left out of the
+    # syncs until its new sequence is assigned, see `assign_sequences`.
+    barcode = fields.Char("Barcode", readonly=True)
+    route = fields.Char("Route", required=True, readonly=True)
+    res_model = fields.Char("Resource Model", required=True, readonly=True)
+    res_id = fields.Many2oneReference("Resource ID", model_field="res_model", required=True, readonly=True)
+    company_id = fields.Many2one("res.company", string="Company", readonly=True)
+    warehouse_id = fields.Many2one("stock.warehouse", string="Warehouse", readonly=True)
+    user_id = fields.Many2one("res.users", string="Responsible", readonly=True)
+    active = fields.Boolean("Active", default=True, readonly=True)
+    sequence = fields.Integer("Sequence", index=True, readonly=True)
+    date = fields.Datetime("Date", required=True, readonly=True)
+
+    _sql_constraints = [
+        ('res_model_res_id_uniq', 'unique(res_model, res_id)', 'A record can only be indexed once.'),
+    ]
+
+    def init(self):
+        init_sequence(self.env.cr, self._table, 'bista_wms_barcode_index_sequence')
+        # NOTE: the index is built by the cron once the install or upgrade is committed, not in its transaction.
+        self.env.cr.postcommit.add(self._trigger_rebuild)
+
+    def _trigger_rebuild(self):
+        with self.env.registry.cursor() as cr:
+            cron = self.env(cr=cr).ref('bista_wms_api.barcode_index_cron', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+    @api.model
+    def _mark_records(self, records):
+        """Refresh the index rows of `records` at the end of the transaction."""
+        data = self.env.cr.precommit.data
+        if "bista_wms_api.barcode_index" not in data:
+            self.env.cr.precommit.add(self._flush_barcode_index)
+            self.env.cr.postcommit.add(self._assign_sequences)
+        data.setdefault("bista_wms_api.barcode_index", {}).setdefault(records._name, set()).update(
+            records.filtered('id').ids)
+
+    def _flush_barcode_index(self):
+        marked = self.env.cr.precommit.data.pop("bista_wms_api.barcode_index", {})
+        if not marked:
+            return
+        for model_name, ids in marked.items():
+            self._refresh_barcode_index(model_name, list(ids))
+
+    @api.model
+    def _refresh_barcode_index(self, model_name, ids=None):
+        """Upsert the index rows of the records of `model_name` (all of them by default)."""
+        route, query, id_column = BARCODE_INDEX_SOURCES[model_name]
+        self.env[model_name].flush_model()
+        where = "TRUE" if ids is None else "%s = ANY(%%(ids)s)" % id_column
+        params = {'res_model': model_name, 'route': route, 'ids': ids}
+        self.env.cr.execute("""
+            WITH source (res_id, barcode, company_id, warehouse_id, user_id, active) AS ({query})
+            INSERT INTO bista_wms_barcode_index
+                   (res_model, res_id, route, barcode, company_id, warehouse_id, user_id, active, sequence, xid,
+                    date)
+            SELECT %(res_model)s, res_id, %(route)s, barcode, company_id, warehouse_id, user_id, active,
+                   NULL, txid_current(), now() AT TIME ZONE 'UTC'
+              FROM source
+            ON CONFLICT (res_model, res_id) DO UPDATE
+               SET barcode = EXCLUDED.barcode, company_id = EXCLUDED.company_id,
+                   warehouse_id = EXCLUDED.warehouse_id, user_id = EXCLUDED.user_id, active = EXCLUDED.active,
+                   sequence = NULL, xid = EXCLUDED.xid, date = EXCLUDED.date
+             WHERE (bista_wms_barcode_index.barcode, bista_wms_barcode_index.company_id,
+                    bista_wms_barcode_index.warehouse_id, bista_wms_barcode_index.user_id,
+                    bista_wms_barcode_index.active)
+                   IS DISTINCT FROM
+                   (EXCLUDED.barcode, EXCLUDED.company_id, EXCLUDED.warehouse_id, EXCLUDED.user_id, EXCLUDED.active)
+        """.format(query=query.format(where=where)), params)
+        # Deleted records
+        self.env.cr.execute("""
+            UPDATE bista_wms_barcode_index index_row
+               SET active = FALSE, sequence = NULL, xid = txid_current(), date = now() AT TIME ZONE 'UTC'
+             WHERE res_model = %(res_model)s AND active {where_ids}
+               AND NOT EXISTS (SELECT 1 FROM {table} WHERE id = index_row.res_id)
+        """.format(
+            where_ids="" if ids is None else "AND res_id = ANY(%(ids)s)",
+            table=self.env[model_name]._table,
+        ), params)
+        self.invalidate_model()
+
+    @api.model
+    def _rebuild_barcode_index(self):
+        """Consistency job, re-index every record, each model is committed on its own."""
+        for model_name in BARCODE_INDEX_SOURCES:
+            self._refresh_barcode_index(model_name)
+            self.env.cr.commit()
+        _logger.info("Rebuilt the WMS barcode index")
+
+    @api.model
+    def _assign_sequences(self):
+        """Number the finished rows in a transaction of their own, after each commit and by the cron."""
+        try:
+            with self.env.registry.cursor() as cr:
+                assign_sequences(cr, self._table, 'bista_wms_barcode_index_sequence', BARCODE_INDEX_LOCK)
+        except psycopg2.errors.SerializationFailure:
+            # The rows were numbered by a transaction committed meanwhile.
+            pass
+
+    @api.model
+    def _iter_barcodes(self, after_sequence=0, last_sequence=None, since=None, user_id=None, warehouse_id=None,
+                       company_ids=None):
+        """
+        Yield the indexed barcodes ordered by sequence, up to `last_sequence` when given.
+
+        In delta mode (`after_sequence`) the inactive rows are yielded as well so that the app removes them.
+        `user_id`/`warehouse_id`/`company_ids` restrict the pickings and batches to the ones of the user
+        and the locations and packages to the warehouse of the user, as for the users without the stock
+        manager group.
+        """
+        query = """
+            SELECT barcode, route, sequence, active
+              FROM bista_wms_barcode_index
+             WHERE sequence > %(after_sequence)s
+        """
+        if last_sequence is not None:
+            query += " AND sequence <= %(last_sequence)s"
+        if not after_sequence:
+            query += " AND active"
+        if since:
+            query += " AND date >= %(since)s"
+        if company_ids is not None:
+            query += " AND (route NOT IN ('picking', 'batch_wave') OR company_id = ANY(%(company_ids)s))"
+        if user_id:
+            query += """
+               AND (route NOT IN ('picking', 'batch_wave') OR user_id = %(user_id)s)
+               AND (route NOT IN ('location', 'product_packages') OR warehouse_id IS NOT DISTINCT FROM %(warehouse_id)s)
+            """
+        self.env.cr.execute(query + " ORDER BY sequence", {
+            'after_sequence': after_sequence,
+            'last_sequence': last_sequence,
+            'since': since,
+            'company_ids': company_ids,
+            'user_id': user_id,
+            'warehouse_id': warehouse_id,
+        })
+        rows = self.env.cr.fetchmany(1000)
+        while rows:
+            for barcode, route, sequence, active in rows:
+                if after_sequence:
+                    yield {"barcode": barcode, "route": route, "sequence": sequence, "active": active}
+                else:
+                    yield {"barcode": barcode, "route": route}
+            rows = self.env.cr.fetchmany(1000)
+
+    @api.model
+    def _get_last_sequence(self):
+        self.env.cr.execute("SELECT COALESCE(max(sequence), 0) FROM bista_wms_barcode_index")
+        return self.env.cr.fetchone()[0]
+
+
+class BistaWmsBarcodeIndexMixin(models.AbstractModel):
+    _name = "bista.wms.barcode.index.mixin"
+    _description = "WMS API Barcode Index Mixin"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['bista.wms.barcode.index'].sudo()._mark_records(records)
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['bista.wms.barcode.index'].sudo()._mark_records(self)
+        return res
+
+    def unlink(self):
+        self.env['bista.wms.barcode.index'].sudo()._mark_records(self)
+        return super().unlink()
+
+
+class ProductProduct(models.Model):
+    _name = "product.product"
+    _inherit = ["product.product", "bista.wms.barcode.index.mixin"]
+
+
+class StockPicking(models.Model):
+    _name = "stock.picking"
+    _inherit = ["stock.picking", "bista.wms.barcode.index.mixin"]
+
+    def _compute_state(self):
+        # NOTE: the state is a stored computed field, its changes don't go through `write`.
+        res = super()._compute_state()
+        self.env['bista.wms.barcode.index'].sudo()._mark_records(self)
+        return res
+
+
+class StockPickingBatch(models.Model):
+    _name = "stock.picking.batch"
+    _inherit = ["stock.picking.batch", "bista.wms.barcode.index.mixin"]
+
+
+class StockLocation(models.Model):
+    _name = "stock.location"
+    _inherit = ["stock.location", "bista.wms.barcode.index.mixin"]
+
+
+class StockPackageType(models.Model):
+    _name = "stock.package.type"
+    _inherit = ["stock.package.type", "bista.wms.barcode.index.mixin"]
+
+
+class ProductPackaging(models.Model):
+    _name = "product.packaging"
+    _inherit = ["product.packaging", "bista.wms.barcode.index.mixin"]
+
+
+class StockQuantPackage(models.Model):
+    _name = "stock.quant.package"
+    _inherit = ["stock.quant.package", "bista.wms.barcode.index.mixin"]
+
+    def _compute_package_info(self):
+        # NOTE: the location of a package is computed from its quants.
+        res = super()._compute_package_info()
+        self.env['bista.wms.barcode.index'].sudo()._mark_records(self)
+        return res
+
+
+class StockLot(models.Model):
+    _name = "stock.lot"
+    _inherit = ["stock.lot", "bista.wms.barcode.index.mixin"]
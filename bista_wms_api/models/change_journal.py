@@ -0,0 +1,236 @@
+import logging
+from datetime import timedelta
+
+import psycopg2.errors
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Advisory lock serializing the sequence assignments of the journal, see `assign_sequences`.
+CHANGE_JOURNAL_LOCK = 0x574d534a
+journal_retention_days = "bista_wms_api.change_journal_retention_days"
+journal_purged_upto = "bista_wms_api.change_journal_purged_upto"
+
+
+def assign_sequences(cr, table, sequence_name, lock):
+    """
+    Number the rows of `table` written by the transactions finished before every running one.
+
+    NOTE: the rows are written with a NULL sequence and the id of their transaction (`xid`), and numbered
+    here in their own short transaction. A transaction older than every running one can't commit rows
+    anymore, so the sequences are allocated in commit order without holding a lock during the writing
+    transactions. The rows of a transaction wait for the transactions started before it to finish.
+    The rows are numbered by id, the order their transactions wrote them.
+    """
+    cr.execute("SELECT pg_try_advisory_xact_lock(%s)", [lock])
+    if not cr.fetchone()[0]:
+        # Another transaction is numbering the rows.
+        return
+    cr.execute("""
+        UPDATE {table} row_to_number SET sequence = numbered.sequence
+          FROM (SELECT id, nextval('{sequence_name}') AS sequence
+                  FROM (SELECT id FROM {table}
+                         WHERE sequence IS NULL AND xid < txid_snapshot_xmin(txid_current_snapshot())
+                      ORDER BY id) AS pending
+               ) AS numbered
+         WHERE row_to_number.id = numbered.id
+    """.format(table=table, sequence_name=sequence_name))
+
+
+def init_sequence(cr, table, sequence_name):
+    """Create the sequence and the `xid` column of `table`, the rows written before them are numbered by id."""
+    # NOTE: `xid` is a bigint as `txid_current()`, not an ORM field.
+    cr.execute("ALTER TABLE {table} ADD COLUMN IF NOT EXISTS xid bigint".format(table=table))
+    cr.execute("CREATE SEQUENCE IF NOT EXISTS {sequence_name}".format(sequence_name=sequence_name))
+    cr.execute("UPDATE {table} SET sequence = id WHERE sequence IS NULL AND xid IS NULL".format(table=table))
+    cr.execute("""
+        SELECT setval('{sequence_name}', GREATEST(
+            (SELECT COALESCE(max(sequence), 0) FROM {table}), (SELECT last_value FROM {sequence_name}), 1))
+    """.format(table=table, sequence_name=sequence_name))
+
+
+class BistaWmsChangeJournal(models.Model):
+    _name = "bista.wms.change.journal"
+    _description = "WMS API Change Journal"
+    _order = "sequence"
+    _log_access = False
+
+    # NOTE: clients resume after the last sequence they applied, the entries get their sequence once their
+    # transaction and the ones started before it finished, see `assign_sequences`.
+    sequence = fields.Integer("Sequence", index=True, readonly=True)
+    res_model = fields.Char("Resource Model", required=True, readonly=True)
+    res_id = fields.Many2oneReference("Resource ID", model_field="res_model", required=True, readonly=True)
+    operation = fields.Selection([
+        ('create', 'Created'),
+        ('write', 'Updated'),
+        ('archive', 'Archived'),
+        ('unlink', 'Deleted'),
+    ], string="Operation", required=True, readonly=True)
+    company_id = fields.Many2one("res.company", string="Company", readonly=True)
+    date = fields.Datetime("Date", default=fields.Datetime.now, required=True, readonly=True)
+
+    def init(self):
+        init_sequence(self.env.cr, self._table, 'bista_wms_change_journal_sequence')
+
+    @api.model
+    def _add_changes(self, records, operation):
+        """Buffer the changes of `records` until the end of the transaction."""
+        data = self.env.cr.precommit.data
+        if "bista_wms_api.change_journal" not in data:
+            self.env.cr.precommit.add(self._flush_journal)
+            self.env.cr.postcommit.add(self._assign_sequences)
+        changes = data.setdefault("bista_wms_api.change_journal", {})
+        with_company = "company_id" in records._fields
+        with_active = "active" in records._fields
+        for record in records:
+            key = (records._name, record.id)
+            previous = changes.get(key, (None,))[0]
+            # NOTE: a record created in the same transaction stays a creation for the clients, an archived
+            # one stays archived until it is unarchived.
+            if operation == 'write' and (previous == 'create' or (
+                    previous == 'archive' and with_active and not record.active)):
+                continue
+            changes[key] = (operation, record.company_id.id if with_company else None)
+
+    def _flush_journal(self):
+        changes = self.env.cr.precommit.data.pop("bista_wms_api.change_journal", {})
+        if not changes:
+            return
+        # NOTE: also run by the savepoints, the entries are numbered after the commit, see `assign_sequences`.
+        keys = list(changes)
+        self.env.cr.execute("""
+            INSERT INTO bista_wms_change_journal (res_model, res_id, operation, company_id, date, xid)
+            SELECT res_model, res_id, operation, company_id, now() AT TIME ZONE 'UTC', txid_current()
+              FROM unnest(%s::varchar[], %s::integer[], %s::varchar[], %s::integer[])
+                AS change(res_model, res_id, operation, company_id)
+        """, [
+            [model for model, res_id in keys],
+            [res_id for model, res_id in keys],
+            [changes[key][0] for key in keys],
+            [changes[key][1] for key in keys],
+        ])
+
+    @api.model
+    def _assign_sequences(self):
+        """Number the finished entries in a transaction of their own, after each commit and by the cron."""
+        try:
+            with self.env.registry.cursor() as cr:
+                assign_sequences(cr, self._table, 'bista_wms_change_journal_sequence', CHANGE_JOURNAL_LOCK)
+        except psycopg2.errors.SerializationFailure:
+            # The entries were numbered by a transaction committed meanwhile.
+            pass
+
+    @api.model
+    def _iter_changes(self, after_sequence, last_sequence, limit, company_ids, model_names=None):
+        """Yield the journal entries between the two sequences visible for `company_ids`."""
+        query = """
+            SELECT sequence, res_model, res_id, operation, company_id, date
+              FROM bista_wms_change_journal
+             WHERE sequence > %s AND sequence <= %s
+               AND (company_id IS NULL OR company_id = ANY(%s))
+        """
+        params = [after_sequence, last_sequence, list(company_ids)]
+        if model_names:
+            query += " AND res_model = ANY(%s)"
+            params.append(list(model_names))
+        query += " ORDER BY sequence LIMIT %s"
+        params.append(limit)
+        self.env.cr.execute(query, params)
+        rows = self.env.cr.fetchmany(1000)
+        while rows:
+            for sequence, res_model, res_id, operation, company_id, date in rows:
+                yield {
+                    'sequence': sequence,
+                    'model': res_model,
+                    'res_id': res_id,
+                    'operation': operation,
+                    'company_id': company_id or False,
+                    'date': date,
+                }
+            rows = self.env.cr.fetchmany(1000)
+
+    @api.model
+    def _get_last_sequence(self):
+        self.env.cr.execute("SELECT COALESCE(max(sequence), 0) FROM bista_wms_change_journal")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _get_purged_sequence(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(journal_purged_upto, 0))
+
+    @api.autovacuum
+    def _gc_change_journal(self):
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(journal_retention_days, 30))
+        limit_date = fields.Datetime.now() - timedelta(days=retention_days)
+        self.env.cr.execute("""
+            WITH purged AS (DELETE FROM bista_wms_change_journal WHERE date < %s RETURNING sequence)
+            SELECT count(*), COALESCE(max(sequence), 0) FROM purged
+        """, [limit_date])
+        purged_count, purged_sequence = self.env.cr.fetchone()
+        if purged_count:
+            # Clients resuming before this sequence missed changes and need a full resync.
+            self.env['ir.config_parameter'].sudo().set_param(
+                journal_purged_upto, max(purged_sequence, self._get_purged_sequence()))
+            _logger.info("GC'd %d change journal entries", purged_count)
+
+
+class BistaWmsChangeJournalMixin(models.AbstractModel):
+    _name = "bista.wms.change.journal.mixin"
+    _description = "WMS API Change Journal Mixin"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['bista.wms.change.journal'].sudo()._add_changes(records, 'create')
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        operation = 'archive' if 'active' in vals and not vals['active'] else 'write'
+        self.env['bista.wms.change.journal'].sudo()._add_changes(self, operation)
+        return res
+
+    def unlink(self):
+        self.env['bista.wms.change.journal'].sudo()._add_changes(self, 'unlink')
+        return super().unlink()
+
+
+class ProductProduct(models.Model):
+    _name = "product.product"
+    _inherit = ["product.product", "bista.wms.change.journal.mixin"]
+
+
+class StockLot(models.Model):
+    _name = "stock.lot"
+    _inherit = ["stock.lot", "bista.wms.change.journal.mixin"]
+
+
+class StockLocation(models.Model):
+    _name = "stock.location"
+    _inherit = ["stock.location", "bista.wms.change.journal.mixin"]
+
+
+class StockQuantPackage(models.Model):
+    _name = "stock.quant.package"
+    _inherit = ["stock.quant.package", "bista.wms.change.journal.mixin"]
+
+
+class StockPicking(models.Model):
+    _name = "stock.picking"
+    _inherit = ["stock.picking", "bista.wms.change.journal.mixin"]
+
+
+class StockPickingBatch(models.Model):
+    _name = "stock.picking.batch"
+    _inherit = ["stock.picking.batch", "bista.wms.change.journal.mixin"]
+
+
+class StockQuant(models.Model):
+    _name = "stock.quant"
+    _inherit = ["stock.quant", "bista.wms.change.journal.mixin"]
+
+
+class ResPartner(models.Model):
+    _name = "res.partner"
+    _inherit = ["res.partner", "bista.wms.change.journal.mixin"]
@@ -0,0 +1,93 @@
+import logging
+
+from odoo import api, models
+
+_logger = logging.getLogger(__name__)
+
+# Tables of the models synced by the API endpoints, indexed on write_date after the install or upgrade.
+DELTA_SYNC_TABLES = {
+    'ir.sequence': 'ir_sequence',
+    'product.packaging': 'product_packaging',
+    'product.product': 'product_product',
+    'product.template': 'product_template',
+    'res.partner': 'res_partner',
+    'stock.location': 'stock_location',
+    'stock.lot': 'stock_lot',
+    'stock.move': 'stock_move',
+    'stock.move.line': 'stock_move_line',
+    'stock.package.type': 'stock_package_type',
+    'stock.picking': 'stock_picking',
+    'stock.picking.batch': 'stock_picking_batch',
+    'stock.quant': 'stock_quant',
+    'stock.quant.package': 'stock_quant_package',
+}
+
+# Changes of child records that mark their parent as changed, as queries returning the parent ids.
+DELTA_SYNC_CHILD_QUERIES = {
+    'product.template': [
+        """SELECT product_tmpl_id FROM product_product
+            WHERE write_date >= %(since)s""",
+    ],
+    'stock.picking': [
+        """SELECT picking_id FROM stock_move
+            WHERE write_date >= %(since)s AND picking_id IS NOT NULL""",
+        """SELECT picking_id FROM stock_move_line
+            WHERE write_date >= %(since)s AND picking_id IS NOT NULL""",
+    ],
+    'stock.picking.batch': [
+        """SELECT batch_id FROM stock_picking
+            WHERE write_date >= %(since)s AND batch_id IS NOT NULL""",
+        """SELECT picking.batch_id FROM stock_move move
+             JOIN stock_picking picking ON picking.id = move.picking_id
+            WHERE move.write_date >= %(since)s AND picking.batch_id IS NOT NULL""",
+        """SELECT batch_id FROM stock_move_line
+            WHERE write_date >= %(since)s AND batch_id IS NOT NULL""",
+    ],
+}
+
+
+class BistaWmsDeltaSync(models.AbstractModel):
+    _name = "bista.wms.delta.sync"
+    _description = "WMS API Delta Sync"
+
+    def init(self):
+        # NOTE: a plain CREATE INDEX would block the writes on the stock tables for the whole upgrade, the
+        # indexes are built CONCURRENTLY once the upgrade is committed, which cannot run in its transaction.
+        self.env.cr.postcommit.add(self._create_write_date_indexes)
+
+    def _create_write_date_indexes(self):
+        with self.env.registry.cursor() as cr:
+            cr._cnx.autocommit = True
+            for table in DELTA_SYNC_TABLES.values():
+                index_name = '%s_write_date_index' % table
+                try:
+                    cr.execute("""
+                        SELECT i.indisvalid FROM pg_index i
+                          JOIN pg_class c ON c.oid = i.indexrelid
+                         WHERE c.relname = %s
+                    """, [index_name])
+                    row = cr.fetchone()
+                    if row and row[0]:
+                        continue
+                    if row:
+                        # An interrupted concurrent build leaves an invalid index behind.
+                        cr.execute('DROP INDEX CONCURRENTLY IF EXISTS "%s"' % index_name)
+                    cr.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS "%s" ON "%s" (write_date)' % (index_name, table))
+                    _logger.info("Created the delta sync index %s", index_name)
+                except Exception:
+                    _logger.exception("Error while creating the delta sync index %s", index_name)
+
+    @api.model
+    def _get_changed_ids(self, model_name, since):
+        """
+        Ids of the records of `model_name` created or updated since `since`.
+
+        NOTE: `write_date` is set on create as well, so it is enough to filter on it. Pickings are also
+        returned when one of their moves or move lines changed, batches when one of their pickings,
+        moves or move lines changed, templates when one of their variants changed.
+        """
+        self.env.flush_all()
+        queries = ["SELECT id FROM %s WHERE write_date >= %%(since)s" % self.env[model_name]._table]
+        queries += DELTA_SYNC_CHILD_QUERIES.get(model_name, [])
+        self.env.cr.execute(" UNION ".join(queries), {'since': since})
+        return [row[0] for row in self.env.cr.fetchall()]
@@ -0,0 +1,145 @@
+from collections import defaultdict
+
+from odoo import api, fields, models
+
+COUNTER_BUCKETS = [
+    ('draft', 'Draft'),
+    ('waiting', 'Waiting'),
+    ('ready', 'Ready'),
+    ('late', 'Late'),
+    ('backorder', 'Backorder'),
+]
+
+# Counter rows of the pickings filtered with `{where}`, as (picking_type_id, user_id, bucket, count).
+COUNTER_QUERY = """
+    SELECT picking_type_id, user_id, bucket, count(*)
+      FROM (
+            SELECT picking_type_id, user_id,
+                   CASE state WHEN 'draft' THEN 'draft' WHEN 'assigned' THEN 'ready' ELSE 'waiting' END AS bucket
+              FROM stock_picking
+             WHERE state IN ('draft', 'confirmed', 'waiting', 'assigned') AND {where}
+         UNION ALL
+            SELECT picking_type_id, user_id, 'late'
+              FROM stock_picking
+             WHERE state IN ('confirmed', 'waiting', 'assigned') AND {where}
+               AND scheduled_date < now() AT TIME ZONE 'UTC'
+         UNION ALL
+            SELECT picking_type_id, user_id, 'backorder'
+              FROM stock_picking
+             WHERE state IN ('confirmed', 'waiting', 'assigned') AND {where}
+               AND backorder_id IS NOT NULL
+           ) AS picking
+  GROUP BY picking_type_id, user_id, bucket
+"""
+
+
+class BistaWmsPickingCounter(models.Model):
+    _name = "bista.wms.picking.counter"
+    _description = "WMS API Picking Counter"
+    _log_access = False
+
+    # NOTE: every transaction changing pickings appends the difference of their counters as new rows, the
+    # counters are the sums of the rows. Rows are never updated, so concurrent transactions never conflict
+    # on them. The `picking_counter_cron` compacts the rows with a full recount, which refreshes the late
+    # bucket as well as it depends on the time.
+    picking_type_id = fields.Many2one("stock.picking.type", string="Operation Type", required=True,
+                                      index=True, ondelete="cascade", readonly=True)
+    user_id = fields.Many2one("res.users", string="Responsible", ondelete="cascade", readonly=True)
+    bucket = fields.Selection(COUNTER_BUCKETS, string="Bucket", required=True, readonly=True)
+    count = fields.Integer("Count", readonly=True)
+
+    def init(self):
+        # NOTE: the counters are built by the cron once the install or upgrade is committed, not in its
+        # transaction.
+        self.env.cr.postcommit.add(self._trigger_refresh)
+
+    def _trigger_refresh(self):
+        with self.env.registry.cursor() as cr:
+            cron = self.env(cr=cr).ref('bista_wms_api.picking_counter_cron', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+    @api.model
+    def _count_pickings(self, picking_ids):
+        """Counter rows of the pickings as stored in the database, ``{(picking_type_id, user_id, bucket): count}``"""
+        self.env.cr.execute(COUNTER_QUERY.format(where="id = ANY(%(ids)s)"), {'ids': list(picking_ids)})
+        return {(picking_type_id, user_id, bucket): count
+                for picking_type_id, user_id, bucket, count in self.env.cr.fetchall()}
+
+    @api.model
+    def _mark_pickings(self, pickings, created=False):
+        """
+        Add the changes of the counters of `pickings` at the end of the transaction.
+
+        To be called before the pickings change, their counters before the transaction are read from the
+        database the first time they are marked, `created` pickings had none.
+        """
+        data = self.env.cr.precommit.data
+        if "bista_wms_api.picking_counter" not in data:
+            self.env.cr.precommit.add(self._flush_pickings)
+        marked = data.setdefault("bista_wms_api.picking_counter", {'ids': set(), 'counts': defaultdict(int)})
+        picking_ids = set(pickings.filtered('id').ids) - marked['ids']
+        if not picking_ids:
+            return
+        marked['ids'].update(picking_ids)
+        if not created:
+            for key, count in self._count_pickings(picking_ids).items():
+                marked['counts'][key] += count
+
+    def _flush_pickings(self):
+        marked = self.env.cr.precommit.data.pop("bista_wms_api.picking_counter", None)
+        if not marked:
+            return
+        self.env['stock.picking'].flush_model(['picking_type_id', 'user_id', 'state', 'scheduled_date', 'backorder_id'])
+        deltas = defaultdict(int, self._count_pickings(marked['ids']))
+        for key, count in marked['counts'].items():
+            deltas[key] -= count
+        keys = [key for key, delta in deltas.items() if delta]
+        if not keys:
+            return
+        self.env.cr.execute("""
+            INSERT INTO bista_wms_picking_counter (picking_type_id, user_id, bucket, count)
+            SELECT picking_type_id, user_id, bucket, count
+              FROM unnest(%s::integer[], %s::integer[], %s::varchar[], %s::integer[])
+                AS delta(picking_type_id, user_id, bucket, count)
+        """, [
+            [picking_type_id for picking_type_id, user_id, bucket in keys],
+            [user_id for picking_type_id, user_id, bucket in keys],
+            [bucket for picking_type_id, user_id, bucket in keys],
+            [deltas[key] for key in keys],
+        ])
+        self.invalidate_model()
+
+    @api.model
+    def _refresh_counters(self):
+        """Rebuild the counters with a full recount of the pickings."""
+        self.env['stock.picking'].flush_model(['picking_type_id', 'user_id', 'state', 'scheduled_date', 'backorder_id'])
+        # NOTE: the rows appended by the transactions committed after the snapshot of this one are kept,
+        # as their changes are not part of the recount either.
+        self.env.cr.execute("DELETE FROM bista_wms_picking_counter")
+        self.env.cr.execute("""
+            INSERT INTO bista_wms_picking_counter (picking_type_id, user_id, bucket, count)
+        """ + COUNTER_QUERY.format(where="TRUE"))
+        self.invalidate_model()
+
+    @api.model
+    def _get_counters(self, picking_type_ids, user_id=None):
+        """
+        Counters of the picking types, of the pickings of `user_id` only when given.
+
+        :returns: ``{picking_type_id: {bucket: count}}``
+        """
+        query = """
+            SELECT picking_type_id, bucket, SUM(count)
+              FROM bista_wms_picking_counter
+             WHERE picking_type_id = ANY(%s)
+        """
+        params = [list(picking_type_ids)]
+        if user_id:
+            query += " AND user_id = %s"
+            params.append(user_id)
+        self.env.cr.execute(query + " GROUP BY picking_type_id, bucket", params)
+        counters = defaultdict(lambda: dict.fromkeys(dict(COUNTER_BUCKETS), 0))
+        for picking_type_id, bucket, count in self.env.cr.fetchall():
+            counters[picking_type_id][bucket] = count
+        return counters
@@ -1,5 +1,8 @@
 from odoo import fields, models, api, _
 
+# Fields of the pickings the `bista.wms.picking.counter` buckets depend on.
+PICKING_COUNTER_FIELDS = {'picking_type_id', 'user_id', 'state', 'scheduled_date', 'backorder_id'}
+
 
 class Picking(models.Model):
     _inherit = "stock.picking"
@@ -12,3 +15,32 @@ class Picking(models.Model):
             domain += [('user_id', '=', self.env.user.id)]
         res =  super()._read_group(domain, groupby, aggregates, having, offset, limit, order)
         return res
+
+    def _mark_picking_counters(self, created=False):
+        self.env['bista.wms.picking.counter'].sudo()._mark_pickings(self, created=created)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        pickings = super(Picking, self).create(vals_list)
+        pickings._mark_picking_counters(created=True)
+        return pickings
+
+    def write(self, vals):
+        if PICKING_COUNTER_FIELDS.intersection(vals):
+            # NOTE: marked before the write, the counters of the pickings are read before they change.
+            self._mark_picking_counters()
+        return super(Picking, self).write(vals)
+
+    def unlink(self):
+        self._mark_picking_counters()
+        return super(Picking, self).unlink()
+
+    def _compute_state(self):
+        # NOTE: the state is a stored computed field, its changes don't go through `write`.
+        self._mark_picking_counters()
+        return super(Picking, self)._compute_state()
+
+    def _compute_scheduled_date(self):
+        # NOTE: the scheduled date follows the moves, its changes don't go through `write` either.
+        self._mark_picking_counters()
+        return super(Picking, self)._compute_scheduled_date()
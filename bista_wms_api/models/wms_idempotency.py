@@ -0,0 +1,84 @@
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Advisory lock of an idempotency key, held by the request using it until its commit.
+IDEMPOTENCY_LOCK = 0x574d5349
+
+
+class BistaWmsIdempotencyKey(models.Model):
+    _name = "bista.wms.idempotency.key"
+    _description = "WMS API Idempotency Key"
+    _log_access = False
+
+    # NOTE: the response is stored in the transaction of the request, so a key is only stored with the
+    # effects of the request it answered, a request rolled back can be retried with the same key.
+    key = fields.Char("Key", required=True, readonly=True)
+    user_id = fields.Many2one("res.users", string="User", required=True, ondelete="cascade", readonly=True)
+    endpoint = fields.Char("Endpoint", required=True, readonly=True)
+    request_hash = fields.Char("Request Hash", required=True, readonly=True)
+    response_kind = fields.Selection([
+        ('response', 'HTTP Response'),
+        ('result', 'JSON Result'),
+    ], string="Response Kind", required=True, readonly=True)
+    response = fields.Text("Response", readonly=True)
+    status = fields.Integer("HTTP Status", readonly=True)
+    expiration_date = fields.Datetime("Expires On", required=True, index=True, readonly=True)
+
+    _sql_constraints = [
+        ('user_id_key_uniq', 'unique(user_id, key)', 'An idempotency key can only be used once per user.'),
+    ]
+
+    @api.model
+    def _lock(self, key):
+        """Wait for the request of the current user using `key`, if any, to commit or roll back."""
+        self.env.cr.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))",
+                            [IDEMPOTENCY_LOCK, "%s:%s" % (self.env.uid, key)])
+
+    @api.model
+    def _get_stored(self, key):
+        """
+        Stored response of `key` for the current user, None when there is none or when it expired.
+
+        NOTE: read in a new transaction, the one of the request may have started before the request
+        holding the lock committed.
+        """
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                SELECT endpoint, request_hash, response_kind, response, status
+                  FROM bista_wms_idempotency_key
+                 WHERE user_id = %s AND key = %s AND expiration_date > now() AT TIME ZONE 'UTC'
+            """, [self.env.uid, key])
+            return cr.dictfetchone()
+
+    @api.model
+    def _store(self, key, endpoint, request_hash, response_kind, response, status=None):
+        ttl_hours = self.env['bista.wms.settings']._get_settings().idempotency_ttl_hours
+        self.env.cr.execute("""
+            INSERT INTO bista_wms_idempotency_key
+                   (key, user_id, endpoint, request_hash, response_kind, response, status, expiration_date)
+            VALUES (%(key)s, %(user_id)s, %(endpoint)s, %(request_hash)s, %(response_kind)s, %(response)s,
+                    %(status)s, now() AT TIME ZONE 'UTC' + make_interval(hours => %(ttl_hours)s))
+            ON CONFLICT (user_id, key) DO UPDATE
+               SET endpoint = EXCLUDED.endpoint, request_hash = EXCLUDED.request_hash,
+                   response_kind = EXCLUDED.response_kind, response = EXCLUDED.response,
+                   status = EXCLUDED.status, expiration_date = EXCLUDED.expiration_date
+        """, {
+            'key': key,
+            'user_id': self.env.uid,
+            'endpoint': endpoint,
+            'request_hash': request_hash,
+            'response_kind': response_kind,
+            'response': response,
+            'status': status,
+            'ttl_hours': ttl_hours,
+        })
+
+    @api.autovacuum
+    def _gc_idempotency_keys(self):
+        self.env.cr.execute("""
+            DELETE FROM bista_wms_idempotency_key WHERE expiration_date <= now() AT TIME ZONE 'UTC'
+        """)
+        _logger.info("GC'd %d WMS idempotency keys", self.env.cr.rowcount)
@@ -0,0 +1,193 @@
+import json
+import logging
+from datetime import timedelta
+
+import werkzeug.wrappers
+
+from odoo import api, fields, models
+from odoo.http import serialize_exception
+
+from odoo.addons.bista_wms_api.common import job_request
+
+_logger = logging.getLogger(__name__)
+
+# Advisory locks: one per concurrency slot, one per running job (held by the runner until its commit).
+JOB_SLOT_LOCK = 0x574d534c
+JOB_RUN_LOCK = 0x574d5352
+# A job whose runner died that many times (e.g. killed by the time limit) is failed.
+JOB_MAX_ATTEMPTS = 3
+job_concurrency = "bista_wms_api.job_concurrency"
+job_retention_days = "bista_wms_api.job_retention_days"
+
+
+class BistaWmsJob(models.Model):
+    _name = "bista.wms.job"
+    _description = "WMS API Job"
+    _order = "id desc"
+
+    # NOTE: a job is `pending` until its runner commits, the runner holds the JOB_RUN_LOCK of the job while
+    # it runs so a job whose runner died is simply picked up again. The progress is written by the runner in
+    # its own transactions, in `bista.wms.job.progress`, so that the job row is only updated by the runner.
+    endpoint = fields.Char("Endpoint", required=True, readonly=True)
+    payload = fields.Text("Payload", readonly=True)
+    user_id = fields.Many2one("res.users", string="User", required=True, index=True, ondelete="cascade",
+                              readonly=True)
+    company_ids = fields.Many2many("res.company", string="Companies", readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string="State", default='pending', required=True, index=True, readonly=True)
+    result = fields.Text("Result", readonly=True)
+    error = fields.Text("Error", readonly=True)
+    date_done = fields.Datetime("Done On", readonly=True)
+
+    @api.model
+    def _enqueue(self, endpoint, payload):
+        """Create the job of the current user and wake up the runner."""
+        job = self.sudo().create({
+            'endpoint': endpoint,
+            'payload': payload,
+            'user_id': self.env.uid,
+            'company_ids': [(6, 0, self.env.companies.ids)],
+        })
+        self.env.ref('bista_wms_api.wms_job_cron').sudo()._trigger()
+        return job
+
+    @api.model
+    def _run_jobs(self, max_jobs=None):
+        """
+        Run the pending jobs, each one in its own transaction, until there is none left.
+
+        At most `bista_wms_api.job_concurrency` runners run jobs at the same time: the cron, and any
+        dedicated worker calling this method (e.g. from `odoo-bin shell`).
+        """
+        concurrency = int(self.env['ir.config_parameter'].sudo().get_param(job_concurrency, 2))
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            with self.env.registry.cursor() as cr:
+                Job = self.with_env(self.env(cr=cr, su=True))
+                job = Job._acquire_job(concurrency)
+                if not job:
+                    return processed
+                job._execute()
+            processed += 1
+        return processed
+
+    @api.model
+    def _acquire_job(self, concurrency):
+        for slot in range(concurrency):
+            self.env.cr.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", [JOB_SLOT_LOCK, slot])
+            if self.env.cr.fetchone()[0]:
+                break
+        else:
+            return self.browse()
+        # NOTE: the candidates are selected first, the lock function in the WHERE clause of the scan could be
+        # called on every pending row and leave them all locked. At most `concurrency` jobs are locked by the
+        # other runners, so one more candidate is enough to find a free one.
+        self.env.cr.execute("""
+            SELECT candidate.id
+              FROM (
+                    SELECT id
+                      FROM bista_wms_job
+                     WHERE state = 'pending'
+                  ORDER BY id
+                     LIMIT %s
+                   ) AS candidate
+             WHERE pg_try_advisory_xact_lock(%s, candidate.id)
+             LIMIT 1
+        """, [concurrency + 1, JOB_RUN_LOCK])
+        row = self.env.cr.fetchone()
+        return self.browse(row[0] if row else [])
+
+    def _execute(self):
+        self.ensure_one()
+        progress = self.env['bista.wms.job.progress']._get(self.id)
+        if progress.get('attempts', 0) >= JOB_MAX_ATTEMPTS:
+            self.write({'state': 'failed', 'error': "The job was interrupted %d times." % JOB_MAX_ATTEMPTS,
+                        'date_done': fields.Datetime.now()})
+            return
+        self.env['bista.wms.job.progress']._report(self.id, start=True)
+
+        env = self.env(user=self.user_id.id, su=False, context=dict(self.env.context,
+                                                                     allowed_company_ids=self.company_ids.ids))
+        try:
+            with self.env.cr.savepoint(), job_request(env, self.endpoint, self.payload or '', self) as req:
+                rule, args = env['ir.http'].routing_map().bind_to_environ(req.httprequest.environ).match(
+                    return_rule=True)
+                response = rule.endpoint(**args)
+        except Exception as e:
+            _logger.exception("Error while running WMS job %s", self.id)
+            self.write({'state': 'failed', 'error': serialize_exception(e).get('message') or str(e),
+                        'date_done': fields.Datetime.now()})
+            return
+        if isinstance(response, werkzeug.wrappers.Response):
+            response = json.loads(response.get_data() or 'null')
+        self.write({'state': 'done', 'result': json.dumps(response), 'date_done': fields.Datetime.now()})
+
+    def _get_status(self):
+        self.ensure_one()
+        progress = self.env['bista.wms.job.progress']._get(self.id)
+        state = self.state
+        if state == 'pending' and progress.get('date_started'):
+            state = 'running'
+        return {
+            'job_id': self.id,
+            'endpoint': self.endpoint,
+            'state': state,
+            'done': progress.get('done', 0),
+            'total': progress.get('total', 0),
+            'attempts': progress.get('attempts', 0),
+            'create_date': self.create_date,
+            'date_started': progress.get('date_started') or "",
+            'date_done': self.date_done or "",
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error or "",
+        }
+
+    @api.autovacuum
+    def _gc_jobs(self):
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(job_retention_days, 7))
+        jobs = self.search([
+            ('state', 'in', ('done', 'failed')),
+            ('date_done', '<', fields.Datetime.now() - timedelta(days=retention_days)),
+        ])
+        jobs.unlink()
+        _logger.info("GC'd %d WMS jobs", len(jobs))
+
+
+class BistaWmsJobProgress(models.Model):
+    _name = "bista.wms.job.progress"
+    _description = "WMS API Job Progress"
+    _log_access = False
+
+    job_id = fields.Many2one("bista.wms.job", string="Job", required=True, ondelete="cascade", readonly=True)
+    done = fields.Integer("Done", readonly=True)
+    total = fields.Integer("Total", readonly=True)
+    attempts = fields.Integer("Attempts", readonly=True)
+    date_started = fields.Datetime("Started On", readonly=True)
+
+    _sql_constraints = [
+        ('job_id_uniq', 'unique(job_id)', 'A job has one progress.'),
+    ]
+
+    @api.model
+    def _report(self, job_id, done=0, total=0, start=False):
+        """Write the progress of a job in its own transaction, readable while the job runs."""
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO bista_wms_job_progress (job_id, done, total, attempts, date_started)
+                VALUES (%(job_id)s, %(done)s, %(total)s, 1, now() AT TIME ZONE 'UTC')
+                ON CONFLICT (job_id) DO UPDATE
+                   SET done = EXCLUDED.done, total = EXCLUDED.total,
+                       attempts = bista_wms_job_progress.attempts + %(attempt)s,
+                       date_started = CASE WHEN %(start)s THEN EXCLUDED.date_started
+                                           ELSE bista_wms_job_progress.date_started END
+            """, {'job_id': job_id, 'done': done, 'total': total, 'start': start, 'attempt': 1 if start else 0})
+
+    @api.model
+    def _get(self, job_id):
+        self.env.cr.execute("""
+            SELECT done, total, attempts, date_started FROM bista_wms_job_progress WHERE job_id = %s
+        """, [job_id])
+        return self.env.cr.dictfetchone() or {}
@@ -0,0 +1,44 @@
+from odoo import api, fields, models
+
+
+class BistaWmsMetric(models.Model):
+    _name = "bista.wms.metric"
+    _description = "WMS API Metric"
+    _log_access = False
+
+    # NOTE: the workers aggregate their calls in memory and add them here periodically, see
+    # `common.instrumented`, so a row is the sum of a sample over all the workers since the install.
+    endpoint = fields.Char("Endpoint", required=True, readonly=True)
+    name = fields.Char("Name", required=True, readonly=True)
+    labels = fields.Char("Labels", required=True, default="", readonly=True)
+    value = fields.Float("Value", readonly=True)
+
+    _sql_constraints = [
+        ('endpoint_name_labels_uniq', 'unique(endpoint, name, labels)', 'A sample is stored once.'),
+    ]
+
+    @api.model
+    def _add_samples(self, samples):
+        """Add `samples` {(endpoint, name, labels): value} to the stored ones, in their own transaction."""
+        if not samples:
+            return
+        keys = sorted(samples)
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO bista_wms_metric (endpoint, name, labels, value)
+                SELECT endpoint, name, labels, value
+                  FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::float8[])
+                    AS sample(endpoint, name, labels, value)
+                ON CONFLICT (endpoint, name, labels) DO UPDATE
+                   SET value = bista_wms_metric.value + EXCLUDED.value
+            """, [
+                [endpoint for endpoint, name, labels in keys],
+                [name for endpoint, name, labels in keys],
+                [labels for endpoint, name, labels in keys],
+                [samples[key] for key in keys],
+            ])
+
+    @api.model
+    def _get_samples(self):
+        self.env.cr.execute("SELECT endpoint, name, labels, value FROM bista_wms_metric")
+        return {(endpoint, name, labels): value for endpoint, name, labels, value in self.env.cr.fetchall()}
@@ -0,0 +1,68 @@
+import ast
+from collections import namedtuple
+
+from odoo import api, models, tools
+
+from odoo.addons.bista_wms_api.tools.compression import DEFAULT_LEVEL, DEFAULT_THRESHOLD
+
+
+def _to_bool(value):
+    """Boolean parameters hold 'True'/'False' or '1'/'0', they are deleted when unchecked in the settings."""
+    if not value:
+        return False
+    try:
+        return bool(ast.literal_eval(value.strip()))
+    except (ValueError, SyntaxError):
+        return value.strip().lower() in ('true', 'yes', 'on')
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Settings attribute: (ir.config_parameter key, parser, value when missing or invalid)
+WMS_SETTINGS_PARAMS = {
+    # WMS
+    'http_status_code': ('bista_wms_api.http_status_code', _to_bool, False),
+    'user_check_restriction': ('bista_wms_api.user_check_restriction', _to_bool, False),
+    'restrict_stock_quants_in_location': ('bista_wms_api.restrict_stock_quants_in_location', _to_bool, False),
+    'wms_licensing_key': ('bista_wms_api.wms_licensing_key', str, ""),
+    'compression_threshold': ('bista_wms_api.compression_threshold', _to_int, DEFAULT_THRESHOLD),
+    'compression_level': ('bista_wms_api.compression_level', _to_int, DEFAULT_LEVEL),
+    'idempotency_ttl_hours': ('bista_wms_api.idempotency_ttl_hours', _to_int, 24),
+    # Search limit
+    'enable_search_limit': ('bista_wms_api.enable_search_limit', _to_bool, False),
+    'def_search_limit': ('bista_wms_api.def_search_limit', _to_int, None),
+    # Reports
+    'use_qr_code': ('bista_wms_reports.use_qr_code', _to_bool, False),
+    'use_qr_code_print_label': ('bista_wms_reports.use_qr_code_print_label', _to_bool, False),
+    'use_qr_code_picking_operations': ('bista_wms_reports.use_qr_code_picking_operations', _to_bool, False),
+    'use_qr_code_batch_operations': ('bista_wms_reports.use_qr_code_batch_operations', _to_bool, False),
+}
+
+WmsSettings = namedtuple('WmsSettings', list(WMS_SETTINGS_PARAMS))
+
+
+class BistaWmsSettings(models.AbstractModel):
+    _name = "bista.wms.settings"
+    _description = "WMS API Settings"
+
+    @api.model
+    @tools.ormcache()
+    def _get_settings(self):
+        """
+        Typed snapshot of the WMS configuration parameters, see `WMS_SETTINGS_PARAMS`.
+
+        NOTE: `ir.config_parameter` clears the registry caches when a parameter changes, so the
+        snapshot is read once per cache generation instead of once per use.
+        """
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        values = {}
+        for name, (key, parser, default) in WMS_SETTINGS_PARAMS.items():
+            value = IrConfigParameter.get_param(key)
+            value = parser(value) if value else None
+            values[name] = default if value is None else value
+        return WmsSettings(**values)
@@ -0,0 +1,2 @@
+from . import test_query_budgets
+from . import test_bench_api
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+import urllib.parse
+
+from odoo.tests import HttpCase, get_db_name, tagged
+
+from odoo.addons.bista_wms_api.tools.bench_api import _find_key, _get_scenarios, _git_commit, _percentile, \
+    _read_rss_kb, compare
+from odoo.addons.bista_wms_api.tools.bench_data import generate_warehouse
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install', '-standard', 'wms_bench')
+class TestBenchApi(HttpCase):
+    """
+    Latency, query count and memory of the routes of `controllers.py` on a synthetic warehouse (all of them but
+    the ones listed in `bench_api._get_scenarios`), run on demand:
+
+        WMS_BENCH_OUTPUT=results.json odoo-bin -d wms_bench -i bista_wms_api --test-tags wms_bench \\
+            --stop-after-init
+
+    `WMS_BENCH_SIZES` holds the keyword arguments of `bench_data.generate_warehouse` as JSON, e.g.
+    '{"products": 2000, "pickings": 300, "lines": 25}', `WMS_BENCH_ITERATIONS` and `WMS_BENCH_WARMUP` the calls
+    of each route. The results are written as JSON to `WMS_BENCH_OUTPUT`, `WMS_BENCH_COMPARE` prints the
+    change of each route against previous results (of this harness or of `tools/bench_api.py`).
+
+    The data and the POST routes changing it are rolled back at the end.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sizes = json.loads(os.environ.get('WMS_BENCH_SIZES') or '{}')
+        cls.iterations = int(os.environ.get('WMS_BENCH_ITERATIONS') or 20)
+        cls.warmup = int(os.environ.get('WMS_BENCH_WARMUP') or 2)
+        cls.dataset = generate_warehouse(cls.env, **cls.sizes)
+
+    def _request(self, method, path, payload, token=None):
+        """Return (response, seconds, queries run on the test cursor during the call)."""
+        headers = {'Accept-Encoding': 'gzip'}
+        if token:
+            headers['access-token'] = token
+        data = None
+        if method == 'GET' and payload:
+            path += '?' + urllib.parse.urlencode(payload)
+        elif method == 'POST':
+            data = json.dumps(payload or {})
+            headers['Content-Type'] = 'application/json'
+        # NOTE: the server runs the request on a test cursor wrapping the cursor of the test.
+        queries = self.cr.sql_log_count
+        start = time.perf_counter()
+        response = self.url_open(path, data=data, headers=headers, timeout=600)
+        return response, time.perf_counter() - start, self.cr.sql_log_count - queries
+
+    def _login(self):
+        response, _seconds, _queries = self._request('POST', '/api/auth/login', {
+            'db': get_db_name(), 'login': self.dataset['login'], 'password': self.dataset['password']})
+        token = _find_key(response.json(), 'access_token')
+        self.assertTrue(token, "Login of %s failed: %s" % (self.dataset['login'], response.text[:500]))
+        return token
+
+    def _run_scenario(self, token, method, path, payload):
+        for _i in range(self.warmup):
+            if method == 'GET':
+                self._request(method, path, payload(0), token)
+        timings, sizes, records, queries, errors = [], [], [], [], 0
+        for i in range(self.iterations):
+            data = payload(i)
+            if data is None:
+                break
+            response, seconds, query_count = self._request(method, path, data, token)
+            timings.append(seconds * 1000)
+            queries.append(query_count)
+            # Size as sent, compressed or not.
+            sizes.append(int(response.headers.get('Content-Length') or len(response.content)))
+            if response.headers.get('X-Record-Count'):
+                records.append(int(response.headers['X-Record-Count']))
+            if response.status_code >= 400:
+                errors += 1
+        result = {
+            'calls': len(timings),
+            'errors': errors,
+            'p50_ms': _percentile(timings, 50),
+            'p95_ms': _percentile(timings, 95),
+            'max_ms': max(timings) if timings else None,
+            'response_bytes': sum(sizes) / len(sizes) if sizes else None,
+            'records': sum(records) / len(records) if records else None,
+            'sql_queries': sum(queries) / len(queries) if queries else None,
+        }
+        # NOTE: one more call, traced apart as tracing the allocations slows the calls down.
+        if method == 'GET' and timings:
+            tracemalloc.start()
+            try:
+                self._request(method, path, payload(0), token)
+                result['peak_alloc_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+            finally:
+                tracemalloc.stop()
+        result['rss_kb'] = _read_rss_kb(os.getpid())
+        return result
+
+    def test_bench_api(self):
+        token = self._login()
+        results = {}
+        only = os.environ.get('WMS_BENCH_ONLY')
+        for name, endpoint, method, path, payload in _get_scenarios(self.dataset, with_posts=True):
+            if only and name not in only.split(','):
+                continue
+            result = dict(endpoint=endpoint, **self._run_scenario(token, method, path, payload))
+            results[name] = result
+            _logger.info("%-24s p50 %8.1f ms  p95 %8.1f ms  %8.1f queries  %10s bytes  %8s KB peak",
+                         name, result['p50_ms'] or 0, result['p95_ms'] or 0, result['sql_queries'] or 0,
+                         '%d' % result['response_bytes'] if result['response_bytes'] is not None else '-',
+                         result.get('peak_alloc_kb', '-'))
+
+        report = {
+            'commit': _git_commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'harness': 'HttpCase',
+            'encoding': 'gzip',
+            'iterations': self.iterations,
+            'dataset': self.dataset['sizes'],
+            'seed': self.dataset['seed'],
+            'results': results,
+        }
+        if os.environ.get('WMS_BENCH_OUTPUT'):
+            with open(os.environ['WMS_BENCH_OUTPUT'], 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+        if os.environ.get('WMS_BENCH_COMPARE'):
+            with open(os.environ['WMS_BENCH_COMPARE']) as previous_file:
+                compare(json.load(previous_file), report)
+        self.assertFalse([name for name, result in results.items() if not result['calls']],
+                         "Routes without any call")
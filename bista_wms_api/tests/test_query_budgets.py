@@ -0,0 +1,119 @@
+import logging
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.bista_wms_api.common import job_request
+from odoo.addons.bista_wms_api.controllers.controllers import BistaWmsApi
+from odoo.addons.bista_wms_api.tools.bench_data import generate_warehouse
+
+_logger = logging.getLogger(__name__)
+
+# Helper -> maximum number of queries serializing 10, 100 or 1000 records. The count must also be the same
+# at every size, an N+1 pattern grows it with the records.
+# NOTE: the counts of each run are logged, set the budget to the count logged when a helper changes.
+QUERY_BUDGETS = {
+    'get_picking_detail_response_data': 60,
+    'get_batch_detail_response_data': 70,
+    '_prepare_product_detail_data': 70,
+    '_get_product_packages': 40,
+    'get_location_detail_response_data': 35,
+    '_prepare_stock_lot_detail_data': 15,
+    '_prepare_stock_quants_data': 25,
+    '_get_res_partner': 15,
+}
+
+
+@tagged('post_install', '-at_install', '-standard', 'wms_query_budgets')
+class TestQueryBudgets(TransactionCase):
+    """
+    Query counts of the serializer helpers of the controllers on a synthetic warehouse, see `bench_data.py`.
+
+    The warehouse takes a few minutes to generate, the test is run on demand:
+
+        odoo-bin -d wms_test -i bista_wms_api --test-tags wms_query_budgets --stop-after-init
+    """
+
+    SIZES = (10, 100, 1000)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        size = max(cls.SIZES)
+        cls.dataset = generate_warehouse(
+            cls.env, products=size, variant_ratio=0.05, lot_ratio=0.5, location_depth=3,
+            location_branching=int(round(size ** (1 / 3.0))) + 1, quants=2, packages=size, pickings=2 * size,
+            lines=3, batches=size, waves=size // 10)
+        cls.env['res.partner'].create([
+            {'name': "Bench Partner %05d" % index, 'city': "Bench"} for index in range(size)])
+        cls.env.flush_all()
+        cls.api = BistaWmsApi()
+        cls.warehouse = cls.env['stock.warehouse'].browse(cls.dataset['warehouse_id'])
+
+    def setUp(self):
+        super().setUp()
+        # NOTE: the helpers read the current request, a job request of the user of the dataset stands in for it.
+        user = self.env['res.users'].search([('login', '=', self.dataset['login'])])
+        self.user_env = self.env(user=user.id, su=False)
+        self.enterContext(job_request(self.user_env, '/api/query_budgets', '', None))
+
+    def assertQueryBudget(self, name, records, func):
+        """Serialize the first 10, 100 and 1000 `records` with `func` in the same count within the budget of `name`."""
+        self.assertGreaterEqual(len(records), max(self.SIZES), "Not enough fixtures for %s" % name)
+        # Warm the registry caches (groups, settings) up, they are not part of the budget.
+        func(records.browse(records.ids[:min(self.SIZES)]))
+        counts = {}
+        for size in self.SIZES:
+            self.env.invalidate_all()
+            # NOTE: browsed again, a slice would prefetch the fields of all the fixtures.
+            sample = records.browse(records.ids[:size])
+            queries = self.cr.sql_log_count
+            func(sample)
+            counts[size] = self.cr.sql_log_count - queries
+        _logger.info("%s: %s queries (budget %d)", name,
+                     ", ".join("%d at %d records" % (counts[size], size) for size in self.SIZES), QUERY_BUDGETS[name])
+        self.assertEqual(counts[max(self.SIZES)], counts[min(self.SIZES)],
+                         "%s runs more queries with more records: %s" % (name, counts))
+        self.assertLessEqual(max(counts.values()), QUERY_BUDGETS[name],
+                             "%s exceeds its budget: %s" % (name, counts))
+
+    def test_picking_detail(self):
+        pickings = self.user_env['stock.picking'].search(
+            [('picking_type_id.warehouse_id', '=', self.warehouse.id)], order='id')
+        self.assertQueryBudget('get_picking_detail_response_data', pickings,
+                               lambda records: self.api.get_picking_detail_response_data(self.api, [], records))
+
+    def test_batch_detail(self):
+        batches = self.user_env['stock.picking.batch'].search(
+            [('picking_type_id.warehouse_id', '=', self.warehouse.id)], order='id')
+        self.assertQueryBudget('get_batch_detail_response_data', batches,
+                               lambda records: self.api.get_batch_detail_response_data(self.api, records, []))
+
+    def test_product_detail(self):
+        templates = self.user_env['product.template'].search([('name', '=like', 'Bench Product %')], order='id')
+        self.assertQueryBudget('_prepare_product_detail_data', templates,
+                               lambda records: self.api._prepare_product_detail_data(self.api, records))
+
+    def test_product_packages(self):
+        packages = self.user_env['stock.quant.package'].search([('name', '=like', 'BENCH-PACK-%')], order='id')
+        self.assertQueryBudget('_get_product_packages', packages,
+                               lambda records: self.api._get_product_packages(self.api, records))
+
+    def test_location_detail(self):
+        locations = self.user_env['stock.location'].search([('barcode', '=like', 'BENCH-LOC-%')], order='id')
+        self.assertQueryBudget('get_location_detail_response_data', locations,
+                               self.api.get_location_detail_response_data)
+
+    def test_stock_lot_detail(self):
+        lots = self.user_env['stock.lot'].search([('name', '=like', 'LOT-%')], order='id')
+        self.assertQueryBudget('_prepare_stock_lot_detail_data', lots, self.api._prepare_stock_lot_detail_data)
+
+    def test_stock_quants(self):
+        quants = self.user_env['stock.quant'].search(
+            [('location_id.warehouse_id', '=', self.warehouse.id)], order='id')
+        self.assertQueryBudget('_prepare_stock_quants_data', quants,
+                               lambda records: self.api._prepare_stock_quants_data(self.api, records))
+
+    def test_res_partner(self):
+        partners = self.user_env['res.partner'].search([('name', '=like', 'Bench Partner %')], order='id')
+        self.assertQueryBudget('_get_res_partner', partners,
+                               lambda records: self.api._get_res_partner(self.api, records, {}, []))
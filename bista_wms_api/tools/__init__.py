@@ -0,0 +1,2 @@
+from . import compression
+from . import metrics
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Latency and query count of the API routes on a synthetic warehouse, against a running server.
+
+The harness of the module is `tests/test_bench_api.py`, an `HttpCase` generating the warehouse and counting
+the queries in-process. This script measures a server as deployed (workers, proxy, network) instead, and
+shares its scenarios and JSON results with it.
+
+Generate the warehouse with `bench_data.py` (it writes `dataset.json`), start the server, then run
+
+    python3 bista_wms_api/tools/bench_api.py http://localhost:8069 -d wms_bench --dataset dataset.json \\
+        --admin-login admin --admin-password admin -o results.json
+
+Every GET route of `controllers.py` is called `--iterations` times with payloads taken from the dataset,
+the POST routes as well with `--with-posts` (they validate, pack and update the receipts and batches, adjust
+the inventory and rename the user of the dataset, regenerate it afterwards). The routes left out are listed
+in `_get_scenarios`. For each route the p50/p95/max latency, the response size and the
+number of records are reported. With an administrator login, the SQL queries and SQL time per call are
+taken from `/api/metrics` before and after each route: run the benchmark alone on a server started with
+`--workers=0`, as the metrics of the other workers are only stored every minute. With `--server-pid` the
+resident memory of the server after each route, and its growth during the route, are reported as well.
+
+The results are written as JSON, `--compare` prints the change of each route against a previous run.
+"""
+import argparse
+import json
+import math
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+PREFIX = 'bista_wms_api_'
+
+
+def _get_scenarios(dataset, with_posts):
+    """
+    (name, endpoint function, method, path, payload function of the iteration), a payload function returns
+    None when the route has no payload left.
+
+    Left out: `/api/auth/login` (called once for the token, each call creates one), DELETE `/api/auth/token`
+    (revokes the token of the run) and `/api/label/download`, `/api/report/download` (they time the PDF
+    renderer rather than the API).
+    """
+    def pick(key):
+        values = dataset.get(key) or [0]
+        return lambda i: values[i % len(values)]
+
+    product_barcode, location_barcode = pick('product_barcodes'), pick('location_barcodes')
+    lot_name, package_name = pick('lot_names'), pick('package_names')
+    delivery_id, batch_id, wave_id = pick('delivery_ids'), pick('batch_ids'), pick('wave_ids')
+    template_id, product_id, location_id = pick('product_template_ids'), pick('product_ids'), pick('location_ids')
+    job_id = pick('job_ids')
+    scenarios = [
+        ('user_detail', 'get_user_detail', 'GET', '/api/user_detail', lambda i: {}),
+        ('dashboard', 'get_dashboard_today_stock_and_receipt', 'GET',
+         '/api/get_dashboard_today_stock_and_receipt', lambda i: {}),
+        ('picking_detail', 'get_picking_detail', 'GET', '/api/get_picking_detail',
+         lambda i: {'picking_id': delivery_id(i)}),
+        ('picking_list', 'get_picking_detail', 'GET', '/api/get_picking_detail', lambda i: {'limit': 80}),
+        ('picking_move_ids', 'get_picking_move_ids', 'GET', '/api/get_picking_move_ids',
+         lambda i: {'picking_id': delivery_id(i)}),
+        ('batch_detail', 'get_batch_detail', 'GET', '/api/get_batch_detail', lambda i: {'batch_id': batch_id(i)}),
+        ('wave_detail', 'get_batch_detail', 'GET', '/api/get_batch_detail',
+         lambda i: {'batch_id': wave_id(i), 'is_wave': 'true'}),
+        ('product_detail', 'get_product_detail', 'GET', '/api/get_product_detail',
+         lambda i: {'barcode': product_barcode(i)}),
+        ('product_list', 'get_product_detail', 'GET', '/api/get_product_detail', lambda i: {'limit': 80}),
+        ('product_list_deprecated', 'get_product_list', 'GET', '/api/get_product_list', lambda i: {}),
+        ('product_image', 'get_product_image', 'GET', None, lambda i: {}),
+        ('stock_lot_detail', 'get_stock_lot_detail', 'GET', '/api/get_stock_lot_detail',
+         lambda i: {'barcode': lot_name(i)}),
+        ('location_detail', 'get_location_detail', 'GET', '/api/get_location_detail',
+         lambda i: {'barcode': location_barcode(i)}),
+        ('location_list', 'get_location_detail', 'GET', '/api/get_location_detail', lambda i: {'limit': 80}),
+        ('putaway_rule', 'get_putaway_rule', 'GET', '/api/get_putaway_rule', lambda i: {}),
+        ('sync_barcode_data', 'sync_barcode_data', 'GET', '/api/sync_barcode_data', lambda i: {'stream': 1}),
+        ('change_journal', 'change_journal', 'GET', '/api/change_journal', lambda i: {}),
+        ('product_package_type', 'get_product_package_type', 'GET', '/api/get_product_package_type', lambda i: {}),
+        ('product_packages', 'get_product_packages', 'GET', '/api/get_product_packages',
+         lambda i: {'package': package_name(i)}),
+        ('package_sequence', 'get_package_sequence', 'GET', '/api/get_package_sequence', lambda i: {}),
+        ('packaging_type_detail', 'get_packaging_type_detail', 'GET', '/api/get_packaging_type_detail',
+         lambda i: {}),
+        ('stock_quants', 'get_stock_quants', 'GET', '/api/get_stock_quants', lambda i: {'limit': 80}),
+        ('res_partner_info', 'get_res_partner_info', 'GET', '/api/get_res_partner_info', lambda i: {'limit': 80}),
+        ('wms_config_settings', 'get_wms_config_settings', 'GET', '/api/get_wms_config_settings', lambda i: {}),
+        ('wms_settings', 'get_wms_settings', 'GET', '/api/get_wms_settings', lambda i: {}),
+        ('wms_search', 'get_wms_search', 'GET', '/api/get_wms_search',
+         lambda i: {'type': 'product', 'value': 'Bench'}),
+        ('bootstrap', 'bootstrap', 'GET', '/api/bootstrap', lambda i: {}),
+        ('job_status', 'job_status', 'GET', '/api/job_status', lambda i: {'job_id': job_id(i)}),
+        ('metrics', 'metrics', 'GET', '/api/metrics', lambda i: {}),
+    ]
+    # NOTE: the image route takes the template and the size in its path.
+    scenarios = [
+        (name, endpoint, method, path or '/api/product_image/%s/128' % template_id(0), payload)
+        for name, endpoint, method, path, payload in scenarios
+    ]
+    if with_posts:
+        # NOTE: a receipt or a batch is changed by one route only, they are split between the routes.
+        receipt_ids = list(dataset.get('receipt_ids') or [])
+        lines_by_receipt = dict(zip(receipt_ids, dataset.get('receipt_lines') or []))
+        receipts, batch_receipts, packed_receipts, synced_receipts = (receipt_ids[index::4] for index in range(4))
+        batch_ids = list(dataset.get('batch_ids') or [])
+        batches, synced_batches = batch_ids[0::2], batch_ids[1::2]
+
+        def take(values, count):
+            taken, values[:count] = values[:count], []
+            return taken
+
+        def move_lines(picking_id):
+            return [{'id': line_id, 'product_id': line_product_id, 'quantity_done': quantity}
+                    for line_id, line_product_id, quantity in lines_by_receipt.get(picking_id, [])]
+
+        def batch_picking_payload(i):
+            picking_ids = take(batch_receipts, 5)
+            if not picking_ids:
+                return None
+            return {'data': [{'picking_id': picking_id, 'move_line_ids': []} for picking_id in picking_ids]}
+
+        def sync_batch_payload(i):
+            synced_batch_ids = take(synced_batches, 3)
+            if not synced_batch_ids:
+                return None
+            return {'data': [{'batch_id': synced_batch_id} for synced_batch_id in synced_batch_ids]}
+
+        def put_in_pack_payload(i):
+            picking_ids = take(packed_receipts, 1)
+            if not picking_ids:
+                return None
+            return {'picking_id': picking_ids[0], 'move_line_ids': move_lines(picking_ids[0])}
+
+        def sync_move_line_payload(i):
+            picking_ids = take(synced_receipts, 1)
+            if not picking_ids:
+                return None
+            return {'data': [{'picking_id': picking_ids[0], 'move_line_ids': move_lines(picking_ids[0])}]}
+
+        scenarios += [
+            ('post_stock_quants', 'post_stock_quants', 'POST', '/api/post_stock_quants', lambda i: {
+                'stock_quant': [{
+                    'product_id': product_id(i * 10 + row),
+                    'location_id': location_id(i * 10 + row),
+                    'inventory_quantity': 100 + i,
+                } for row in range(10)],
+            }),
+            # NOTE: each receipt is validated once, without lines the reserved quantities are done.
+            ('post_picking_validate', 'post_picking_validate', 'POST', '/api/post_picking_validate',
+             lambda i: {'picking_id': receipts.pop(0), 'move_line_ids': []} if receipts else None),
+            ('batch_post_picking_validate', 'batch_post_picking_validate', 'POST',
+             '/api/batch_post_picking_validate', batch_picking_payload),
+            # NOTE: the batches are validated once as well, with the quantities reserved for their deliveries.
+            ('post_batch_validate', 'post_batch_validate', 'POST', '/api/post_batch_validate',
+             lambda i: {'batch_id': batches.pop(0)} if batches else None),
+            ('sync_batch_post_picking_validate', 'sync_batch_post_picking_validate', 'POST',
+             '/api/sync_batch_post_picking_validate', sync_batch_payload),
+            ('post_put_in_pack', 'post_put_in_pack', 'POST', '/api/post_put_in_pack', put_in_pack_payload),
+            ('post_sync_move_line', 'post_sync_move_line', 'POST', '/api/post_sync_move_line',
+             sync_move_line_payload),
+            ('post_user_detail', 'post_user_detail', 'POST', '/api/user_detail',
+             lambda i: {'data': {'name': "WMS Bench %d" % i}}),
+        ]
+    return scenarios
+
+
+class Client:
+
+    def __init__(self, base_url, encoding):
+        self.base_url = base_url.rstrip('/')
+        self.encoding = encoding
+        self.token = None
+
+    def request(self, method, path, payload=None):
+        """Return (status, body bytes as received, headers, seconds)."""
+        headers = {'Accept-Encoding': self.encoding}
+        if self.token:
+            headers['access-token'] = self.token
+        url = self.base_url + path
+        data = None
+        if method == 'GET' and payload:
+            url += '?' + urllib.parse.urlencode(payload)
+        elif method == 'POST':
+            data = json.dumps(payload or {}).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(url, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as response:
+                body = response.read()
+                status, response_headers = response.status, response.headers
+        except urllib.error.HTTPError as e:
+            body, status, response_headers = e.read(), e.code, e.headers
+        return status, body, response_headers, time.perf_counter() - start
+
+    def login(self, db, login, password):
+        status, body, _headers, _seconds = self.request('POST', '/api/auth/login', {
+            'db': db, 'login': login, 'password': password})
+        token = _find_key(json.loads(body or b'null'), 'access_token')
+        if not token:
+            raise SystemExit("Login of %s failed (%s): %s" % (login, status, body[:500]))
+        self.token = token
+
+
+def _find_key(data, key):
+    if isinstance(data, dict):
+        if data.get(key):
+            return data[key]
+        data = list(data.values())
+    if isinstance(data, list):
+        for value in data:
+            found = _find_key(value, key)
+            if found:
+                return found
+    return None
+
+
+def _read_metrics(client):
+    """{endpoint: {sample name: value}} of the query histograms of `/api/metrics`, None when unavailable."""
+    if not client:
+        return None
+    status, body, _headers, _seconds = client.request('GET', '/api/metrics')
+    if status != 200 or not body.startswith(b'#'):
+        return None
+    metrics = {}
+    for line in body.decode().splitlines():
+        if line.startswith('#') or '{' not in line:
+            continue
+        name, rest = line.split('{', 1)
+        labels, value = rest.rsplit('} ', 1)
+        if 'le=' in labels or 'user=' in labels:
+            continue
+        endpoint = labels.split('endpoint="', 1)[1].split('"', 1)[0]
+        metrics.setdefault(endpoint, {})[name[len(PREFIX):]] = float(value)
+    return metrics
+
+
+def _read_rss_kb(pid):
+    """Resident memory of the server process `pid` (Linux), None when not given or not readable."""
+    if not pid:
+        return None
+    try:
+        with open('/proc/%s/status' % pid) as status_file:
+            for line in status_file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return None
+    # Nearest rank
+    return values[max(math.ceil(percent / 100.0 * len(values)) - 1, 0)]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    with open(args.dataset) as dataset_file:
+        dataset = json.load(dataset_file)
+    client = Client(args.url, args.encoding)
+    client.login(args.db, args.login or dataset['login'], args.password or dataset['password'])
+    admin = None
+    if args.admin_login:
+        admin = Client(args.url, 'identity')
+        admin.login(args.db, args.admin_login, args.admin_password)
+
+    scenarios = _get_scenarios(dataset, args.with_posts)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario[0] in args.only.split(',')]
+    results = {}
+    for name, endpoint, method, path, payload in scenarios:
+        for _i in range(args.warmup):
+            if method == 'GET':
+                client.request(method, path, payload(0))
+        before = _read_metrics(admin)
+        rss_before = _read_rss_kb(args.server_pid)
+        timings, sizes, records, errors = [], [], [], 0
+        for i in range(args.iterations):
+            data = payload(i)
+            if data is None:
+                break
+            status, body, headers, seconds = client.request(method, path, data)
+            timings.append(seconds * 1000)
+            sizes.append(len(body))
+            if headers.get('X-Record-Count'):
+                records.append(int(headers['X-Record-Count']))
+            if status >= 400:
+                errors += 1
+        after = _read_metrics(admin)
+        rss_after = _read_rss_kb(args.server_pid)
+        result = {
+            'endpoint': endpoint,
+            'calls': len(timings),
+            'errors': errors,
+            'p50_ms': _percentile(timings, 50),
+            'p95_ms': _percentile(timings, 95),
+            'max_ms': max(timings) if timings else None,
+            'response_bytes': sum(sizes) / len(sizes) if sizes else None,
+            'records': sum(records) / len(records) if records else None,
+        }
+        if rss_after is not None:
+            result['rss_kb'] = rss_after
+            result['rss_growth_kb'] = rss_after - rss_before
+        if before is not None and after is not None:
+            delta = {
+                key: after.get(endpoint, {}).get(key, 0) - before.get(endpoint, {}).get(key, 0)
+                for key in ('request_sql_queries_sum', 'request_sql_queries_count', 'request_sql_seconds_sum')
+            }
+            # NOTE: `/api/metrics` only holds the calls the workers already stored, counted calls are used.
+            if delta['request_sql_queries_count']:
+                result['sql_queries'] = delta['request_sql_queries_sum'] / delta['request_sql_queries_count']
+                result['sql_ms'] = delta['request_sql_seconds_sum'] * 1000 / delta['request_sql_queries_count']
+        results[name] = result
+        print("%-24s p50 %8.1f ms  p95 %8.1f ms  %10s queries  %10s bytes" % (
+            name, result['p50_ms'] or 0, result['p95_ms'] or 0,
+            '%.1f' % result['sql_queries'] if 'sql_queries' in result else '-',
+            '%d' % result['response_bytes'] if result['response_bytes'] is not None else '-'), file=sys.stderr)
+
+    return {
+        'commit': _git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'url': args.url,
+        'encoding': args.encoding,
+        'iterations': args.iterations,
+        'dataset': dataset.get('sizes', {}),
+        'seed': dataset.get('seed'),
+        'results': results,
+    }
+
+
+def compare(previous, current):
+    print("%-24s %12s %12s %8s %12s %12s" % ("route", "p95 before", "p95 after", "change", "queries bef.",
+                                             "queries aft."))
+    for name, result in current['results'].items():
+        old = previous['results'].get(name)
+        if not old:
+            continue
+        change = (result['p95_ms'] / old['p95_ms'] - 1) * 100 if old.get('p95_ms') and result.get('p95_ms') else 0
+        print("%-24s %12.1f %12.1f %+7.0f%% %12s %12s" % (
+            name, old.get('p95_ms') or 0, result.get('p95_ms') or 0, change,
+            '%.1f' % old['sql_queries'] if 'sql_queries' in old else '-',
+            '%.1f' % result['sql_queries'] if 'sql_queries' in result else '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', help="base URL of the server")
+    parser.add_argument('-d', '--db', required=True, help="database holding the dataset")
+    parser.add_argument('--dataset', required=True, help="dataset written by bench_data.generate_warehouse")
+    parser.add_argument('--login', help="login of the calls, the user of the dataset by default")
+    parser.add_argument('--password')
+    parser.add_argument('--admin-login', help="administrator reading /api/metrics for the query counts")
+    parser.add_argument('--admin-password')
+    parser.add_argument('--server-pid', help="pid of the server (local, --workers=0) to report its memory")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2, help="calls of each GET route before measuring it")
+    parser.add_argument('--encoding', default='gzip', help="Accept-Encoding of the calls")
+    parser.add_argument('--only', help="comma separated scenarios to run")
+    parser.add_argument('--with-posts', action='store_true', help="also run the POST routes (changes the data)")
+    parser.add_argument('-o', '--output', help="JSON results file, stdout by default")
+    parser.add_argument('--compare', help="previous JSON results to compare with")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as previous_file:
+            compare(json.load(previous_file), results)
+
+
+if __name__ == '__main__':
+    main()
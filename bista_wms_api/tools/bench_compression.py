@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Bandwidth/CPU trade-off of the response compression on recorded payloads.
+
+Record API responses as they are sent to the devices (uncompressed), e.g.
+
+    curl -H "access-token: $TOKEN" -H "Accept-Encoding: identity" \\
+        "$HOST/api/sync_barcode_data" -o corpus/sync_barcode_data.json
+
+then run
+
+    python3 bista_wms_api/tools/bench_compression.py corpus/ --levels 1,6,9 --link-mbps 5
+
+For every payload, encoding and level it reports the compression ratio, the compression and
+decompression throughput and the time to send the payload over a link of `--link-mbps` (compression
+time included), to choose `bista_wms_api.compression_level` and `bista_wms_api.compression_threshold`.
+"""
+import argparse
+import os
+import time
+import zlib
+
+from compression import ENCODINGS, compress
+
+
+def _best_time(func, repeat):
+    best = None
+    for _i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _load_corpus(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                file_path = os.path.join(path, name)
+                if os.path.isfile(file_path):
+                    yield file_path
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='+', help="recorded payload files or directories")
+    parser.add_argument('--levels', default='1,6,9', help="comma separated compression levels")
+    parser.add_argument('--link-mbps', type=float, default=5.0, help="bandwidth of the device link")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measure, the best one is kept")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(',')]
+    link_bytes_per_second = args.link_mbps * 1000 * 1000 / 8
+
+    print("%-32s %-8s %5s %12s %12s %8s %10s %10s %10s" % (
+        "payload", "encoding", "level", "size", "compressed", "ratio", "comp MB/s", "decomp MB/s", "send (s)"))
+    for path in _load_corpus(args.corpus):
+        with open(path, 'rb') as payload_file:
+            payload = payload_file.read()
+        name = os.path.basename(path)[:32]
+        print("%-32s %-8s %5s %12d %12d %8.2f %10s %10s %10.2f" % (
+            name, "identity", "-", len(payload), len(payload), 1.0, "-", "-", len(payload) / link_bytes_per_second))
+        for encoding in ENCODINGS:
+            wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+            for level in levels:
+                compress_time, (body, _encoding) = _best_time(
+                    lambda: compress(payload, encoding, threshold=0, level=level), args.repeat)
+                decompress_time, _data = _best_time(lambda: zlib.decompress(body, wbits), args.repeat)
+                print("%-32s %-8s %5d %12d %12d %8.2f %10.1f %10.1f %10.2f" % (
+                    name, encoding, level, len(payload), len(body), len(payload) / max(len(body), 1),
+                    len(payload) / compress_time / 1e6 if compress_time else 0.0,
+                    len(payload) / decompress_time / 1e6 if decompress_time else 0.0,
+                    compress_time + len(body) / link_bytes_per_second,
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Synthetic warehouse for the benchmarks of the API, see `bench_api.py`.
+
+Run it in an Odoo shell on a disposable database where `bista_wms_api` is installed:
+
+    odoo-bin shell -d wms_bench --no-http <<EOF
+    import json
+    from odoo.addons.bista_wms_api.tools.bench_data import generate_warehouse
+    dataset = generate_warehouse(env, products=2000, pickings=300, lines=25)
+    env.cr.commit()
+    json.dump(dataset, open('dataset.json', 'w'), indent=1)
+    EOF
+
+The data only depends on the sizes and the `seed`, so runs on two commits compare the same warehouse.
+The returned dataset holds the sizes and samples of the generated ids/barcodes used as request payloads.
+"""
+import json
+import random
+
+from odoo import fields
+from odoo.fields import Command
+
+BENCH_PASSWORD = "wms-bench"
+
+
+def _product_type_vals(env):
+    # NOTE: storable products are `type='product'` up to Odoo 17, `is_storable` from Odoo 18.
+    if 'is_storable' in env['product.template']._fields:
+        return {'type': 'consu', 'is_storable': True}
+    return {'type': 'product'}
+
+
+def _create_locations(env, parent, depth, branching, prefix, result):
+    if not depth:
+        return
+    locations = env['stock.location'].create([{
+        'name': "%s-%02d" % (prefix, index),
+        'location_id': parent.id,
+        'usage': 'internal',
+        'barcode': "BENCH-LOC-%s-%02d" % (prefix, index),
+    } for index in range(branching)])
+    result.extend(locations)
+    for location in locations:
+        _create_locations(env, location, depth - 1, branching, location.name, result)
+
+
+def generate_warehouse(env, products=500, variants=3, variant_ratio=0.1, lot_ratio=0.2, lots=5,
+                       location_depth=3, location_branching=4, quants=4, packages=100, pickings=100, lines=10,
+                       batches=10, waves=5, seed=42):
+    """
+    Create a warehouse with its user and the given number of records.
+
+    :param products: product templates, `variant_ratio` of them have `variants` variants
+    :param lot_ratio: share of the products tracked by lot, with `lots` lots each
+    :param location_depth: levels of the internal location tree under the stock location
+    :param location_branching: children of each location of the tree
+    :param quants: quants of each product variant, in random leaf locations
+    :param packages: packages holding the first quants
+    :param pickings: receipts and deliveries (half each) of `lines` lines
+    :param batches: batch transfers of the deliveries, `waves` of them are waves
+    :return: dataset dict, JSON serializable
+    """
+    rng = random.Random(seed)
+    env = env(su=True, context=dict(env.context, tracking_disable=True, mail_create_nolog=True))
+    company = env.company
+    code = "B%03d" % rng.randrange(1000)
+    warehouse = env['stock.warehouse'].create({'name': "Bench %s" % code, 'code': code, 'company_id': company.id})
+
+    user = env['res.users'].create({
+        'name': "WMS Bench %s" % code,
+        'login': "wms_bench_%s" % code.lower(),
+        'password': BENCH_PASSWORD,
+        'company_id': company.id,
+        'company_ids': [Command.set(company.ids)],
+        'warehouse_id': warehouse.id,
+        # NOTE: the settings group for `/api/metrics`, no other route depends on it.
+        'groups_id': [Command.link(env.ref('base.group_system').id),
+                      Command.link(env.ref('stock.group_stock_manager').id),
+                      Command.link(env.ref('stock.group_production_lot').id),
+                      Command.link(env.ref('stock.group_tracking_lot').id)],
+    })
+
+    # Location tree
+    locations = []
+    _create_locations(env, warehouse.lot_stock_id, location_depth, location_branching, code, locations)
+    leaves = [location for location in locations if not location.child_ids] or [warehouse.lot_stock_id]
+
+    # Products, variants and lots
+    attribute = env['product.attribute'].create({
+        'name': "Bench Size %s" % code,
+        'value_ids': [Command.create({'name': "S%d" % index}) for index in range(variants)],
+    })
+    type_vals = _product_type_vals(env)
+    templates = env['product.template'].create([dict(type_vals, **{
+        'name': "Bench Product %s %05d" % (code, index),
+        'default_code': "BENCH-%s-%05d" % (code, index),
+        'tracking': 'lot' if rng.random() < lot_ratio else 'none',
+        'list_price': round(rng.uniform(1, 500), 2),
+        'attribute_line_ids': [Command.create({
+            'attribute_id': attribute.id,
+            'value_ids': [Command.set(attribute.value_ids.ids)],
+        })] if rng.random() < variant_ratio else [],
+    }) for index in range(products)])
+    variants_all = templates.product_variant_ids
+    for index, product in enumerate(variants_all):
+        product.barcode = "BENCH%s%07d" % (code, index)
+    tracked = variants_all.filtered(lambda product: product.tracking == 'lot')
+    stock_lots = env['stock.lot'].create([{
+        'name': "LOT-%s-%d-%d" % (code, product.id, index),
+        'product_id': product.id,
+        'company_id': company.id,
+    } for product in tracked for index in range(lots)])
+    lots_by_product = {}
+    for lot in stock_lots:
+        lots_by_product.setdefault(lot.product_id.id, []).append(lot)
+
+    # Quants, the first ones in packages
+    quant_packages = env['stock.quant.package'].create([{
+        'name': "BENCH-PACK-%s-%05d" % (code, index),
+    } for index in range(packages)])
+    Quant = env['stock.quant']
+    quant_count = 0
+    for product in variants_all:
+        for _index in range(quants):
+            lot = rng.choice(lots_by_product[product.id]) if product.id in lots_by_product else None
+            package = quant_packages[quant_count] if quant_count < len(quant_packages) else None
+            Quant._update_available_quantity(product, rng.choice(leaves), rng.randint(10, 1000),
+                                             lot_id=lot, package_id=package)
+            quant_count += 1
+
+    # Receipts and deliveries, reserved
+    picking_vals = []
+    for index in range(pickings):
+        picking_type = warehouse.in_type_id if index % 2 == 0 else warehouse.out_type_id
+        location = picking_type.default_location_src_id or env.ref('stock.stock_location_suppliers')
+        location_dest = picking_type.default_location_dest_id or env.ref('stock.stock_location_customers')
+        picking_vals.append({
+            'picking_type_id': picking_type.id,
+            'location_id': location.id,
+            'location_dest_id': location_dest.id,
+            'user_id': user.id,
+            'move_ids': [Command.create({
+                'name': product.display_name,
+                'product_id': product.id,
+                'product_uom': product.uom_id.id,
+                'product_uom_qty': rng.randint(1, 5),
+                'location_id': location.id,
+                'location_dest_id': location_dest.id,
+            }) for product in rng.sample(list(variants_all), min(lines, len(variants_all)))],
+        })
+    stock_pickings = env['stock.picking'].create(picking_vals)
+    stock_pickings.action_confirm()
+    stock_pickings.action_assign()
+
+    # Batches and waves of the deliveries
+    deliveries = stock_pickings.filtered(lambda picking: picking.picking_type_id == warehouse.out_type_id)
+    chunk = max(len(deliveries) // max(batches, 1), 1)
+    picking_batches = env['stock.picking.batch'].create([{
+        'user_id': user.id,
+        'is_wave': index < waves,
+        'picking_type_id': warehouse.out_type_id.id,
+        'picking_ids': [Command.set(deliveries[index * chunk:(index + 1) * chunk].ids)],
+    } for index in range(batches) if deliveries[index * chunk:(index + 1) * chunk]])
+    picking_batches.action_confirm()
+
+    # Finished jobs of the user, see `/api/job_status`
+    jobs = env['bista.wms.job'].create([{
+        'endpoint': '/api/post_stock_quants',
+        'payload': '{}',
+        'user_id': user.id,
+        'company_ids': [Command.set(company.ids)],
+        'state': 'done',
+        'result': json.dumps({'count': 0, 'status': True, 'data': []}),
+        'date_done': fields.Datetime.now(),
+    } for _index in range(10)])
+
+    env.flush_all()
+    receipts = stock_pickings.filtered(lambda picking: picking.picking_type_id == warehouse.in_type_id)
+    return {
+        'seed': seed,
+        'sizes': {
+            'products': len(templates),
+            'variants': len(variants_all),
+            'lots': len(stock_lots),
+            'locations': len(locations),
+            'quants': quant_count,
+            'packages': len(quant_packages),
+            'pickings': len(stock_pickings),
+            'lines': lines,
+            'batches': len(picking_batches),
+        },
+        'login': user.login,
+        'password': BENCH_PASSWORD,
+        'warehouse_id': warehouse.id,
+        'product_template_ids': templates[:50].ids,
+        'product_ids': variants_all[:50].ids,
+        'product_barcodes': variants_all[:50].mapped('barcode'),
+        'location_ids': [location.id for location in leaves[:50]],
+        'location_barcodes': [location.barcode for location in leaves[:50]],
+        'lot_names': stock_lots[:50].mapped('name'),
+        'package_names': quant_packages[:50].mapped('name'),
+        'package_ids': quant_packages[:50].ids,
+        'receipt_ids': receipts.ids,
+        # Reserved lines of the receipts as [line id, product id, quantity], in the order of `receipt_ids`.
+        'receipt_lines': [[[line.id, line.product_id.id, line.quantity] for line in receipt.move_line_ids]
+                          for receipt in receipts],
+        'delivery_ids': deliveries.ids,
+        'batch_ids': picking_batches.filtered(lambda batch: not batch.is_wave).ids,
+        'wave_ids': picking_batches.filtered('is_wave').ids,
+        'job_ids': jobs.ids,
+    }
@@ -0,0 +1,102 @@
+"""
+Content-Encoding negotiation and incremental compression of the API responses.
+
+Kept free of Odoo imports so that `bench_compression.py` can run it outside of a server.
+"""
+import zlib
+
+# Supported encodings, by order of preference when the client accepts several with the same weight.
+ENCODINGS = ('gzip', 'deflate')
+DEFAULT_THRESHOLD = 1024
+DEFAULT_LEVEL = 6
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Encoding to use for an `Accept-Encoding` header value, None when the response must stay
+    uncompressed (identity). Weights (`;q=`) are honoured, `q=0` refuses an encoding.
+    """
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressobj(encoding, level=DEFAULT_LEVEL):
+    # NOTE: HTTP `deflate` is the zlib format (RFC 1950), not a raw deflate stream.
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+
+class CompressingWriter:
+    """
+    File-like writer compressing what is written to `output` with `encoding` once more than
+    `threshold` bytes were written. Smaller contents are written as is by `close`, which returns
+    the Content-Encoding of what was written (None when uncompressed).
+    """
+
+    def __init__(self, output, encoding=None, threshold=DEFAULT_THRESHOLD, level=DEFAULT_LEVEL):
+        self.output = output
+        self.encoding = encoding
+        self.threshold = threshold
+        self.level = level
+        self._pending = []
+        self._pending_size = 0
+        self._compressor = None
+
+    def write(self, data):
+        if self._compressor:
+            self.output.write(self._compressor.compress(data))
+            return
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self.encoding and self._pending_size > self.threshold:
+            self._compressor = compressobj(self.encoding, self.level)
+            self.output.write(self._compressor.compress(b''.join(self._pending)))
+            self._pending = []
+
+    def close(self):
+        if self._compressor:
+            self.output.write(self._compressor.flush())
+            return self.encoding
+        self.output.write(b''.join(self._pending))
+        self._pending = []
+        return None
+
+
+def compress(data, encoding=None, threshold=DEFAULT_THRESHOLD, level=DEFAULT_LEVEL):
+    """
+    Compress `data` (bytes) when it is larger than `threshold`.
+
+    :return: tuple (body, content_encoding)
+    """
+    if not encoding or len(data) <= threshold:
+        return data, None
+    compressor = compressobj(encoding, level)
+    return compressor.compress(data) + compressor.flush(), encoding
+
+
+def decompress(data, encoding=None):
+    """Inverse of `compress`, `data` is returned as is when it was not compressed (no `encoding`)."""
+    if not encoding:
+        return data
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    return zlib.decompress(data, wbits)
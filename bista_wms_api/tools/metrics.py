@@ -0,0 +1,111 @@
+"""
+In-memory metrics of the API calls and their Prometheus text exposition.
+
+Kept free of Odoo imports as `compression.py`: each worker aggregates its calls in a `MetricsBuffer`,
+the samples it drains are added to `bista.wms.metric`, which `/api/metrics` renders with `format_prometheus`.
+"""
+import threading
+import time
+
+PREFIX = 'bista_wms_api_'
+
+# Histograms: name -> (help, upper bounds of the buckets)
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        "Wall time of the API calls.", (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)),
+    'request_sql_queries': (
+        "SQL queries run by the API calls.", (5, 10, 25, 50, 100, 250, 500, 1000, 5000)),
+    'request_sql_seconds': (
+        "Time spent in SQL queries by the API calls.", (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'response_bytes': (
+        "Size of the API responses, as sent (compressed or not).", (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)),
+    'response_records': (
+        "Records returned by the API calls.", (1, 10, 100, 1000, 10000, 100000)),
+}
+# Counters: name -> help
+COUNTERS = {
+    'requests_total': "API calls, by user.",
+    'errors_total': "API calls answered with an error status (4xx/5xx).",
+}
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for key, value in labels.items())
+
+
+class MetricsBuffer:
+    """
+    Thread-safe aggregation of the calls of a worker, as samples `{(endpoint, name, labels): value}`
+    added to the stored ones: cumulative bucket counts, sums and counts of the histograms, counters.
+    """
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._last_drain = time.monotonic()
+
+    def _add(self, endpoint, name, labels, value):
+        key = (endpoint, name, labels)
+        self._samples[key] = self._samples.get(key, 0) + value
+
+    def observe(self, endpoint, user, values, error=False):
+        """
+        Record a call of `endpoint` by `user`.
+
+        :param dict values: observed value of each histogram of `HISTOGRAMS`, missing ones are skipped
+        """
+        with self._lock:
+            self._add(endpoint, 'requests_total', _labels(user=user), 1)
+            if error:
+                self._add(endpoint, 'errors_total', '', 1)
+            for name, value in values.items():
+                if value is None:
+                    continue
+                for bound in HISTOGRAMS[name][1] + (float('inf'),):
+                    # NOTE: empty buckets are added as well, Prometheus expects every bucket of a histogram.
+                    self._add(endpoint, name + '_bucket', _labels(le=_format_bound(bound)), int(value <= bound))
+                self._add(endpoint, name + '_sum', '', value)
+                self._add(endpoint, name + '_count', '', 1)
+
+    def should_drain(self):
+        return time.monotonic() - self._last_drain >= self.flush_interval
+
+    def drain(self):
+        """Return the samples aggregated since the last drain and reset them."""
+        with self._lock:
+            samples, self._samples = self._samples, {}
+            self._last_drain = time.monotonic()
+        return samples
+
+
+def format_prometheus(samples):
+    """Prometheus text exposition (version 0.0.4) of `samples` {(endpoint, name, labels): value}."""
+    by_name = {}
+    for (endpoint, name, labels), value in sorted(samples.items()):
+        by_name.setdefault(name, []).append((endpoint, labels, value))
+
+    lines = []
+    families = [(name, 'histogram', help_text) for name, (help_text, _bounds) in HISTOGRAMS.items()]
+    families += [(name, 'counter', help_text) for name, help_text in COUNTERS.items()]
+    for family, metric_type, help_text in families:
+        names = [family + suffix for suffix in ('_bucket', '_sum', '_count')] if metric_type == 'histogram' \
+            else [family]
+        if not any(name in by_name for name in names):
+            continue
+        lines.append('# HELP %s%s %s' % (PREFIX, family, help_text))
+        lines.append('# TYPE %s%s %s' % (PREFIX, family, metric_type))
+        for name in names:
+            rows = by_name.get(name, [])
+            if name.endswith('_bucket'):
+                # NOTE: buckets are listed by increasing bound, as Prometheus expects them.
+                rows = sorted(rows, key=lambda row: (row[0], float(row[1].split('"')[1])))
+            for endpoint, labels, value in rows:
+                all_labels = _labels(endpoint=endpoint) + (',' + labels if labels else '')
+                lines.append('%s%s{%s} %s' % (PREFIX, name, all_labels, repr(float(value))))
+    return '\n'.join(lines) + '\n'